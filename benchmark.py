@@ -0,0 +1,100 @@
+import argparse
+import time
+import tracemalloc
+from event_core import *
+from scenario import Scenario
+
+
+# Events per second of the hand-built simpy.Event idiom versus call_later() (on both simulation engines)
+def bench_timer(num_events=200000, num_chains=10, repeat=5):
+    def run(schedule, engine='simpy'):
+        env = make_env(engine)
+        count = [0]
+
+        def tick(event):
+            count[0] += 1
+            if count[0] < num_events:
+                schedule(env, tick)
+
+        for _ in range(num_chains):
+            schedule(env, tick)
+
+        start = time.perf_counter()
+        env.run()
+        return count[0] / (time.perf_counter() - start)
+
+    def schedule_event(env, callback):
+        event = env.event()
+        event._ok = True
+        event.callbacks.append(callback)
+        env.schedule(event, priority=0, delay=0.001)
+
+    def schedule_timer(env, callback):
+        call_later(env, 0.001, callback)
+
+    event_rate = timer_rate = core_rate = 0
+    for _ in range(repeat):
+        event_rate = max(event_rate, run(schedule_event))
+        timer_rate = max(timer_rate, run(schedule_timer))
+        core_rate = max(core_rate, run(schedule_timer, 'event_core'))
+    print('simpy.Event:                %.0f events/s' % event_rate)
+    print('call_later():               %.0f events/s (x%.2f)' % (timer_rate, timer_rate / event_rate))
+    print('call_later() on event_core: %.0f events/s (x%.2f)' % (core_rate, core_rate / event_rate))
+
+
+# Wall-clock time per simulated second of the Node/Agent stack on each simulation engine
+def bench_engine(run_time=60):
+    for engine in ENGINES:
+        env = make_env(engine)
+        Scenario().build(env)
+
+        start = time.perf_counter()
+        env.run(until=run_time)
+        wall = time.perf_counter() - start
+        print('%-10s %.3f s for %g simulated s (%.3f ms per simulated s)' %
+              (engine, wall, run_time, wall * 1000 / run_time))
+
+
+# Memory per data frame and allocations per sent frame, with and without the packet pool
+def bench_frames(num_frames=10000):
+    from wban_protocol_stack import BanMac, BanTxParams, BanTxOption, PacketPool
+    from wban_packet import BanFrmType, BanFrmSubType
+
+    m_tx_params = BanTxParams(0, 1, 10, 0, BanTxOption.TX_OPTION_ACK)
+
+    def new_frame(mac):
+        packet = mac.new_packet(500)
+        packet.set_mac_header(BanFrmType.IEEE_802_15_6_MAC_DATA, BanFrmSubType.WBAN_DATA_UP0, m_tx_params)
+        return packet
+
+    # live frames (e.g., queued in the MAC)
+    mac = BanMac()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    frames = [new_frame(mac) for _ in range(num_frames)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    print('live frames: %.1f bytes/frame, %.1f allocations/frame' % (size / num_frames, blocks / num_frames))
+    del frames
+
+    # frames sent and acknowledged one after the other
+    mac = BanMac()
+    mac.set_packet_pool(PacketPool())
+    for _ in range(num_frames):
+        mac.release_packet(new_frame(mac))
+    print('packet pool: %d new packets for %d sent frames' % (mac.get_packet_pool().num_alloc, num_frames))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', choices=['timer', 'engine', 'frames'])
+    parser.add_argument('--run-time', type=float, default=60, help='simulated seconds (engine benchmark)')
+    args = parser.parse_args()
+
+    if args.benchmark == 'timer':
+        bench_timer()
+    elif args.benchmark == 'engine':
+        bench_engine(args.run_time)
+    elif args.benchmark == 'frames':
+        bench_frames()
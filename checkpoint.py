@@ -0,0 +1,111 @@
+import os
+import pickle
+import queue
+import threading
+import numpy as np
+from replay_memory import ReplayMemory, PrioritizedReplayMemory
+
+
+# Writes checkpoint jobs one after the other in a background thread. A failing job does not stop the thread: its
+# exception is kept and raised by the next wait()
+class CheckpointWriter(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.jobs = queue.Queue()
+        self.errors = list()
+        self.start()
+
+    def submit(self, job, *args):
+        self.jobs.put((job, args))
+
+    # Block until all the submitted checkpoints are written; raises the first error of the failed jobs
+    def wait(self):
+        self.jobs.join()
+        if len(self.errors) > 0:
+            error = self.errors[0]
+            self.errors = list()
+            raise error
+
+    def run(self):
+        while True:
+            job, args = self.jobs.get()
+            try:
+                job(*args)
+            except Exception as error:
+                self.errors.append(error)
+            finally:
+                self.jobs.task_done()
+
+
+# Replay memory store of a checkpoint directory: one memory-mapped .npy file per array of the ring buffer.
+# Each row is stored at its ring buffer index, so a checkpoint only writes the rows appended since the previous one.
+class ReplayCheckpoint:
+    def __init__(self, dir_path):
+        self.dir_path = dir_path
+
+    def get_file_path(self, name):
+        return os.path.join(self.dir_path, name + '.npy')
+
+    def get_info_path(self):
+        return os.path.join(self.dir_path, 'store_info.pkl')
+
+    # Copy the rows appended after the first num_appended ones (None: all the rows) in the simulation thread;
+    # returns the arguments of write()
+    def snapshot(self, memory: ReplayMemory, num_appended=None):
+        if num_appended is None:
+            num_appended = 0
+        indices = memory.get_indices_since(num_appended)
+        rows = {name: getattr(memory, name)[indices] for name in ReplayMemory.ARRAY_NAMES}
+        shapes = {name: (getattr(memory, name).shape, getattr(memory, name).dtype) for name in ReplayMemory.ARRAY_NAMES}
+        priorities = memory.get_priorities() if isinstance(memory, PrioritizedReplayMemory) else None
+        return indices, rows, shapes, priorities, memory.num_appended
+
+    # Write the copied rows into the memory-mapped files (called in the writer thread)
+    def write(self, indices, rows, shapes, priorities, num_appended):
+        os.makedirs(self.dir_path, exist_ok=True)
+        # written first: from now on the store may hold the rows of the transitions up to num_appended (an interrupted
+        # write leaves the older checkpoints whose rows may be overwritten rejected by read())
+        write_training_info(self.get_info_path(), {'num_appended': num_appended})
+        for name in ReplayMemory.ARRAY_NAMES:
+            file_path = self.get_file_path(name)
+            shape, dtype = shapes[name]
+            if os.path.exists(file_path):
+                array = np.load(file_path, mmap_mode='r+')
+                if array.shape != shape or array.dtype != dtype:
+                    del array
+                    array = np.lib.format.open_memmap(file_path, mode='w+', dtype=dtype, shape=shape)
+            else:
+                array = np.lib.format.open_memmap(file_path, mode='w+', dtype=dtype, shape=shape)
+            array[indices] = rows[name]
+            array.flush()
+            del array
+        if priorities is not None:
+            np.save(self.get_file_path('priorities'), priorities)
+
+    # Read the rows of a replay memory state (get_state() saved with a checkpoint) into the replay memory (only the
+    # pages of the first size rows are read). The store keeps only the rows of the latest checkpoint: an older state
+    # is rejected if later checkpoints overwrote some of its rows.
+    def read(self, memory: ReplayMemory, state):
+        store_num_appended = read_training_info(self.get_info_path())['num_appended']
+        oldest = state['num_appended'] - state['size']  # first transition of the state still in the ring buffer
+        if store_num_appended < state['num_appended'] or store_num_appended - oldest > state['capacity']:
+            raise ValueError('The replay memory store of %s no longer holds the rows of this checkpoint '
+                             '(%d transitions in the store, %d in the checkpoint)' %
+                             (self.dir_path, store_num_appended, state['num_appended']))
+
+        size = state['size']
+        for name in ReplayMemory.ARRAY_NAMES:
+            array = np.load(self.get_file_path(name), mmap_mode='r')
+            getattr(memory, name)[:size] = array[:size]
+        if isinstance(memory, PrioritizedReplayMemory) and os.path.exists(self.get_file_path('priorities')):
+            memory.set_priorities(np.load(self.get_file_path('priorities')))
+
+
+def write_training_info(file_path, training_info):
+    with open(file_path, 'wb') as fout:
+        pickle.dump(training_info, fout)
+
+
+def read_training_info(file_path):
+    with open(file_path, 'rb') as fin:
+        return pickle.load(fin)
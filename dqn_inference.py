@@ -0,0 +1,99 @@
+import random
+import numpy as np
+from policy import Policy, NUM_ACTIONS
+
+NUM_CHANNELS = 1
+
+# Activation functions of the Dense layers supported by the NumPy forward pass
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'tanh': np.tanh,
+}
+
+
+# Weights and activations of a Keras model made of Dense layers (layers without weights, e.g., Dropout, are skipped)
+def get_model_weights(model):
+    weights = list()
+    for layer in model.layers:
+        layer_weights = layer.get_weights()
+        if len(layer_weights) == 0:
+            continue
+        activation = layer.activation.__name__
+        if len(layer_weights) != 2 or activation not in ACTIVATIONS:
+            raise ValueError('Unsupported layer for the NumPy Q-network: %s' % layer.name)
+        weights.append((layer_weights[0], layer_weights[1], activation))
+    return weights
+
+
+# Load the weights (see get_model_weights()) into a Keras model with the same Dense layers
+def set_model_weights(model, weights):
+    model.set_weights([array for kernel, bias, _ in weights for array in (kernel, bias)])
+
+
+# Multi-layer perceptron evaluated with NumPy (no TensorFlow/Keras needed)
+class NumpyQNetwork:
+    def __init__(self, weights=None):
+        self.layers = list()    # (kernel, bias, activation function)
+        self.activations = list()
+        if weights is not None:
+            self.set_weights(weights)
+
+    def set_weights(self, weights):
+        self.layers = [(np.asarray(kernel, dtype=np.float32), np.asarray(bias, dtype=np.float32),
+                        ACTIVATIONS[activation]) for kernel, bias, activation in weights]
+        self.activations = [activation for _, _, activation in weights]
+
+    def get_weights(self):
+        return [(kernel, bias, activation) for (kernel, bias, _), activation in zip(self.layers, self.activations)]
+
+    def predict(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return x
+
+    def save(self, file_path):
+        arrays = dict()
+        for i, (kernel, bias, _) in enumerate(self.layers):
+            arrays['kernel_%d' % i] = kernel
+            arrays['bias_%d' % i] = bias
+        np.savez(file_path, activations=np.array(self.activations), **arrays)
+
+    @staticmethod
+    def load(file_path):
+        with np.load(file_path) as data:
+            activations = [str(activation) for activation in data['activations']]
+            weights = [(data['kernel_%d' % i], data['bias_%d' % i], activation)
+                       for i, activation in enumerate(activations)]
+        return NumpyQNetwork(weights)
+
+
+# Evaluation-only counterpart of DQNTrainer: greedy (or epsilon-greedy) actions of an exported Q-network, no training
+class DQNEvaluator(Policy):
+    def __init__(self, q_network: NumpyQNetwork, epsilon=0.0):
+        super().__init__()
+        self.q_network = q_network
+        self.epsilon = epsilon
+
+    @staticmethod
+    def load(file_path, epsilon=0.0):
+        return DQNEvaluator(NumpyQNetwork.load(file_path), epsilon)
+
+    def get_q_values(self, x):
+        return self.q_network.predict(x)
+
+    def get_actions(self, current_states):
+        explore = [random.random() <= self.epsilon for _ in current_states] if self.epsilon > 0 \
+            else [False] * len(current_states)
+
+        actions = [np.random.randint(NUM_ACTIONS) if e is True else None for e in explore]
+
+        greedy = [i for i, e in enumerate(explore) if e is False]
+        if len(greedy) > 0:
+            q_values = self.get_q_values(np.array([current_states[i] for i in greedy]))
+            for i, action in zip(greedy, np.argmax(q_values, axis=1)):
+                actions[i] = action
+
+        return actions
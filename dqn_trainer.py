@@ -1,20 +1,19 @@
-from keras.layers import Input, Dense, Dropout, Conv2D, Flatten, concatenate, LSTM
-from keras.models import Sequential, Model
 from collections import deque
 import random
 import numpy as np
-import keras
-import tensorflow as tf
-from tqdm import tqdm
 import pickle
 import os
- 
-NUM_CHANNELS = 1
-NUM_ACTIONS = 15
+import threading
+from tools import set_random_seed
+from dqn_inference import NUM_CHANNELS, NUM_ACTIONS, NumpyQNetwork, get_model_weights, set_model_weights
+from replay_memory import ReplayMemory, PrioritizedReplayMemory
+from checkpoint import *
+from policy import Policy
 
  
-class DQNTrainer:
-    def __init__(self):
+class DQNTrainer(Policy):
+    def __init__(self, seed=42):
+        super().__init__()
         self.env = None
         self.net_env = None   # BAN environment
         self.data_list = list()
@@ -36,28 +35,68 @@ class DQNTrainer:
         self.min_replay_memory_size = 1000
         self.replay_memory_size = 100000
         self.target_update_freq = 5
-        self.seed = 42
+        self.train_freq = 1         # train every train_freq observations
+        self.gradient_steps = 1     # gradient steps (fit calls) per training
+        self.seed = seed
 
         self.set_random_seed(self.seed)
 
-        if self.enable_save and not os.path.exists(self.save_dir):
-            os.makedirs(self.save_dir)
+        # The Keras models (and TensorFlow) are created on first use by build_models(): the actions are random
+        # while epsilon is 1, so no Q-value is needed before the training starts
+        self.model = None
+        self.target_model = None
+
+        # NumPy mirrors of the models used for inference (resynced only when the Keras weights change)
+        self.q_network = NumpyQNetwork()
+        self.target_q_network = NumpyQNetwork()
+        self.q_network_updated = False
+
+        self.replay_memory = ReplayMemory(self.replay_memory_size, seed=self.seed)
+        self.replay_memory_lock = threading.Lock()
+        self.prioritized_replay = False
+        self.checkpoint_dir = None              # directory of the last written/loaded checkpoint
+        self.checkpoint_num_appended = None     # replay rows in the checkpoint store of checkpoint_dir (None: unknown)
+        self.checkpoint_writer: CheckpointWriter = None
+        self.target_update_counter = 0
+        self.num_observations = 0
+        self.learner: BackgroundLearner = None
+
+        self.current_episode = 0
+
+        self.epsilon_decay = (self.epsilon - self.min_epsilon) / (self.exploration_ratio * self.episodes)
+        self.pbar = None    # progress bar, created at the first episode
+
+    def build_models(self):
+        if self.model is not None:
+            return
+
+        # import TensorFlow/Keras before seeding: importing them draws from the global random number generators
+        import tensorflow as tf
+        import keras
+
+        # the weights depend only on the seed, not on the random numbers drawn by the simulation so far
+        random_state = random.getstate()
+        np_random_state = np.random.get_state()
+        random.seed(self.seed)
+        np.random.seed(self.seed)
+        tf.random.set_seed(self.seed)
 
-        # Create model
         self.model = self._create_model()
         self.target_model = self._create_model()
         self.target_model.set_weights(self.model.get_weights())
-        self.model.summary()
 
-        self.replay_memory = deque(maxlen=self.replay_memory_size)
-        self.target_update_counter = 0
-
-        self.current_episode = 0
+        random.setstate(random_state)
+        np.random.set_state(np_random_state)
+        self.sync_q_networks()
 
-        self.epsilon_decay = (self.epsilon - self.min_epsilon) / (self.exploration_ratio * self.episodes)
-        self.pbar = tqdm(initial=self.current_episode, total=self.episodes, unit='episodes')
+    def summary(self):
+        self.build_models()
+        self.model.summary()
 
     def _create_model(self):
+        from keras.layers import Input, Dense, Dropout, Conv2D, Flatten, concatenate, LSTM
+        from keras.models import Sequential, Model
+
         # Create a neural network using Sequential model
         model = Sequential([
             Dense(24, activation='relu', input_dim=2),  # if the input (state) is one-dimension array, input_dim=2
@@ -119,10 +158,33 @@ class DQNTrainer:
         return model
 
     def update_replay_memory(self, current_state, action, reward, next_state, done):
-        self.replay_memory.append((current_state, action, reward, next_state, done))
+        with self.replay_memory_lock:
+            self.replay_memory.append((current_state, action, reward, next_state, done))
+
+    def sync_q_networks(self):
+        self.q_network.set_weights(get_model_weights(self.model))
+        self.target_q_network.set_weights(get_model_weights(self.target_model))
+        self.q_network_updated = True
+
+    def update_q_network(self):
+        if self.model is None:
+            self.build_models()
+        # with the background learner, the learner publishes the weights (the model may be in fit())
+        if self.q_network_updated is False and self.learner is None:
+            self.q_network.set_weights(get_model_weights(self.model))
+            self.q_network_updated = True
 
     def get_q_values(self, x):
-        return self.model.predict(x)
+        self.update_q_network()
+        return self.q_network.predict(x)
+
+    def get_target_q_values(self, x):
+        return self.target_q_network.predict(x)
+
+    # Export the weights of the Q-network; DQNEvaluator.load() reads them without TensorFlow
+    def export_weights(self, file_path):
+        self.update_q_network()
+        self.q_network.save(file_path)
 
     def train(self):
         # guarantee the minimum number of samples
@@ -130,45 +192,102 @@ class DQNTrainer:
             return
 
         # get current q values and next q values
-        samples = random.sample(self.replay_memory, self.batch_size)
-        current_input = np.stack([sample[0] for sample in samples])
-        current_q_values = self.model.predict(current_input)    # return current Q-values (behavior (off-policy))
-        next_input = np.stack([sample[3] for sample in samples])
-        next_q_values = self.target_model.predict(next_input)   # return target Q-values (target (off-policy))
-
-        # update q values
-        for i, (current_state, action, reward, _, done) in enumerate(samples):
-            if done:
-                next_q_value = reward
-            else:
-                next_q_value = reward + self.gamma * np.max(next_q_values[i])
-            current_q_values[i, action] = next_q_value
-
-        # fit model
-        hist = self.model.fit(current_input, current_q_values, batch_size=self.batch_size, verbose=0, shuffle=False)
+        with self.replay_memory_lock:
+            indices, current_input, actions, rewards, next_input, dones, weights = \
+                self.replay_memory.sample(self.batch_size)
+        current_q_values = self.get_q_values(current_input)    # return current Q-values (behavior (off-policy))
+        next_q_values = self.get_target_q_values(next_input)   # return target Q-values (target (off-policy))
+
+        # update q values (no bootstrapping from the next state when done)
+        next_q_value = rewards + self.gamma * np.max(next_q_values, axis=1) * (1 - dones)
+        batch_index = np.arange(len(actions))
+        td_errors = next_q_value - current_q_values[batch_index, actions]
+        current_q_values[batch_index, actions] = next_q_value
+
+        # fit model (importance-sampling weights with prioritized replay)
+        sample_weight = weights if self.prioritized_replay is True else None
+        hist = self.model.fit(current_input, current_q_values, sample_weight=sample_weight,
+                              batch_size=self.batch_size, verbose=0, shuffle=False)
+        with self.replay_memory_lock:
+            self.replay_memory.update_priorities(indices, td_errors)
+        self.q_network_updated = False
         loss = hist.history['loss'][0]
         return loss
 
     def increase_target_update_counter(self):
         self.target_update_counter += 1
         if self.target_update_counter >= self.target_update_freq:
-            self.target_model.set_weights(self.model.get_weights())
+            if self.learner is not None:
+                self.learner.request_target_update()
+            else:
+                self.update_target_model()
             self.target_update_counter = 0
 
+    # Switch between uniform and prioritized experience replay (the transitions stored so far are kept)
+    def set_prioritized_replay(self, enable=True, alpha=0.6, beta=0.4):
+        if enable is True:
+            memory = PrioritizedReplayMemory(self.replay_memory_size, seed=self.seed, alpha=alpha, beta=beta)
+        else:
+            memory = ReplayMemory(self.replay_memory_size, seed=self.seed)
+
+        with self.replay_memory_lock:
+            old = self.replay_memory
+            order = np.arange(old.position - old.size, old.position) % old.capacity
+            for i in order:
+                memory.append((old.states[i], old.actions[i], old.rewards[i], old.next_states[i], old.dones[i]))
+            self.replay_memory = memory
+            self.prioritized_replay = enable
+            self.checkpoint_num_appended = None     # the rows moved: the next checkpoint writes all of them
+
+    def update_target_model(self):
+        self.build_models()
+        self.target_model.set_weights(self.model.get_weights())
+        self.target_q_network.set_weights(get_model_weights(self.target_model))
+
+    # Train every train_freq observations with gradient_steps fit() calls, inline or in a background learner thread
+    def set_training_schedule(self, train_freq=1, gradient_steps=1, async_training=False):
+        self.train_freq = train_freq
+        self.gradient_steps = gradient_steps
+        if async_training is True and self.learner is None:
+            self.start_learner()
+        elif async_training is False and self.learner is not None:
+            self.stop_learner()
+
+    def start_learner(self):
+        self.build_models()
+        self.learner = BackgroundLearner(self)
+        self.learner.start()
+
+    def stop_learner(self):
+        self.learner.stop()
+        self.learner = None
+        self.q_network_updated = False
+
+    def schedule_training(self):
+        self.num_observations += 1
+        if self.num_observations % self.train_freq != 0:
+            return
+
+        if self.learner is not None:
+            self.learner.request_training(self.gradient_steps)
+        else:
+            for _ in range(self.gradient_steps):
+                self.train()
+
     def save(self, model_filepath, target_model_filepath):
+        self.build_models()
         self.model.save(model_filepath)
         self.target_model.save(target_model_filepath)
 
     def load(self, model_filepath, target_model_filepath):
+        import keras
         self.model = keras.models.load_model(model_filepath)
         self.target_model = keras.models.load_model(target_model_filepath)
+        self.sync_q_networks()
 
     # ############### Q-learning trainer ######################
     def set_random_seed(self, seed):
-        random.seed(seed)
-        np.random.seed(seed)
-        os.environ['PYTHONHASHSEED'] = str(seed)
-        tf.random.set_seed(seed)
+        set_random_seed(seed)
 
     def set_observation(self, current_state, current_action, next_state, reward, steps, done):
         if self.current_episode > self.episodes:
@@ -176,7 +295,7 @@ class DQNTrainer:
             return True
 
         self.update_replay_memory(current_state, current_action, reward, next_state, done)
-        self.train()
+        self.schedule_training()
 
         if done is True or steps > self.max_steps:
             self.current_episode += 1
@@ -187,6 +306,9 @@ class DQNTrainer:
             self.epsilon = max(self.epsilon - self.epsilon_decay, self.min_epsilon)
 
             # update pbar
+            if self.pbar is None:
+                from tqdm import tqdm
+                self.pbar = tqdm(initial=self.current_episode - 1, total=self.episodes, unit='episodes')
             self.pbar.update(1)
 
             # current episode is done
@@ -195,20 +317,27 @@ class DQNTrainer:
             # current episode is not done
             return False
 
-    def get_action(self, current_state):
+    # Epsilon-greedy actions for the current states of multiple nodes with (at most) one forward pass
+    def get_actions(self, current_states):
         if self.current_episode > self.episodes:
             # print('All the training episodes end: return the best action')
-            action = np.argmax(self.get_q_values(np.array([current_state])))
-            return action
-
-        if random.random() > self.epsilon:
-            action = np.argmax(self.get_q_values(np.array([current_state])))
+            explore = [False] * len(current_states)
         else:
-            action = np.random.randint(NUM_ACTIONS)
+            explore = [random.random() <= self.epsilon for _ in current_states]
+
+        actions = [np.random.randint(NUM_ACTIONS) if e is True else None for e in explore]
 
-        return action
+        greedy = [i for i, e in enumerate(explore) if e is False]
+        if len(greedy) > 0:
+            q_values = self.get_q_values(np.array([current_states[i] for i in greedy]))
+            for i, action in zip(greedy, np.argmax(q_values, axis=1)):
+                actions[i] = action
+
+        return actions
 
     def trainer_save(self, suffix):
+        if not os.path.exists(self.save_dir):
+            os.makedirs(self.save_dir)
         self.save(
             self.save_dir+'/model_{}.h5'.format(suffix),
             self.save_dir+'/target_model_{}.h5'.format(suffix)
@@ -234,10 +363,99 @@ class DQNTrainer:
             dic = pickle.load(fin)
 
         self.replay_memory = dic['replay_memory']
+        if isinstance(self.replay_memory, deque):  # saved as a deque of (s, a, r, s', done) tuples
+            self.replay_memory = ReplayMemory(self.replay_memory_size, seed=self.seed)
+            self.replay_memory.extend(dic['replay_memory'])
         self.target_update_counter = dic['target_update_counter']
         self.current_episode = dic['current_episode']
         self.epsilon = dic['epsilon']
 
+    # Replay memory store of the checkpoints of a directory
+    @staticmethod
+    def get_replay_checkpoint(save_dir):
+        return ReplayCheckpoint(os.path.join(save_dir, 'replay_memory'))
+
+    # Incremental checkpoint written by a background thread: the models (NumPy format, see DQNEvaluator), the
+    # training info and the replay memory rows appended since the previous checkpoint (memory-mapped arrays).
+    # save_dir: directory of the checkpoint (None: self.save_dir)
+    def save_checkpoint(self, suffix, save_dir=None):
+        if self.checkpoint_writer is None:
+            self.checkpoint_writer = CheckpointWriter()
+        if save_dir is None:
+            save_dir = self.save_dir
+
+        self.update_q_network()
+        q_network = NumpyQNetwork(self.q_network.get_weights())
+        target_q_network = NumpyQNetwork(self.target_q_network.get_weights())
+        replay_checkpoint = self.get_replay_checkpoint(save_dir)
+        with self.replay_memory_lock:
+            # rows since the last checkpoint written to this store (another store: all the rows)
+            num_appended = self.checkpoint_num_appended if save_dir == self.checkpoint_dir else None
+            replay_rows = replay_checkpoint.snapshot(self.replay_memory, num_appended)
+            memory = self.replay_memory
+            training_info = {
+                'target_update_counter': self.target_update_counter,
+                'current_episode': self.current_episode,
+                'epsilon': self.epsilon,
+                'prioritized_replay': self.prioritized_replay,
+                'replay_memory': self.replay_memory.get_state(),
+            }
+
+        self.checkpoint_writer.submit(self.write_checkpoint, save_dir, suffix, q_network, target_q_network,
+                                      replay_rows, training_info, memory)
+
+    def write_checkpoint(self, save_dir, suffix, q_network, target_q_network, replay_rows, training_info, memory):
+        self.get_replay_checkpoint(save_dir).write(*replay_rows)
+        q_network.save(save_dir + '/model_{}.npz'.format(suffix))
+        target_q_network.save(save_dir + '/target_model_{}.npz'.format(suffix))
+        # written last: a checkpoint is complete when its training info exists
+        write_training_info(save_dir + '/checkpoint_{}.pkl'.format(suffix), training_info)
+
+        # the next checkpoint writes only the rows appended since this one (unless the rows moved in the meantime);
+        # after a failed write, the next checkpoint writes the rows of the failed one as well
+        with self.replay_memory_lock:
+            if memory is self.replay_memory:
+                self.checkpoint_dir = save_dir
+                self.checkpoint_num_appended = replay_rows[-1]
+
+    # Block until the submitted checkpoints are written; raises the error of a failed checkpoint
+    def wait_checkpoint(self):
+        if self.checkpoint_writer is not None:
+            self.checkpoint_writer.wait()
+
+    # Resume from a checkpoint of save_dir (None: self.save_dir). The replay store is shared by the checkpoints of
+    # the directory: an older checkpoint whose replay rows were overwritten by later ones raises ValueError.
+    def load_checkpoint(self, suffix, save_dir=None):
+        self.wait_checkpoint()
+        if save_dir is None:
+            save_dir = self.save_dir
+        training_info = read_training_info(save_dir + '/checkpoint_{}.pkl'.format(suffix))
+
+        state = training_info['replay_memory']
+        if training_info['prioritized_replay'] is True:
+            memory = PrioritizedReplayMemory(state['capacity'], seed=self.seed)
+        else:
+            memory = ReplayMemory(state['capacity'], seed=self.seed)
+        self.get_replay_checkpoint(save_dir).read(memory, state)
+        memory.set_state(state)
+
+        self.build_models()
+        set_model_weights(self.model, NumpyQNetwork.load(save_dir + '/model_{}.npz'.format(suffix)).get_weights())
+        set_model_weights(self.target_model,
+                          NumpyQNetwork.load(save_dir + '/target_model_{}.npz'.format(suffix)).get_weights())
+        self.sync_q_networks()
+
+        with self.replay_memory_lock:
+            self.replay_memory = memory
+            self.prioritized_replay = training_info['prioritized_replay']
+            self.checkpoint_dir = save_dir
+            self.checkpoint_num_appended = state['num_appended']
+        self.target_update_counter = training_info['target_update_counter']
+        self.current_episode = training_info['current_episode']
+        self.epsilon = training_info['epsilon']
+        if self.pbar is not None:
+            self.pbar.n = self.current_episode
+
     # ############## Q-learning methods end ##################
 
     def set_env(self, env):
@@ -255,3 +473,56 @@ class DQNTrainer:
     def get_data(self, event):
         self.data_list = self.net_env.get_data()
         # print('get a packet in the dqn_trainer (agent) at time:', self.env.now, len(self.data_list))
+
+
+# Trains the DQN on the replay memory in its own thread while the simulation keeps running.
+# The Q-network weights are published as a new NumPy Q-network after each gradient step: swapping the reference is
+# atomic and a published network is never written again, so inference never sees partially updated weights.
+class BackgroundLearner(threading.Thread):
+    def __init__(self, trainer: DQNTrainer, max_pending_steps=100):
+        super().__init__(daemon=True)
+        self.trainer = trainer
+        self.max_pending_steps = max_pending_steps   # requests beyond this are dropped while the learner is busy
+        self.pending_steps = 0
+        self.pending_target_update = False
+        self.running = True
+        self.condition = threading.Condition()
+        self.num_train_steps = 0
+
+    def request_training(self, gradient_steps):
+        with self.condition:
+            self.pending_steps = min(self.pending_steps + gradient_steps, self.max_pending_steps)
+            self.condition.notify()
+
+    def request_target_update(self):
+        with self.condition:
+            self.pending_target_update = True
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.join()
+
+    def publish_weights(self):
+        self.trainer.q_network = NumpyQNetwork(get_model_weights(self.trainer.model))
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending_steps == 0 and self.pending_target_update is False:
+                    self.condition.wait()
+                if self.running is False:
+                    return
+                steps = self.pending_steps
+                target_update = self.pending_target_update
+                self.pending_steps = 0
+                self.pending_target_update = False
+
+            if target_update is True:
+                self.trainer.update_target_model()
+            for _ in range(steps):
+                if self.trainer.train() is not None:
+                    self.publish_weights()
+                    self.num_train_steps += 1
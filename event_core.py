@@ -0,0 +1,103 @@
+# Lightweight scheduling helpers and an alternative event loop for the SimPy environment
+#
+# Every layer schedules its work as a callback that is called with the fired event, e.g.
+#   call_later(self.m_env, delay, self.check_queue)
+# instead of building a full simpy.Event (env.event() -> _ok -> callbacks -> env.schedule()).
+from heapq import heappush, heappop
+from itertools import count
+import math
+
+
+class Timer:
+    # A minimal event record: the environment only reads the callbacks and the result flags of a scheduled event
+    __slots__ = ('callbacks',)
+    _ok = True
+    _value = None
+
+    def __init__(self, callbacks):
+        self.callbacks = callbacks
+
+
+def call_later(env, delay, *callbacks, priority=0):
+    # the callbacks are called in order with the timer as the only argument (as simpy.Event callbacks)
+    timer = Timer(callbacks)
+    env.schedule(timer, priority, delay)
+    return timer
+
+
+class CoreEvent:
+    # Event handed out by EventCore.event(); the caller sets _ok and appends the callbacks (as with simpy.Event)
+    __slots__ = ('env', 'callbacks', '_ok', '_value')
+
+    def __init__(self, env):
+        self.env = env
+        self.callbacks = []
+        self._value = None
+
+
+class EventCore:
+    # Event loop implementing the subset of simpy.Environment used by BANSIM:
+    # now, event(), schedule(event, priority, delay), step(), peek() and run(until).
+    # The queue is a binary heap of (time, priority, event id, event) tuples, ordered like the SimPy queue.
+    def __init__(self, initial_time=0):
+        self._now = initial_time
+        self._queue = list()
+        self._eid = count()
+
+    @property
+    def now(self):
+        return self._now
+
+    def event(self):
+        return CoreEvent(self)
+
+    def schedule(self, event, priority=1, delay=0):
+        heappush(self._queue, (self._now + delay, priority, next(self._eid), event))
+
+    def peek(self):
+        if len(self._queue) == 0:
+            return math.inf
+        return self._queue[0][0]
+
+    def step(self):
+        if len(self._queue) == 0:
+            raise RuntimeError('No scheduled events left')
+
+        self._now, _, _, event = heappop(self._queue)
+        if event is None:
+            return
+
+        callbacks, event.callbacks = event.callbacks, None
+        for callback in callbacks:
+            callback(event)
+
+    def run(self, until=None):
+        queue = self._queue
+        if until is not None:
+            if until <= self._now:
+                raise ValueError('until (%s) must be greater than the current simulation time' % until)
+            # stop marker, scheduled before all regular events at the same time (like the SimPy until event)
+            heappush(queue, (until, 0, next(self._eid), None))
+
+        while len(queue) > 0:
+            self._now, _, _, event = heappop(queue)
+            if event is None:
+                return
+
+            callbacks, event.callbacks = event.callbacks, None
+            for callback in callbacks:
+                callback(event)
+
+
+ENGINES = ('simpy', 'event_core')
+
+
+# Create the simulation environment for a scenario
+def make_env(engine='simpy'):
+    if engine == 'simpy':
+        import simpy
+        return simpy.Environment()
+    elif engine == 'event_core':
+        return EventCore()
+    else:
+        raise ValueError('Unknown simulation engine: %s (supported engines: %s)' % (engine, ', '.join(ENGINES)))
@@ -1,6 +1,9 @@
 from tools import *
+from event_core import *
 from enum import Enum
+from collections import deque
 import random
+import numpy as np
  
 
 class MobilityState(Enum):
@@ -27,237 +30,205 @@ class BodyPosition(Enum):
     right_ankle = 14
 
 
+# Static body points of MobilityHelper (x, y, z), rows indexed by BodyPosition.value; the mobile joints are set by
+# the gait (zero until the first movement)
+BODY_POSITIONS = np.zeros((len(BodyPosition), 3))
+BODY_POSITIONS[BodyPosition.head.value] = (1.1, 1.8, 1)
+BODY_POSITIONS[BodyPosition.left_upper_torso.value] = (1, 1.3, 1)
+BODY_POSITIONS[BodyPosition.left_lower_torso.value] = (1, 1, 1)    # base position
+BODY_POSITIONS[BodyPosition.right_upper_torso.value] = (1.2, 1.3, 1)
+BODY_POSITIONS[BodyPosition.right_lower_torso.value] = (1.2, 1, 1)
+BODY_POSITIONS[BodyPosition.left_shoulder.value] = (1, 1.6, 1)
+BODY_POSITIONS[BodyPosition.right_shoulder.value] = (1.2, 1.6, 1)
+
+# Limbs of the gait: left hand, right hand, left leg, right leg.
+# Each limb turns around its root (shoulder/lower torso); the middle joint (elbow/knee) is one segment away from
+# the root and the end joint (wrist/ankle) one more segment away in the same direction.
+LIMB_ROOTS = np.array([BodyPosition.left_shoulder.value, BodyPosition.right_shoulder.value,
+                       BodyPosition.left_lower_torso.value, BodyPosition.right_lower_torso.value])
+LIMB_MIDDLES = np.array([BodyPosition.left_elbow.value, BodyPosition.right_elbow.value,
+                         BodyPosition.left_knee.value, BodyPosition.right_knee.value])
+LIMB_ENDS = np.array([BodyPosition.left_wrist.value, BodyPosition.right_wrist.value,
+                      BodyPosition.left_ankle.value, BodyPosition.right_ankle.value])
+LIMB_TURN_DEGREES = np.array([90, 90, 50, 50])  # the swing turns back around -/+ this angle
+LIMB_DEGREES = np.array([-160.0, 170.0, 110.0, -100.0])     # initial swing angles (degrees)
+LIMB_DIRECTIONS = np.array([1, -1, -1, 1])                  # initial swing directions
+LIMB_SEGMENT = 0.25     # m, distance from the root to the middle joint (and from the middle to the end joint)
+NUM_HANDS = 2   # the first two limbs swing sideways at random
+
+
+# Advance the swing angles (degrees) of any number of limbs by one movement: returns (degrees, directions).
+# The arrays broadcast, e.g., (4,) for one body or (num_bodies, 4) for many; turn_degrees is LIMB_TURN_DEGREES.
+def step_gait(degrees, directions, velocity, turn_degrees=LIMB_TURN_DEGREES):
+    forward = directions == 1
+    wrap_forward = forward & (degrees + velocity > 180)
+    turn_forward = forward & ~wrap_forward & (degrees < 0) & (degrees + velocity > -turn_degrees)
+    step_forward = forward & ~wrap_forward & ~turn_forward
+
+    backward = directions == -1
+    wrap_backward = backward & (degrees - velocity < -180)
+    turn_backward = backward & ~wrap_backward & (degrees > 0) & (degrees + velocity < turn_degrees)
+    step_backward = backward & ~wrap_backward & ~turn_backward
+
+    degrees = np.where(wrap_forward, -180.0, np.where(wrap_backward, 180.0, degrees))
+    degrees = np.where(step_forward, degrees + velocity, np.where(step_backward, degrees - velocity, degrees))
+    directions = np.where(turn_forward, -1, np.where(turn_backward, 1, directions))
+    return degrees, directions
+
+
+# Set the middle/end joints of the limbs in positions (..., 15, 3) from their swing angles (..., 4) and sideways
+# offsets (..., 4)
+def set_limb_positions(positions, degrees, offsets_x):
+    a = np.radians(degrees)
+    offsets = np.stack((offsets_x, np.cos(-a) * LIMB_SEGMENT, np.sin(-a) * LIMB_SEGMENT), axis=-1)
+    positions[..., LIMB_MIDDLES, :] = positions[..., LIMB_ROOTS, :] + offsets
+    positions[..., LIMB_ENDS, :] = positions[..., LIMB_MIDDLES, :] + offsets
+
+
 class MobilityModel:
     def __init__(self, body_position: BodyPosition):
         self.position = Vector(0, 0, 0)
         self.mobility_state: MobilityState = None
         self.body_position: BodyPosition = body_position
+        self.helper = None  # MobilityHelper that updates this position
+        self.row = None     # row of the position array of the helper (None: self.position is used)
+        self.frame_row = None   # row of the body frame array of the helper (None: the position is in the body frame)
+
+    # Attach to a row of a position array (x, y, z) that is updated in place by a mobility helper; frame_row is the
+    # row of the same point in the frame of its body (before the body is turned and moved to its place)
+    def set_position_row(self, row, frame_row=None):
+        self.row = row
+        self.frame_row = frame_row
 
     def set_position(self, position: Vector):
         self.position = position
+        self.row = None
+        self.frame_row = None
 
     def get_position(self):
+        if self.row is not None:
+            return Vector(*self.get_position_array().tolist())
         return self.position
 
+    # Position as an array (x, y, z)
+    def get_position_array(self):
+        if self.row is not None:
+            self.helper.evaluate()
+            return self.row
+        return np.array([self.position.x, self.position.y, self.position.z])
+
+    # Position in the frame of the body (x, y, z of MobilityHelper): decides the line of sight
+    def get_body_frame_array(self):
+        if self.frame_row is not None:
+            self.helper.evaluate()
+            return self.frame_row
+        return self.get_position_array()
+
     def get_body_position(self):
         return self.body_position
 
     def get_distance_from(self, position):
+        own_position = self.get_position()
         v = Vector(0, 0, 0)
-        v.x = position.x - self.position.x
-        v.y = position.y - self.position.y
-        v.z = position.z - self.position.z
+        v.x = position.x - own_position.x
+        v.y = position.y - own_position.y
+        v.z = position.z - own_position.z
 
         return v.get_length()
 
+    # Calculate the distances to multiple positions at once (positions: array of shape (N, 3))
+    def get_distance_from_batch(self, positions):
+        return np.sqrt(np.sum((positions - self.get_position_array()) ** 2, axis=1))
+
+    # Line of sight: both points on the same side (front: z < 1) of the body; position is in the body frame
+    # (see get_body_frame_array())
     def is_los(self, position):
-        if self.position.z < 1 and position.z >= 1:
+        own_z = self.get_body_frame_array()[2]
+        if own_z < 1 and position.z >= 1:
             return False
-        elif self.position.z >= 1 and position.z < 1:
+        elif own_z >= 1 and position.z < 1:
             return False
         else:
             # the two nodes are on the line of sight
             return True
 
+    # Check the line of sight to multiple positions at once (positions in the body frame: array of shape (N, 3))
+    def is_los_batch(self, positions):
+        return (positions[:, 2] < 1) == (self.get_body_frame_array()[2] < 1)
 
+
+# Walking model of one body: all the body points are rows of one (15, 3) array indexed by BodyPosition.value, and
+# the four limbs move in one vectorized step (step_gait()/set_limb_positions()).
+# The MobilityModels read their rows of the array directly.
 class MobilityHelper:
     def __init__(self, env):
         self.env = env
 
-        self.left_hand_direction = 1
-        self.left_hand_degree = -160
-        self.right_hand_direction = -1
-        self.right_hand_degree = 170
-
-        self.left_leg_direction = -1
-        self.left_leg_degree = 110
-        self.right_leg_direction = 1
-        self.right_leg_degree = -100
+        # swing angles (degrees) and directions of the left hand, right hand, left leg, right leg
+        self.degrees = LIMB_DEGREES.copy()
+        self.directions = LIMB_DIRECTIONS.copy()
 
         self.movement_cycle = 1     # seconds
         self.velocity = 0.5        # m/s
 
-        # static position
-        self.head = Vector(1.1, 1.8, 1)                 # x, y, z
-        self.left_upper_torso = Vector(1, 1.3, 1)
-        self.left_lower_torso = Vector(1, 1, 1)         # base position
-        self.right_upper_torso = Vector(1.2, 1.3, 1)
-        self.right_lower_torso = Vector(1.2, 1, 1)
-        self.left_shoulder = Vector(1, 1.6, 1)
-        self.right_shoulder = Vector(1.2, 1.6, 1)
-
-        # mobile position
-        self.left_elbow = Vector(0, 0, 0)
-        self.left_wrist = Vector(0, 0, 0)
-        self.right_elbow = Vector(0, 0, 0)
-        self.right_wrist = Vector(0, 0, 0)
-        self.left_knee = Vector(0, 0, 0)
-        self.left_ankle = Vector(0, 0, 0)
-        self.right_knee = Vector(0, 0, 0)
-        self.right_ankle = Vector(0, 0, 0)
+        self.positions = BODY_POSITIONS.copy()     # x, y, z of each BodyPosition
+
+        self.rng = random   # random number generator of the movements (e.g., random.Random(seed) per environment)
 
         self.mobility_list = list()
+        self.epoch = 0  # bumped whenever the positions are updated (used to invalidate cached link budgets)
 
     def add_mobility_list(self, m: MobilityModel):
+        m.helper = self
+        m.set_position_row(self.positions[m.get_body_position().value])
         self.mobility_list.append(m)
         self.update_position()
 
+    def get_epoch(self):
+        return self.epoch
+
+    def get_positions(self):
+        return self.positions
+
+    # Bring the positions up to date with env.now (nothing to do: the events of do_walking() update them)
+    def evaluate(self):
+        pass
+
+    def set_rng(self, rng):
+        self.rng = rng
+
+    # Shift the gait by the given angle (degrees) so that several bodies do not walk in phase
+    def set_phase(self, phase):
+        self.degrees = (self.degrees + phase + 180) % 360 - 180
+
     def do_walking(self, event):
-        self.move_left_hand()
-        self.move_right_hand()
-        self.move_left_leg()
-        self.move_right_leg()
+        self.move_limbs()
+
+        self.update_position()
+
+        call_later(self.env, self.movement_cycle, self.do_walking)
+
+    # Move the limbs once and keep the posture (static mobility)
+    def do_standing(self, event):
+        self.move_limbs()
 
         self.update_position()
 
-        event = self.env.event()
-        event._ok = True
-        event.callbacks.append(self.do_walking)
-        self.env.schedule(event, priority=0, delay=self.movement_cycle)
-
-    def move_left_hand(self):
-        if self.left_hand_direction == 1:
-            if self.left_hand_degree + self.velocity > 180:
-                self.left_hand_degree = -180
-            elif self.left_hand_degree < 0 and self.left_hand_degree + self.velocity > -90:
-                self.left_hand_direction = -1
-            else:
-                self.left_hand_degree += self.velocity
-        elif self.left_hand_direction == -1:
-            if self.left_hand_degree - self.velocity < -180:
-                self.left_hand_degree = 180
-            elif self.left_hand_degree > 0 and self.left_hand_degree + self.velocity < 90:
-                self.left_hand_direction = 1
-            else:
-                self.left_hand_degree -= self.velocity
-
-        # left elbow movement
-        a = math.radians(self.left_hand_degree)
-
-        direction_x = random.randint(0, 1)
-        if direction_x == 0:
-            direction_x = -1    # left direction
-        elif direction_x == 1:
-            direction_x = 1     # right direction
-
-        new_position = Vector(0, 0, 0)
-        new_position.x = random.uniform(0, 0.3) * direction_x
-        new_position.y = math.cos(-a) * 0.25    # 0.25 m => distance from left shoulder to left elbow
-        new_position.z = math.sin(-a) * 0.25
-
-        self.left_elbow.x = self.left_shoulder.x + new_position.x
-        self.left_elbow.y = self.left_shoulder.y + new_position.y
-        self.left_elbow.z = self.left_shoulder.z + new_position.z
-
-        # left wrist movement
-        self.left_wrist.x = self.left_elbow.x + new_position.x
-        self.left_wrist.y = self.left_elbow.y + new_position.y
-        self.left_wrist.z = self.left_elbow.z + new_position.z
-
-    def move_right_hand(self):
-        if self.right_hand_direction == 1:
-            if self.right_hand_degree + self.velocity > 180:
-                self.right_hand_degree = -180
-            elif self.right_hand_degree < 0 and self.right_hand_degree + self.velocity > -90:
-                self.right_hand_direction = -1
-            else:
-                self.right_hand_degree += self.velocity
-        elif self.right_hand_direction == -1:
-            if self.right_hand_degree - self.velocity < -180:
-                self.right_hand_degree = 180
-            elif self.right_hand_degree > 0 and self.right_hand_degree + self.velocity < 90:
-                self.right_hand_direction = 1
-            else:
-                self.right_hand_degree -= self.velocity
-
-        # right elbow movement
-        a = math.radians(self.right_hand_degree)
-
-        direction_x = random.randint(0, 1)
-        if direction_x == 0:
-            direction_x = -1    # left direction
-        elif direction_x == 1:
-            direction_x = 1     # right direction
-
-        new_position = Vector(0, 0, 0)
-        new_position.x = random.uniform(0, 0.3) * direction_x
-        new_position.y = math.cos(-a) * 0.25    # 0.25 m => distance from right shoulder to right elbow
-        new_position.z = math.sin(-a) * 0.25
-
-        self.right_elbow.x = self.right_shoulder.x + new_position.x
-        self.right_elbow.y = self.right_shoulder.y + new_position.y
-        self.right_elbow.z = self.right_shoulder.z + new_position.z
-
-        # right wrist movement
-        self.right_wrist.x = self.right_elbow.x + new_position.x
-        self.right_wrist.y = self.right_elbow.y + new_position.y
-        self.right_wrist.z = self.right_elbow.z + new_position.z
-
-    def move_left_leg(self):
-        if self.left_leg_direction == 1:
-            if self.left_leg_degree + self.velocity > 180:
-                self.left_leg_degree = -180
-            elif self.left_leg_degree < 0 and self.left_leg_degree + self.velocity > -50:
-                self.left_leg_direction = -1
-            else:
-                self.left_leg_degree += self.velocity
-        elif self.left_leg_direction == -1:
-            if self.left_leg_degree - self.velocity < -180:
-                self.left_leg_degree = 180
-            elif self.left_leg_degree > 0 and self.left_leg_degree + self.velocity < 50:
-                self.left_leg_direction = 1
-            else:
-                self.left_leg_degree -= self.velocity
-
-        # left knee movement
-        a = math.radians(self.left_leg_degree)
-
-        new_position = Vector(0, 0, 0)
-        new_position.x = 0
-        new_position.y = math.cos(-a) * 0.25    # 0.25 m => distance from left knee to left ankle
-        new_position.z = math.sin(-a) * 0.25
-
-        self.left_knee.x = self.left_lower_torso.x + new_position.x
-        self.left_knee.y = self.left_lower_torso.y + new_position.y
-        self.left_knee.z = self.left_lower_torso.z + new_position.z
-
-        # left ankle movement
-        self.left_ankle.x = self.left_knee.x + new_position.x
-        self.left_ankle.y = self.left_knee.y + new_position.y
-        self.left_ankle.z = self.left_knee.z + new_position.z
-
-    def move_right_leg(self):
-        if self.right_leg_direction == 1:
-            if self.right_leg_degree + self.velocity > 180:
-                self.right_leg_degree = -180
-            elif self.right_leg_degree < 0 and self.left_leg_degree + self.velocity > -50:
-                self.right_leg_direction = -1
-            else:
-                self.right_leg_degree += self.velocity
-        elif self.right_leg_direction == -1:
-            if self.right_leg_degree - self.velocity < -180:
-                self.right_leg_degree = 180
-            elif self.right_leg_degree > 0 and self.left_leg_degree + self.velocity < 50:
-                self.right_leg_direction = 1
-            else:
-                self.right_leg_degree -= self.velocity
-
-        # right knee movement
-        a = math.radians(self.right_leg_degree)
-
-        new_position = Vector(0, 0, 0)
-        new_position.x = 0
-        new_position.y = math.cos(-a) * 0.25    # 0.25 m => distance from right lower torso to left knee
-        new_position.z = math.sin(-a) * 0.25
-
-        self.right_knee.x = self.right_lower_torso.x + new_position.x
-        self.right_knee.y = self.right_lower_torso.y + new_position.y
-        self.right_knee.z = self.right_lower_torso.z + new_position.z
-
-        # right ankle movement
-        self.right_ankle.x = self.right_knee.x + new_position.x
-        self.right_ankle.y = self.right_knee.y + new_position.y
-        self.right_ankle.z = self.right_knee.z + new_position.z
+    # Random sideways offsets (x) of the hands for one movement; the legs do not move sideways
+    def draw_offsets_x(self):
+        offsets_x = np.zeros(len(self.degrees))
+        for i in range(NUM_HANDS):
+            direction_x = self.rng.randint(0, 1)
+            if direction_x == 0:
+                direction_x = -1    # left direction
+            offsets_x[i] = self.rng.uniform(0, 0.3) * direction_x
+        return offsets_x
+
+    def move_limbs(self, positions=None):
+        if positions is None:
+            positions = self.positions
+        self.degrees, self.directions = step_gait(self.degrees, self.directions, self.velocity)
+        set_limb_positions(positions, self.degrees, self.draw_offsets_x())
 
     def do_stand(self, event):
         self.update_position()
@@ -265,35 +236,234 @@ class MobilityHelper:
     def do_sitting(self, event):
         self.update_position()
 
+    # The MobilityModels read their rows of self.positions: only the cached link budgets need to be invalidated
+    def update_position(self):
+        self.epoch += 1
+
+
+# Walking model evaluated on demand as a function of env.now: no do_walking() events are scheduled.
+# The gait keyframes (the body points after each movement; the first movement is at time 0, then one every
+# movement_cycle) are generated in order when they are needed, so the random draws of the gait are the same as
+# with do_walking(). The positions are evaluated once per time quantum (default: movement_cycle) at the start of the
+# quantum, and the epoch is bumped only when the quantum changes.
+# interpolate=False gives the positions of do_walking(); interpolate=True moves the body points linearly between
+# the two keyframes around the time (finer-grained positions with a quantum shorter than movement_cycle).
+class LazyMobilityHelper(MobilityHelper):
+    def __init__(self, env, quantum=None, interpolate=False):
+        super().__init__(env)
+        self.quantum = quantum      # seconds (None: movement_cycle)
+        self.interpolate = interpolate
+
+        self.keyframes = deque(maxlen=2)    # body points after the last two generated movements
+        self.num_keyframes = 0
+        self.current_quantum = None
+
+    def set_quantum(self, quantum):
+        self.quantum = quantum
+        self.current_quantum = None
+
+    def set_interpolate(self, interpolate):
+        self.interpolate = interpolate
+        self.current_quantum = None
+
+    def get_epoch(self):
+        self.evaluate()
+        return self.epoch
+
+    def add_keyframe(self):
+        positions = BODY_POSITIONS.copy()
+        self.move_limbs(positions)
+        self.keyframes.append(positions)
+        self.num_keyframes += 1
+
+    def evaluate(self):
+        quantum = self.quantum if self.quantum is not None else self.movement_cycle
+        q = int(self.env.now // quantum)
+        if q == self.current_quantum:
+            return
+        self.current_quantum = q
+
+        t = q * quantum
+        num_movements = int(t // self.movement_cycle) + 1   # movements done by time t
+        while self.num_keyframes < num_movements + (1 if self.interpolate else 0):
+            self.add_keyframe()
+
+        if self.interpolate:
+            # keyframes: movements num_movements and num_movements + 1
+            f = (t - (num_movements - 1) * self.movement_cycle) / self.movement_cycle
+            self.positions[:] = self.keyframes[0] + f * (self.keyframes[1] - self.keyframes[0])
+        else:
+            self.positions[:] = self.keyframes[-1]
+
+        self.update_position()
+
+
+# Positions replayed from a recorded trajectory file: a .npy array (num_frames, 15, 3) of the body points (x, y, z in
+# the frame of MobilityHelper, rows indexed by BodyPosition.value) sampled every sample_interval seconds.
+# The file is memory-mapped, so only the frames that are used are read, and the positions are evaluated on demand at
+# env.now like LazyMobilityHelper (no events): once per time quantum (default: sample_interval), with the epoch
+# bumped only when the quantum changes. interpolate=True moves the points linearly between the two frames around the
+# time; after the last frame the trace starts over (loop=True) or keeps the last frame.
+class TraceMobilityHelper(MobilityHelper):
+    def __init__(self, env, file_path, sample_interval, quantum=None, interpolate=False, loop=True):
+        super().__init__(env)
+        self.trace = np.load(file_path, mmap_mode='r')
+        if self.trace.ndim != 3 or self.trace.shape[1:] != (len(BodyPosition), 3) or len(self.trace) == 0:
+            raise ValueError('Invalid mobility trace shape %s: expected (num_frames, %d, 3)' %
+                             (self.trace.shape, len(BodyPosition)))
+        self.sample_interval = sample_interval  # seconds
+        self.quantum = quantum      # seconds (None: sample_interval)
+        self.interpolate = interpolate
+        self.loop = loop
+        self.current_quantum = None
+
+    def get_num_frames(self):
+        return len(self.trace)
+
+    def get_epoch(self):
+        self.evaluate()
+        return self.epoch
+
+    def get_frame_index(self, k):
+        if self.loop is True:
+            return k % len(self.trace)
+        return min(k, len(self.trace) - 1)
+
+    def evaluate(self):
+        quantum = self.quantum if self.quantum is not None else self.sample_interval
+        q = int(self.env.now // quantum)
+        if q == self.current_quantum:
+            return
+        self.current_quantum = q
+
+        f = q * quantum / self.sample_interval
+        k = int(f)
+        frame = self.trace[self.get_frame_index(k)]
+        if self.interpolate is True and f > k:
+            next_frame = self.trace[self.get_frame_index(k + 1)]
+            self.positions[:] = frame + (f - k) * (next_frame.astype(np.float64) - frame)
+        else:
+            self.positions[:] = frame
+
+        self.update_position()
+
+
+# Record num_frames movements of a mobility helper (e.g., MobilityHelper, one frame per movement_cycle) as a trace
+# file of TraceMobilityHelper; the frames are written to the memory-mapped file one by one
+def record_mobility_trace(file_path, helper: MobilityHelper, num_frames, dtype=np.float32):
+    trace = np.lib.format.open_memmap(file_path, mode='w+', dtype=dtype, shape=(num_frames, len(BodyPosition), 3))
+    for k in range(num_frames):
+        helper.move_limbs()
+        trace[k] = helper.positions
+    trace.flush()
+    del trace
+
+
+# Vertical axis (x, z) around which a body of PopulationMobilityHelper is turned to its heading
+BODY_AXIS = np.array([1.1, 0, 1])
+
+
+# Walking model of many bodies (e.g., a hospital ward or a crowd with one BAN per person): the body points of all
+# the bodies are one (num_bodies, 15, 3) array, and the limbs of all the bodies move in one vectorized step
+# (step_gait()/set_limb_positions()). Each body has its own gait phase (degrees), heading (degrees, turned around
+# the vertical y axis) and offset (x, y, z) of its place. MobilityModels are attached to a (body, BodyPosition) pair
+# and read their rows directly; the line of sight is decided from the rows of the body frame (front/back of each
+# body), so every body has the line of sight pattern of MobilityHelper wherever it stands.
+class PopulationMobilityHelper:
+    def __init__(self, env, num_bodies, offsets=None, headings=None, phases=None, seed=None):
+        self.env = env
+        self.num_bodies = num_bodies
+
+        self.degrees = np.tile(LIMB_DEGREES, (num_bodies, 1))
+        self.directions = np.tile(LIMB_DIRECTIONS, (num_bodies, 1))
+
+        self.movement_cycle = 1     # seconds
+        self.velocity = 0.5        # m/s
+
+        self.offsets = np.zeros((num_bodies, 3))
+        self.headings = np.zeros(num_bodies)
+        self.body_frame = np.tile(BODY_POSITIONS, (num_bodies, 1, 1))   # body points of each body before placing
+        self.positions = np.zeros((num_bodies, len(BodyPosition), 3))   # placed body points
+
+        self.rng = np.random.default_rng(seed)  # random number generator of the movements (NumPy Generator)
+
+        self.mobility_list = list()
+        self.epoch = 0  # bumped whenever the positions are updated (used to invalidate cached link budgets)
+
+        if offsets is not None:
+            self.offsets[:] = offsets
+        if headings is not None:
+            self.headings[:] = headings
+        if phases is not None:
+            self.set_phases(phases)
+        self.place_bodies()
+
+    def add_mobility_list(self, m: MobilityModel, body=0):
+        m.helper = self
+        m.set_position_row(self.positions[body, m.get_body_position().value],
+                           self.body_frame[body, m.get_body_position().value])
+        self.mobility_list.append(m)
+        self.update_position()
+
+    def get_epoch(self):
+        return self.epoch
+
+    def get_positions(self):
+        return self.positions
+
+    def evaluate(self):
+        pass
+
+    def set_rng(self, rng):
+        self.rng = rng
+
+    # Shift the gait of each body by its angle (degrees)
+    def set_phases(self, phases):
+        self.degrees = (self.degrees + np.asarray(phases, dtype=np.float64)[:, None] + 180) % 360 - 180
+
+    def set_headings(self, headings):
+        self.headings[:] = headings
+        self.place_bodies()
+        self.update_position()
+
+    def set_offsets(self, offsets):
+        self.offsets[:] = offsets
+        self.place_bodies()
+        self.update_position()
+
+    def do_walking(self, event):
+        self.move_limbs()
+
+        self.update_position()
+
+        call_later(self.env, self.movement_cycle, self.do_walking)
+
+    # Move the limbs once and keep the posture (static mobility)
+    def do_standing(self, event):
+        self.move_limbs()
+
+        self.update_position()
+
+    # Random sideways offsets (x) of the hands of all the bodies for one movement; the legs do not move sideways
+    def draw_offsets_x(self):
+        offsets_x = np.zeros(self.degrees.shape)
+        directions_x = np.where(self.rng.integers(0, 2, (self.num_bodies, NUM_HANDS)) == 0, -1, 1)
+        offsets_x[:, :NUM_HANDS] = self.rng.uniform(0, 0.3, (self.num_bodies, NUM_HANDS)) * directions_x
+        return offsets_x
+
+    def move_limbs(self):
+        self.degrees, self.directions = step_gait(self.degrees, self.directions, self.velocity)
+        set_limb_positions(self.body_frame, self.degrees, self.draw_offsets_x())
+        self.place_bodies()
+
+    # Turn each body around BODY_AXIS to its heading and move it by its offset (in place: the rows stay valid)
+    def place_bodies(self):
+        a = np.radians(self.headings)[:, None]
+        x = self.body_frame[..., 0] - BODY_AXIS[0]
+        z = self.body_frame[..., 2] - BODY_AXIS[2]
+        self.positions[..., 0] = BODY_AXIS[0] + np.cos(a) * x + np.sin(a) * z + self.offsets[:, None, 0]
+        self.positions[..., 1] = self.body_frame[..., 1] + self.offsets[:, None, 1]
+        self.positions[..., 2] = BODY_AXIS[2] - np.sin(a) * x + np.cos(a) * z + self.offsets[:, None, 2]
+
     def update_position(self):
-        for mob_list in self.mobility_list:
-            if mob_list.get_body_position() == BodyPosition.head:
-                mob_list.set_position(self.head)
-            elif mob_list.get_body_position() == BodyPosition.left_upper_torso:
-                mob_list.set_position(self.left_upper_torso)
-            elif mob_list.get_body_position() == BodyPosition.left_lower_torso:
-                mob_list.set_position(self.left_lower_torso)
-            elif mob_list.get_body_position() == BodyPosition.right_upper_torso:
-                mob_list.set_position(self.right_upper_torso)
-            elif mob_list.get_body_position() == BodyPosition.right_lower_torso:
-                mob_list.set_position(self.right_lower_torso)
-            elif mob_list.get_body_position() == BodyPosition.left_shoulder:
-                mob_list.set_position(self.left_shoulder)
-            elif mob_list.get_body_position() == BodyPosition.right_shoulder:
-                mob_list.set_position(self.right_shoulder)
-            elif mob_list.get_body_position() == BodyPosition.left_elbow:
-                mob_list.set_position(self.left_elbow)
-            elif mob_list.get_body_position() == BodyPosition.left_wrist:
-                mob_list.set_position(self.left_wrist)
-            elif mob_list.get_body_position() == BodyPosition.right_elbow:
-                mob_list.set_position(self.right_elbow)
-            elif mob_list.get_body_position() == BodyPosition.right_wrist:
-                mob_list.set_position(self.right_wrist)
-            elif mob_list.get_body_position() == BodyPosition.left_knee:
-                mob_list.set_position(self.left_knee)
-            elif mob_list.get_body_position() == BodyPosition.left_ankle:
-                mob_list.set_position(self.left_ankle)
-            elif mob_list.get_body_position() == BodyPosition.right_knee:
-                mob_list.set_position(self.right_knee)
-            elif mob_list.get_body_position() == BodyPosition.right_ankle:
-                mob_list.set_position(self.right_ankle)
+        self.epoch += 1
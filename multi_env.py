@@ -0,0 +1,85 @@
+import argparse
+from scenario import Scenario, make_config, load_config, make_scenario_policy
+
+
+# K copies of a scenario config with their own seeds (private random number generators) and gait phases
+def make_env_configs(config=None, num_envs=4):
+    base = make_config(config)
+    configs = list()
+    for k in range(num_envs):
+        mobility = dict(base['mobility'], phase=base['mobility']['phase'] + k * 360 / num_envs)
+        configs.append(make_config(base, seed=base['seed'] + k, private_rng=True, mobility=mobility))
+    return configs
+
+
+# Runs K independent BAN environments that feed one shared DQN trainer or policy (one replay memory).
+# The environments advance round-robin: each one runs until its next beacon asks for actions, then the action
+# queries of all the environments are answered with a single forward pass of the Q-network.
+class MultiEnvRunner:
+    def __init__(self, configs, policy=None):
+        if policy is None:
+            policy = make_scenario_policy(make_config(configs[0]))
+        self.policy = policy
+
+        self.scenarios = list()
+        for config in configs:
+            scenario = Scenario(config, policy).build()
+            scenario.agent.m_sscs.set_defer_action_query(True)
+            self.scenarios.append(scenario)
+
+        self.num_batches = 0
+        self.num_queries = 0
+
+    # Advance the environment until its agent has a pending beacon or the next event is at or after until
+    @staticmethod
+    def advance(scenario, until):
+        env = scenario.env
+        sscs = scenario.agent.m_sscs
+        while sscs.has_pending_beacon() is False and env.peek() < until:
+            env.step()
+        return sscs.has_pending_beacon()
+
+    def run(self, until):
+        while True:
+            pending = [scenario.agent.m_sscs for scenario in self.scenarios if self.advance(scenario, until)]
+            if len(pending) == 0:
+                break
+
+            queries = [sscs.get_action_query() for sscs in pending]
+            actions = self.policy.get_actions([state for query in queries for state in query])
+            self.num_batches += 1
+            self.num_queries += len(pending)
+
+            start = 0
+            for sscs, query in zip(pending, queries):
+                sscs.complete_beacon(actions[start:start + len(query)])
+                start += len(query)
+
+        # no event before until is left: move the clocks to until
+        for scenario in self.scenarios:
+            scenario.env.run(until=until)
+        return self.get_results()
+
+    # Per-node results of each environment
+    def get_results(self):
+        return [scenario.get_results() for scenario in self.scenarios]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config', nargs='?', default=None, help='JSON scenario file (default: wban_test.py network)')
+    parser.add_argument('--num-envs', type=int, default=4)
+    parser.add_argument('--run-time', type=float, default=None, help='override the run time of the scenario')
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config is not None else make_config()
+    if args.run_time is not None:
+        config['run_time'] = args.run_time
+
+    runner = MultiEnvRunner(make_env_configs(config, args.num_envs))
+    results = runner.run(config['run_time'])
+    print('%d environments, %d batched action queries (%d beacons)' %
+          (args.num_envs, runner.num_batches, runner.num_queries))
+    for k, env_results in enumerate(results):
+        for result in env_results:
+            print('env %d:' % k, result)
@@ -1,12 +1,15 @@
 import simpy
 from wban_protocol_stack import *
-from dqn_trainer import *
 
  
 class Agent:
-    def __init__(self, env):
+    def __init__(self, env, seed=42, dqn_trainer=None):
         self.env = env
-        self.dqn_trainer = DQNTrainer()
+        # dqn_trainer: the tx power allocation policy (see policy.py), e.g., a DQNEvaluator or a baseline
+        if dqn_trainer is None:
+            from dqn_trainer import DQNTrainer     # imported on first use (TensorFlow/Keras are loaded lazily)
+            dqn_trainer = DQNTrainer(seed)
+        self.dqn_trainer = dqn_trainer
         self.m_sscs = BanSSCS()
         self.m_mac = BanMac()
         self.m_phy = BanPhy()
@@ -73,10 +76,7 @@ class Agent:
         return self.m_phy.get_channel()
 
     def start(self, event):
-        ev = self.env.event()
-        ev._ok = True
-        ev.callbacks.append(self.m_sscs.send_beacon)
-        self.env.schedule(ev, priority=0, delay=0)
+        call_later(self.env, 0, self.m_sscs.send_beacon)
 
 
 class Node:
@@ -91,6 +91,9 @@ class Node:
         self.m_tx_params = BanTxParams()
         self.m_config_complete = False
 
+        self.data_size = 500        # bytes
+        self.data_interval = 0.1    # seconds
+
         self.complete_config()
 
     def complete_config(self):
@@ -132,6 +135,10 @@ class Node:
         self.m_sscs.set_tx_params(self.m_tx_params)
         self.m_mac.set_mac_params(self.m_tx_params)
 
+    def set_data_rate(self, data_size, data_interval):
+        self.data_size = data_size
+        self.data_interval = data_interval
+
     def get_mac(self):
         return self.m_mac
 
@@ -143,10 +150,7 @@ class Node:
 
     def generate_data(self, event):
         # TODO: Generate a data packet based on a node's sampling rate
-        self.m_tx_pkt = Packet(500)
+        self.m_tx_pkt = self.m_mac.new_packet(self.data_size)
         self.m_sscs.send_data(self.m_tx_pkt)
 
-        ev = self.env.event()
-        ev._ok = True
-        ev.callbacks.append(self.generate_data)
-        self.env.schedule(ev, priority=0, delay=0.1)
+        call_later(self.env, self.data_interval, self.generate_data)
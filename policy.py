@@ -0,0 +1,167 @@
+import math
+import random
+import numpy as np
+
+ACTION_SET = [-25, -24, -23, -22, -21, -20, -18, -16, -14, -12, -10, -8, -6, -4, -2]    # tx power (dBm) of each action
+NUM_ACTIONS = len(ACTION_SET)
+
+
+# Resource allocation (tx power) policy of the agent (BanSSCS).
+# At each beacon, get_actions() returns one action (index of ACTION_SET) per node state (rx power, distance);
+# set_observation() feeds back the result and returns True when the node starts a new episode (the state of the
+# node is reset to the initial state), False to keep the observed state as the node's state.
+class Policy:
+    def __init__(self):
+        self.env = None
+        self.net_env = None   # BAN environment
+
+    def get_action(self, current_state):
+        return self.get_actions([current_state])[0]
+
+    def get_actions(self, current_states):
+        raise NotImplementedError
+
+    def set_observation(self, current_state, current_action, next_state, reward, steps, done):
+        # no learning and no episodes: the node keeps its last observed state
+        return False
+
+    def set_env(self, env):
+        self.env = env
+
+    def get_env(self):
+        return self.env
+
+    def set_sscs(self, m_sscs):
+        self.net_env = m_sscs
+
+    def get_sscs(self):
+        return self.net_env
+
+
+# Index of the lowest tx power that is at least the given power (the highest one if none)
+def get_action_for_power(tx_power):
+    for action, power in enumerate(ACTION_SET):
+        if power >= tx_power:
+            return action
+    return NUM_ACTIONS - 1
+
+
+# Always the same tx power
+class FixedPowerPolicy(Policy):
+    def __init__(self, tx_power=-10):
+        super().__init__()
+        self.action = get_action_for_power(tx_power)
+
+    def get_actions(self, current_states):
+        return [self.action] * len(current_states)
+
+
+# RSSI-threshold power control: the lowest tx power at which the rx power of the node reaches the rx sensitivity
+# (minus the PHY noise term, see BanPhy.start_rx) plus a margin. The path loss is estimated from the last
+# observation of the node (the rx power measured with the tx power of its action); a lost frame raises the tx power
+# by one step, and the highest tx power is used while nothing was observed (initial state).
+# The decisions are kept per observed state: the SSCS keeps the observed state as the node's state (set_observation()
+# returns False), so the state of the next action query identifies the observation.
+class RssiThresholdPolicy(Policy):
+    def __init__(self, rx_sensitivity=-82, margin=3, noise=-10, max_states=4096):
+        super().__init__()
+        self.action_set = np.array(ACTION_SET)
+        self.target_rx_power = rx_sensitivity - noise + margin
+        self.max_states = max_states
+        self.state_actions = dict()     # observed state -> action (oldest first)
+
+    def get_actions(self, current_states):
+        states = np.asarray(current_states, dtype=np.float64).reshape(-1, 2)
+        return [self.state_actions.get(state, NUM_ACTIONS - 1) for state in map(tuple, states.tolist())]
+
+    def set_observation(self, current_state, current_action, next_state, reward, steps, done):
+        if done is False:
+            # received: rx power = tx power - path loss
+            path_loss = ACTION_SET[current_action] - next_state[0]
+            action = min(int(np.searchsorted(self.action_set, self.target_rx_power + path_loss)), NUM_ACTIONS - 1)
+            state = tuple(next_state)
+        else:
+            # lost: the node keeps its state, one step more tx power
+            action = min(current_action + 1, NUM_ACTIONS - 1)
+            state = tuple(current_state)
+
+        self.state_actions.pop(state, None)
+        self.state_actions[state] = action
+        if len(self.state_actions) > self.max_states:
+            del self.state_actions[next(iter(self.state_actions))]
+        return False
+
+
+# Q-learning over a quantized (rx power, distance) state space with the episode and epsilon schedule of DQNTrainer
+class TabularQPolicy(Policy):
+    def __init__(self, seed=42, rx_power_bins=(-100, 0, 5), distance_bins=(0, 2, 0.1), learning_rate=0.1):
+        super().__init__()
+        self.episodes = 4000
+        self.epsilon = 1.0
+        self.min_epsilon = 0.1
+        self.exploration_ratio = 0.5
+        self.max_steps = 300
+        self.gamma = 0.99
+        self.learning_rate = learning_rate
+        self.current_episode = 0
+        self.epsilon_decay = (self.epsilon - self.min_epsilon) / (self.exploration_ratio * self.episodes)
+
+        # (min, max, step) of each state variable; values outside are put in the first/last bin
+        self.rx_power_bins = rx_power_bins
+        self.distance_bins = distance_bins
+        num_rx_power = math.ceil((rx_power_bins[1] - rx_power_bins[0]) / rx_power_bins[2])
+        num_distance = math.ceil((distance_bins[1] - distance_bins[0]) / distance_bins[2])
+        self.q_table = np.zeros((num_rx_power, num_distance, NUM_ACTIONS))
+        self.rng = random.Random(seed)
+
+    def get_state_index(self, state):
+        rx_power, distance = state
+        i = int((rx_power - self.rx_power_bins[0]) // self.rx_power_bins[2])
+        j = int((distance - self.distance_bins[0]) // self.distance_bins[2])
+        return min(max(i, 0), self.q_table.shape[0] - 1), min(max(j, 0), self.q_table.shape[1] - 1)
+
+    def get_actions(self, current_states):
+        actions = list()
+        greedy = self.current_episode > self.episodes
+        for state in current_states:
+            if greedy is False and self.rng.random() <= self.epsilon:
+                actions.append(self.rng.randrange(NUM_ACTIONS))
+            else:
+                actions.append(int(np.argmax(self.q_table[self.get_state_index(state)])))
+        return actions
+
+    def set_observation(self, current_state, current_action, next_state, reward, steps, done):
+        if self.current_episode > self.episodes:
+            return True
+
+        q_values = self.q_table[self.get_state_index(current_state)]
+        target = reward
+        if done is False:
+            target += self.gamma * self.q_table[self.get_state_index(next_state)].max()
+        q_values[current_action] += self.learning_rate * (target - q_values[current_action])
+
+        if done is True or steps > self.max_steps:
+            self.current_episode += 1
+            self.epsilon = max(self.epsilon - self.epsilon_decay, self.min_epsilon)
+            return True
+        return False
+
+
+POLICIES = ('dqn', 'dqn_evaluator', 'fixed_power', 'rssi_threshold', 'tabular_q')
+
+
+# Create a policy by name; kwargs are passed to its constructor (dqn_evaluator: file_path of exported weights)
+def make_policy(name='dqn', seed=42, **kwargs):
+    if name == 'dqn':
+        from dqn_trainer import DQNTrainer
+        return DQNTrainer(seed)
+    elif name == 'dqn_evaluator':
+        from dqn_inference import DQNEvaluator
+        return DQNEvaluator.load(**kwargs)
+    elif name == 'fixed_power':
+        return FixedPowerPolicy(**kwargs)
+    elif name == 'rssi_threshold':
+        return RssiThresholdPolicy(**kwargs)
+    elif name == 'tabular_q':
+        return TabularQPolicy(seed, **kwargs)
+    raise ValueError('Unknown policy: %s' % name)
@@ -0,0 +1,158 @@
+import numpy as np
+
+
+# Replay memory backed by preallocated arrays used as a ring buffer (the oldest transition is overwritten when full)
+class ReplayMemory:
+    ARRAY_NAMES = ('states', 'actions', 'rewards', 'next_states', 'dones')
+
+    def __init__(self, capacity=100000, state_dim=2, seed=None):
+        self.capacity = capacity
+        self.state_dim = state_dim
+        self.states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+
+        self.position = 0   # index of the next transition to write
+        self.size = 0
+        self.num_appended = 0   # transitions appended so far (including the overwritten ones)
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def append(self, transition):
+        current_state, action, reward, next_state, done = transition
+        i = self.position
+        self.states[i] = current_state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.num_appended += 1
+
+    def extend(self, transitions):
+        for transition in transitions:
+            self.append(transition)
+
+    def get_state(self):
+        return {'capacity': self.capacity, 'position': self.position, 'size': self.size,
+                'num_appended': self.num_appended}
+
+    def set_state(self, state):
+        self.position = state['position']
+        self.size = state['size']
+        self.num_appended = state['num_appended']
+
+    # Ring buffer indices of the transitions appended after the first num_appended ones (oldest first)
+    def get_indices_since(self, num_appended):
+        count = min(self.num_appended - num_appended, self.size)
+        return np.arange(self.position - count, self.position) % self.capacity
+
+    # Draw batch_size distinct transitions: (indices, states, actions, rewards, next_states, dones, weights)
+    def sample(self, batch_size):
+        indices = self.rng.choice(self.size, batch_size, replace=False)
+        return (indices, self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices], np.ones(batch_size, dtype=np.float32))
+
+    def update_priorities(self, indices, td_errors):
+        # uniform sampling: nothing to update
+        pass
+
+
+# Binary tree whose internal nodes hold the sum of their children (leaves: priorities).
+# Node 1 is the root, node i has the children 2i and 2i + 1, and the leaves are the nodes [size, 2 * size).
+class SumTree:
+    def __init__(self, capacity):
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.depth = self.size.bit_length() - 1
+        self.nodes = np.zeros(2 * self.size, dtype=np.float64)
+
+    def total(self):
+        return self.nodes[1]
+
+    def get(self, indices):
+        return self.nodes[np.asarray(indices) + self.size]
+
+    # Set the priorities of the given leaves and update their ancestors: O(log n) per leaf
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices) + self.size
+        self.nodes[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.nodes[nodes] = self.nodes[2 * nodes] + self.nodes[2 * nodes + 1]
+
+    # Indices of the leaves in which the given prefix sums fall: O(log n) per value
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values >= self.nodes[left]
+            values -= np.where(go_right, self.nodes[left], 0)
+            nodes = left + go_right
+        return nodes - self.size
+
+
+# Prioritized experience replay (T. Schaul et al., "Prioritized experience replay," ICLR 2016).
+# Transitions are drawn with probability p_i^alpha / sum_k p_k^alpha (p_i: |TD error| + eps), and the
+# importance-sampling weights (N * P(i))^-beta / max_j w_j correct the bias; beta is annealed to 1.
+class PrioritizedReplayMemory(ReplayMemory):
+    def __init__(self, capacity=100000, state_dim=2, seed=None, alpha=0.6, beta=0.4, beta_increment=0.001,
+                 eps=1e-6):
+        super().__init__(capacity, state_dim, seed)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment    # per sampled batch
+        self.eps = eps
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+
+    def append(self, transition):
+        index = self.position
+        super().append(transition)
+        # new transitions get the maximum priority so that they are replayed at least once
+        self.tree.update([index], self.max_priority ** self.alpha)
+
+    def sample(self, batch_size):
+        # stratified sampling: one value from each of batch_size equal segments of the total priority
+        total = self.tree.total()
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+
+        probabilities = self.tree.get(indices) / total
+        weights = (self.size * probabilities) ** -self.beta
+        weights = (weights / weights.max()).astype(np.float32)
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        return (indices, self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices], weights)
+
+    def get_state(self):
+        state = super().get_state()
+        state['max_priority'] = self.max_priority
+        state['beta'] = self.beta
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.max_priority = state['max_priority']
+        self.beta = state['beta']
+
+    # Priorities of all the slots (p_i^alpha, zero for the empty ones)
+    def get_priorities(self):
+        return self.tree.get(np.arange(self.capacity))
+
+    def set_priorities(self, priorities):
+        self.tree.update(np.arange(self.capacity), priorities)
+
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + self.eps
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(indices, priorities ** self.alpha)
@@ -0,0 +1,98 @@
+import argparse
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from event_core import *
+from scenario import Scenario, make_config, load_config
+
+
+# Two-sided 95% quantiles of Student's t-distribution (degrees of freedom: quantile)
+T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+        10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980}
+
+RESULT_METRICS = ('pkt_delivery_ratio', 'throughput', 'energy_consumption_ratio', 'queue_drops')
+
+
+# Two-sided 95% t quantile; between the tabulated degrees of freedom the next smaller one is used (larger quantile,
+# wider interval: conservative)
+def get_t_quantile(dof):
+    return T_95[max(d for d in T_95 if d <= dof)]
+
+
+# One replication of wban_test.py; returns the per-node results of the whole run
+def run_wban_test(seed, run_time=50000, engine='simpy'):
+    return Scenario(make_config(seed=seed, run_time=run_time, engine=engine)).run()
+
+
+# One replication of a scenario config (dict) with the given seed
+def run_scenario(seed, config):
+    return Scenario(make_config(config, seed=seed)).run()
+
+
+# Mean, sample standard deviation and 95% confidence interval half-width of each metric per node
+def aggregate_results(replications):
+    summary = dict()
+    for node_results in zip(*replications):
+        node_id = node_results[0]['node_id']
+        summary[node_id] = dict()
+        for metric in RESULT_METRICS:
+            values = np.array([result[metric] for result in node_results], dtype=float)
+            mean = values.mean()
+            if len(values) > 1:
+                std = values.std(ddof=1)
+                half_width = get_t_quantile(len(values) - 1) * std / math.sqrt(len(values))
+            else:
+                std = half_width = float('nan')
+            summary[node_id][metric] = {'mean': mean, 'std': std, 'ci95': half_width}
+    return summary
+
+
+# Run the scenario once per seed across a process pool; scenario(seed, *args) must be picklable
+def run_replications(scenario, seeds, *args, processes=None):
+    # 'spawn' gives every replication a fresh interpreter (no TensorFlow state inherited from the parent)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        futures = [executor.submit(scenario, seed, *args) for seed in seeds]
+        return [future.result() for future in futures]
+
+
+def show_summary(summary, num_replications):
+    print('Performance results (%d replications, mean +/- 95%% CI)' % num_replications)
+    for node_id, metrics in summary.items():
+        pdr = metrics['pkt_delivery_ratio']
+        throughput = metrics['throughput']
+        energy = metrics['energy_consumption_ratio']
+        drops = metrics['queue_drops']
+        print('NID %d: PDR %.2f +/- %.2f %%, throughput %.3f +/- %.3f kbps, '
+              'energy %.3f +/- %.3f %%, queue drops %.1f +/- %.1f' %
+              (node_id, pdr['mean'] * 100, pdr['ci95'] * 100, throughput['mean'] / 1000,
+               throughput['ci95'] / 1000, energy['mean'], energy['ci95'], drops['mean'], drops['ci95']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config', nargs='?', default=None, help='JSON scenario file (default: wban_test.py network)')
+    parser.add_argument('--replications', type=int, default=8)
+    parser.add_argument('--run-time', type=float, default=None,
+                        help='simulated seconds per replication (default: run_time of the config, or 50000)')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: number of CPUs)')
+    parser.add_argument('--seed', type=int, default=42, help='seed of the first replication')
+    parser.add_argument('--engine', choices=ENGINES, default=None,
+                        help='simulation engine (default: engine of the config, or simpy)')
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.replications)
+    if args.config is None:
+        run_time = args.run_time if args.run_time is not None else 50000
+        engine = args.engine if args.engine is not None else 'simpy'
+        replications = run_replications(run_wban_test, seeds, run_time, engine, processes=args.processes)
+    else:
+        # the options given on the command line override the config
+        config = load_config(args.config)
+        if args.run_time is not None:
+            config['run_time'] = args.run_time
+        if args.engine is not None:
+            config['engine'] = args.engine
+        replications = run_replications(run_scenario, seeds, config, processes=args.processes)
+    show_summary(aggregate_results(replications), args.replications)
@@ -0,0 +1,303 @@
+import argparse
+import copy
+import itertools
+import json
+import math
+import random
+import numpy as np
+from event_core import *
+from tools import set_random_seed
+from policy import make_policy
+
+
+# The network of wban_test.py
+DEFAULT_SCENARIO = {
+    'engine': 'simpy',          # simulation engine: 'simpy' or 'event_core'
+    'seed': 42,
+    'private_rng': False,       # True: the mobility and the CSMA/CA of this scenario draw from random.Random(seed)
+    'run_time': 50000,          # seconds
+    'ban_id': 0,
+    'agent': {'node_id': 10, 'body_position': 'right_lower_torso'},
+    'num_nodes': 8,             # used when 'nodes' is not given (ids 1, 2, ... but the agent's, body positions in turn)
+    'body_positions': ['left_elbow', 'left_wrist', 'right_elbow', 'right_wrist',
+                       'left_knee', 'left_ankle', 'right_knee', 'right_ankle'],
+    'nodes': None,              # or a list of {'node_id', 'body_position', 'data_size', 'data_interval'}
+    'data_size': 500,           # bytes
+    'data_interval': 0.1,       # seconds
+    # min_rx_power (dBm)/max_distance (m): fan-out cutoff of the channel (None: every frame reaches every node)
+    'channel': {'frequency': 0.915e9, 'propagation_speed': 299792458, 'min_rx_power': None, 'max_distance': None},
+    # mode: 'walking', 'lazy_walking' (evaluated on demand, quantum/interpolate: see LazyMobilityHelper), 'static' or
+    # 'trace' (replay of the .npy trace_file sampled every trace_interval seconds, default: movement_cycle)
+    'mobility': {'mode': 'walking', 'movement_cycle': 1, 'velocity': 0.5, 'phase': 0, 'quantum': None,
+                 'interpolate': False, 'trace_file': None, 'trace_interval': None},
+    'policy': {'name': 'dqn'},  # tx power allocation policy: make_policy(name, seed, other keys)
+    'dqn': {'train_freq': 1, 'gradient_steps': 1, 'async_training': False, 'prioritized_replay': False},
+    'result_interval': None,    # seconds between show_result() prints of each window (None: no periodic prints)
+    'population': {'num_bodies': 1, 'spacing': 3.0},    # PopulationScenario: bodies (BANs) on a grid, metres apart
+}
+
+MOBILITY_MODES = ('walking', 'lazy_walking', 'static', 'trace')
+
+
+# Return a complete scenario config: the given (partial) config on top of DEFAULT_SCENARIO
+def make_config(config=None, **kwargs):
+    merged = copy.deepcopy(DEFAULT_SCENARIO)
+    for key, value in dict(config or {}, **kwargs).items():
+        if key not in merged:
+            raise ValueError('Unknown scenario key: %s' % key)
+        if isinstance(merged[key], dict) and isinstance(value, dict):
+            merged[key].update(value)
+        else:
+            merged[key] = value
+    if merged['mobility']['mode'] not in MOBILITY_MODES:
+        raise ValueError('Unknown mobility mode: %s' % merged['mobility']['mode'])
+    if merged['mobility']['mode'] == 'trace' and merged['mobility']['trace_file'] is None:
+        raise ValueError('The trace mobility mode needs a trace_file')
+    return merged
+
+
+def load_config(file_path):
+    with open(file_path) as f:
+        return make_config(json.load(f))
+
+
+# Every combination of the given values, e.g., sweep_configs(config, num_nodes=[2, 4, 8], seed=[1, 2])
+def sweep_configs(config=None, **grid):
+    keys = list(grid.keys())
+    return [make_config(config, **dict(zip(keys, values))) for values in itertools.product(*grid.values())]
+
+
+# Node configs with all the keys set. The default node ids are 1, 2, ... skipping the agent id and the given ids;
+# duplicate ids (also the agent id) raise ValueError
+def get_node_configs(config):
+    if config['nodes'] is not None:
+        node_configs = config['nodes']
+    else:
+        body_positions = config['body_positions']
+        node_configs = [{'body_position': body_positions[i % len(body_positions)]}
+                        for i in range(config['num_nodes'])]
+
+    agent_id = config['agent']['node_id']
+    given_ids = {node_config['node_id'] for node_config in node_configs if 'node_id' in node_config}
+    default_ids = (n_id for n_id in itertools.count(1) if n_id != agent_id and n_id not in given_ids)
+    result = list()
+    used_ids = {agent_id}
+    for node_config in node_configs:
+        n_id = node_config['node_id'] if 'node_id' in node_config else next(default_ids)
+        if n_id in used_ids:
+            raise ValueError('Duplicate node id: %s' % n_id)
+        used_ids.add(n_id)
+        result.append({'node_id': n_id,
+                       'body_position': node_config['body_position'],
+                       'data_size': node_config.get('data_size', config['data_size']),
+                       'data_interval': node_config.get('data_interval', config['data_interval'])})
+    return result
+
+
+# Apply the 'dqn' part of the config to a trainer
+def configure_trainer(dqn_trainer, config):
+    dqn_config = dict(config['dqn'])
+    if dqn_config.pop('prioritized_replay') is True:
+        dqn_trainer.set_prioritized_replay()
+    dqn_trainer.set_training_schedule(**dqn_config)
+
+
+# The policy of the 'policy' part of the config (a DQNTrainer is configured with the 'dqn' part)
+def make_scenario_policy(config):
+    policy_config = dict(config['policy'])
+    policy = make_policy(policy_config.pop('name'), config['seed'], **policy_config)
+    if config['policy']['name'] == 'dqn':
+        configure_trainer(policy, config)
+    return policy
+
+
+class Scenario:
+    # policy: a policy (e.g., DQNTrainer) shared with other scenarios (None: created from the config)
+    def __init__(self, config=None, policy=None):
+        self.config = make_config(config)
+        self.policy = policy
+        self.env = None
+        self.channel = None
+        self.mobility_helper = None
+        self.agent = None
+        self.nodes = list()
+
+    # Assemble the BAN on a new (or the given) simulation environment and schedule its start events
+    def build(self, env=None):
+        from mobility_model import MobilityHelper, LazyMobilityHelper, TraceMobilityHelper
+
+        config = self.config
+        set_random_seed(config['seed'])
+        self.env = env if env is not None else make_env(config['engine'])
+        self.channel = self.build_channel()
+
+        if config['mobility']['mode'] == 'lazy_walking':
+            self.mobility_helper = LazyMobilityHelper(self.env, config['mobility']['quantum'],
+                                                      config['mobility']['interpolate'])
+        elif config['mobility']['mode'] == 'trace':
+            trace_interval = config['mobility']['trace_interval']
+            self.mobility_helper = TraceMobilityHelper(self.env, config['mobility']['trace_file'],
+                                                       trace_interval if trace_interval is not None else
+                                                       config['mobility']['movement_cycle'],
+                                                       config['mobility']['quantum'], config['mobility']['interpolate'])
+        else:
+            self.mobility_helper = MobilityHelper(self.env)
+        self.mobility_helper.movement_cycle = config['mobility']['movement_cycle']
+        self.mobility_helper.velocity = config['mobility']['velocity']
+        self.mobility_helper.set_phase(config['mobility']['phase'])
+        rng = random.Random(config['seed']) if config['private_rng'] is True else random
+        self.mobility_helper.set_rng(rng)
+
+        policy = self.policy if self.policy is not None else make_scenario_policy(config)
+        self.agent, self.nodes = self.build_ban(config['ban_id'], policy, rng, self.mobility_helper.add_mobility_list)
+
+        call_later(self.env, 0, self.agent.start, *[node.generate_data for node in self.nodes])
+        if config['mobility']['mode'] == 'walking':
+            call_later(self.env, 0, self.mobility_helper.do_walking)
+        elif config['mobility']['mode'] == 'static':
+            call_later(self.env, 0, self.mobility_helper.do_standing)
+
+        if config['result_interval'] is not None:
+            for node in self.nodes:
+                node.m_mac.set_result_interval(config['result_interval'])
+            call_later(self.env, config['result_interval'], *[node.m_mac.show_result for node in self.nodes])
+        return self
+
+    # The channel shared by all the nodes
+    def build_channel(self):
+        from node import BanChannel, PropLossModel, PropDelayModel
+
+        config = self.config
+        channel = BanChannel(self.env)
+        prop_loss_model = PropLossModel()
+        prop_loss_model.set_frequency(config['channel']['frequency'])
+        prop_delay_model = PropDelayModel()
+        prop_delay_model.m_delay = config['channel']['propagation_speed']
+        channel.set_prop_loss_model(prop_loss_model)
+        channel.set_prop_delay_model(prop_delay_model)
+        # 0 dBm: the highest tx power of the nodes (beacons)
+        channel.set_fan_out_cutoff(config['channel']['min_rx_power'], config['channel']['max_distance'], 0)
+        return channel
+
+    # Create the agent and the nodes of one BAN on the channel: returns (agent, nodes).
+    # add_mobility(mobility_model) attaches their mobility models to a mobility helper (the agent last).
+    def build_ban(self, ban_id, policy, rng, add_mobility):
+        from node import Node, Agent
+        from mobility_model import MobilityModel, BodyPosition
+
+        config = self.config
+        agent_id = config['agent']['node_id']
+        agent = Agent(self.env, config['seed'], policy)
+        agent.m_csma_ca.set_rng(rng)
+        agent.set_device_params(ban_id, agent_id, None)
+        agent.set_channel(self.channel)
+        agent.m_phy.set_mobility(MobilityModel(BodyPosition[config['agent']['body_position']]))
+
+        nodes = list()
+        for node_config in get_node_configs(config):
+            node = Node(self.env)
+            node.set_device_params(ban_id, node_config['node_id'], agent_id)
+            node.set_data_rate(node_config['data_size'], node_config['data_interval'])
+            node.m_csma_ca.set_rng(rng)
+            node.set_channel(self.channel)
+            node.m_phy.set_mobility(MobilityModel(BodyPosition[node_config['body_position']]))
+            agent.set_node_list(node_config['node_id'])
+            add_mobility(node.m_phy.get_mobility())
+            nodes.append(node)
+        add_mobility(agent.m_phy.get_mobility())
+        return agent, nodes
+
+    # Run the scenario for its run time and return the per-node results
+    def run(self):
+        if self.env is None:
+            self.build()
+        self.env.run(until=self.config['run_time'])
+        return self.get_results()
+
+    def get_results(self):
+        return [node.m_mac.get_result() for node in self.nodes]
+
+
+# One BAN per body of a PopulationMobilityHelper (ban ids ban_id, ban_id + 1, ...), all on one channel and with one
+# shared policy. The bodies stand on a square grid ('population': 'spacing' metres apart) with random headings and
+# gait phases drawn from the seed; every BAN has the agent and nodes of the config and starts at a random time
+# within its first beacon interval.
+class PopulationScenario(Scenario):
+    def __init__(self, config=None, policy=None):
+        super().__init__(config, policy)
+        self.bans = list()  # (agent, nodes) of each body
+
+    def build(self, env=None):
+        from mobility_model import PopulationMobilityHelper
+
+        config = self.config
+        if config['mobility']['mode'] in ('lazy_walking', 'trace'):
+            raise ValueError('PopulationScenario does not support the %s mobility mode' % config['mobility']['mode'])
+        set_random_seed(config['seed'])
+        self.env = env if env is not None else make_env(config['engine'])
+        self.channel = self.build_channel()
+
+        num_bodies = config['population']['num_bodies']
+        spacing = config['population']['spacing']
+        side = math.ceil(math.sqrt(num_bodies))
+        offsets = [((k % side) * spacing, 0, (k // side) * spacing) for k in range(num_bodies)]
+        placement_rng = np.random.default_rng(config['seed'])
+        headings = placement_rng.uniform(0, 360, num_bodies)
+        phases = config['mobility']['phase'] + placement_rng.uniform(-180, 180, num_bodies)
+        start_times = placement_rng.uniform(0, 1, num_bodies)  # fraction of the beacon interval
+
+        self.mobility_helper = PopulationMobilityHelper(self.env, num_bodies, offsets, headings, phases, config['seed'])
+        self.mobility_helper.movement_cycle = config['mobility']['movement_cycle']
+        self.mobility_helper.velocity = config['mobility']['velocity']
+        rng = random.Random(config['seed']) if config['private_rng'] is True else random
+
+        policy = self.policy if self.policy is not None else make_scenario_policy(config)
+        self.bans = list()
+        for body in range(num_bodies):
+            def add_mobility(mobility, body=body):
+                self.mobility_helper.add_mobility_list(mobility, body)
+            agent, nodes = self.build_ban(config['ban_id'] + body, policy, rng, add_mobility)
+            # the BANs are not synchronized: each one starts at a random time within its first beacon interval
+            call_later(self.env, start_times[body] * agent.m_sscs.beacon_interval, agent.start,
+                       *[node.generate_data for node in nodes])
+            self.bans.append((agent, nodes))
+        self.agent, self.nodes = self.bans[0]
+
+        if config['mobility']['mode'] == 'walking':
+            call_later(self.env, 0, self.mobility_helper.do_walking)
+        else:
+            call_later(self.env, 0, self.mobility_helper.do_standing)
+
+        if config['result_interval'] is not None:
+            for node in self.get_nodes():
+                node.m_mac.set_result_interval(config['result_interval'])
+            call_later(self.env, config['result_interval'], *[node.m_mac.show_result for node in self.get_nodes()])
+        return self
+
+    # Nodes of all the BANs (body by body)
+    def get_nodes(self):
+        return [node for _, nodes in self.bans for node in nodes]
+
+    # Per-node results of all the BANs (body by body)
+    def get_results(self):
+        return [node.m_mac.get_result() for node in self.get_nodes()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config', nargs='?', default=None, help='JSON scenario file (default: wban_test.py network)')
+    parser.add_argument('--run-time', type=float, default=None, help='override the run time of the scenario')
+    parser.add_argument('--num-bodies', type=int, default=None, help='run a PopulationScenario with this many BANs')
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config is not None else make_config()
+    if args.run_time is not None:
+        config['run_time'] = args.run_time
+
+    if args.num_bodies is not None:
+        config['population']['num_bodies'] = args.num_bodies
+        scenario = PopulationScenario(config)
+    else:
+        scenario = Scenario(config)
+    for result in scenario.run():
+        print(result)
@@ -0,0 +1,167 @@
+import numpy as np
+import pytest
+
+from checkpoint import CheckpointWriter, ReplayCheckpoint
+from replay_memory import PrioritizedReplayMemory, ReplayMemory
+
+
+def transition(i):
+    return (i, -i), i % 15, float(i), (i + 1, -i - 1), 0
+
+
+# Append transitions and write the rows appended since the previous checkpoint; returns the saved memory state
+def append_and_save(store, memory, first, last):
+    num_appended = memory.num_appended
+    memory.extend(transition(i) for i in range(first, last))
+    store.write(*store.snapshot(memory, num_appended))
+    return memory.get_state()
+
+
+def load(store, state, memory_class=ReplayMemory):
+    memory = memory_class(state['capacity'])
+    store.read(memory, state)
+    memory.set_state(state)
+    return memory
+
+
+def test_round_trip(tmp_path):
+    store = ReplayCheckpoint(str(tmp_path))
+    memory = ReplayMemory(8)
+    state = append_and_save(store, memory, 0, 5)
+
+    restored = load(store, state)
+    assert len(restored) == 5
+    for name in ReplayMemory.ARRAY_NAMES:
+        np.testing.assert_array_equal(getattr(restored, name), getattr(memory, name))
+
+
+def test_incremental_writes_after_wrap(tmp_path):
+    store = ReplayCheckpoint(str(tmp_path))
+    memory = ReplayMemory(8)
+    append_and_save(store, memory, 0, 6)
+    state = append_and_save(store, memory, 6, 11)    # the ring buffer wraps: rows 6, 7, 0, 1, 2
+
+    restored = load(store, state)
+    assert (restored.position, len(restored), restored.num_appended) == (3, 8, 11)
+    np.testing.assert_array_equal(restored.rewards, [8, 9, 10, 3, 4, 5, 6, 7])
+    np.testing.assert_array_equal(restored.get_indices_since(9), [1, 2])
+
+
+def test_older_checkpoint_is_read_while_its_rows_are_kept(tmp_path):
+    store = ReplayCheckpoint(str(tmp_path))
+    memory = ReplayMemory(8)
+    old_state = append_and_save(store, memory, 0, 4)
+    append_and_save(store, memory, 4, 8)
+
+    # the rows appended after the older checkpoint did not overwrite its rows
+    restored = load(store, old_state)
+    np.testing.assert_array_equal(restored.rewards[:4], [0, 1, 2, 3])
+
+
+def test_overwritten_checkpoint_is_rejected(tmp_path):
+    store = ReplayCheckpoint(str(tmp_path))
+    memory = ReplayMemory(8)
+    old_state = append_and_save(store, memory, 0, 4)
+    append_and_save(store, memory, 4, 10)
+
+    with pytest.raises(ValueError):
+        load(store, old_state)
+
+
+def test_newer_store_state_is_rejected(tmp_path):
+    store = ReplayCheckpoint(str(tmp_path))
+    memory = ReplayMemory(8)
+    append_and_save(store, memory, 0, 4)
+    memory.extend(transition(i) for i in range(4, 6))
+
+    # a state with rows that were never written
+    with pytest.raises(ValueError):
+        load(store, memory.get_state())
+
+
+def test_priorities_round_trip(tmp_path):
+    store = ReplayCheckpoint(str(tmp_path))
+    memory = PrioritizedReplayMemory(8)
+    memory.extend(transition(i) for i in range(4))
+    memory.update_priorities(np.arange(4), np.array([0.5, 1.0, 2.0, 4.0]))
+    store.write(*store.snapshot(memory))
+
+    restored = load(store, memory.get_state(), PrioritizedReplayMemory)
+    np.testing.assert_array_equal(restored.get_priorities(), memory.get_priorities())
+    assert restored.tree.total() == memory.tree.total()
+
+
+def test_trainer_round_trip(tmp_path):
+    pytest.importorskip('tensorflow')
+    from dqn_trainer import DQNTrainer
+
+    trainer = DQNTrainer(seed=7)
+    trainer.build_models()
+    trainer.replay_memory = ReplayMemory(8)
+    trainer.replay_memory.extend(transition(i) for i in range(5))
+    trainer.epsilon = 0.5
+    # the checkpoint directory is the one set when the checkpoint is saved
+    trainer.save_dir = str(tmp_path)
+    trainer.save_checkpoint(1)
+    trainer.wait_checkpoint()
+
+    restored = DQNTrainer()
+    restored.load_checkpoint(1, str(tmp_path))
+    assert restored.epsilon == 0.5
+    np.testing.assert_array_equal(restored.replay_memory.rewards, trainer.replay_memory.rewards)
+    states = trainer.replay_memory.states[:5]
+    np.testing.assert_array_equal(restored.q_network.predict(states), trainer.q_network.predict(states))
+    np.testing.assert_array_equal(restored.target_q_network.predict(states),
+                                  trainer.target_q_network.predict(states))
+
+
+def test_writer_keeps_running_after_a_failed_job():
+    writer = CheckpointWriter()
+    written = list()
+
+    def fail():
+        raise OSError('No space left on device')
+
+    writer.submit(fail)
+    writer.submit(written.append, 1)
+    with pytest.raises(OSError):
+        writer.wait()
+    assert written == [1]
+    assert writer.is_alive()
+
+    writer.submit(written.append, 2)
+    writer.wait()
+    assert written == [1, 2]
+
+
+def test_trainer_rewrites_the_rows_of_a_failed_checkpoint(tmp_path, monkeypatch):
+    pytest.importorskip('tensorflow')
+    from dqn_trainer import DQNTrainer
+
+    trainer = DQNTrainer()
+    trainer.replay_memory = ReplayMemory(8)
+    trainer.replay_memory.extend(transition(i) for i in range(3))
+    trainer.save_checkpoint(1, str(tmp_path))
+    trainer.wait_checkpoint()
+
+    write = ReplayCheckpoint.write
+
+    def fail(self, *args):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(ReplayCheckpoint, 'write', fail)
+    trainer.replay_memory.extend(transition(i) for i in range(3, 5))
+    trainer.save_checkpoint(2, str(tmp_path))
+    with pytest.raises(OSError):
+        trainer.wait_checkpoint()
+    assert trainer.checkpoint_num_appended == 3
+
+    monkeypatch.setattr(ReplayCheckpoint, 'write', write)
+    trainer.replay_memory.extend(transition(i) for i in range(5, 6))
+    trainer.save_checkpoint(3, str(tmp_path))
+    trainer.wait_checkpoint()
+    assert trainer.checkpoint_num_appended == 6
+
+    restored = DQNTrainer()
+    restored.load_checkpoint(3, str(tmp_path))
+    np.testing.assert_array_equal(restored.replay_memory.rewards[:6], [0, 1, 2, 3, 4, 5])
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from dqn_inference import NUM_ACTIONS, DQNEvaluator, NumpyQNetwork
+
+
+def make_weights(seed=0):
+    rng = np.random.default_rng(seed)
+    return [(rng.normal(size=(2, 24)), rng.normal(size=24), 'relu'),
+            (rng.normal(size=(24, NUM_ACTIONS)), rng.normal(size=NUM_ACTIONS), 'linear')]
+
+
+def test_predict():
+    weights = make_weights()
+    x = np.array([(-80, 0), (-60, 0.5)], dtype=np.float32)
+    expected = np.maximum(x @ weights[0][0] + weights[0][1], 0) @ weights[1][0] + weights[1][1]
+    np.testing.assert_allclose(NumpyQNetwork(weights).predict(x), expected, rtol=1e-4)
+
+
+def test_save_and_load(tmp_path):
+    q_network = NumpyQNetwork(make_weights())
+    q_network.save(str(tmp_path / 'model.npz'))
+    loaded = NumpyQNetwork.load(str(tmp_path / 'model.npz'))
+
+    x = np.array([(-70, 0.3)])
+    np.testing.assert_array_equal(loaded.predict(x), q_network.predict(x))
+    assert loaded.activations == ['relu', 'linear']
+
+
+def test_evaluator_is_greedy():
+    q_network = NumpyQNetwork(make_weights())
+    states = [(-80, 0), (-60, 0.5), (-75, 1.2)]
+    actions = DQNEvaluator(q_network).get_actions(states)
+    assert actions == np.argmax(q_network.predict(np.array(states)), axis=1).tolist()
+
+
+def test_predict_matches_keras():
+    pytest.importorskip('tensorflow')
+    from dqn_trainer import DQNTrainer
+
+    trainer = DQNTrainer()
+    trainer.build_models()
+    x = np.random.default_rng(0).uniform((-100, 0), (0, 2), (16, 2)).astype(np.float32)
+    np.testing.assert_allclose(trainer.q_network.predict(x), trainer.model(x).numpy(), rtol=1e-4, atol=1e-4)
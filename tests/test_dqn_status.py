@@ -0,0 +1,59 @@
+import numpy as np
+
+from wban_header import AssignedLinkElement, Beacon
+from wban_protocol_stack import REWARD_TABLE, BanSSCS, DqnStatusStore
+
+
+def test_add_node_grows_the_arrays():
+    status = DqnStatusStore(capacity=2)
+    rows = [status.add_node(n_id) for n_id in (3, 1, 8)]
+    assert rows == [0, 1, 2]
+    assert status.add_node(1) == 1
+    assert status.num_nodes == 3
+    assert len(status.node_id) == 4 and status.current_state.shape == (4, 2)
+    np.testing.assert_array_equal(status.node_id[:3], [3, 1, 8])
+    assert status.get_row(8) == 2 and status.get_row(5) is None
+
+
+def test_new_node_starts_an_episode():
+    status = DqnStatusStore()
+    row = status.add_node(1)
+    assert status.get_observation(row) == (DqnStatusStore.INITIAL_STATE, 0, (0, 0), 0, 0, True)
+
+    status.current_action[row] = 4
+    status.reward[row] = 8.0
+    status.next_state[row] = (-60, 0.5)
+    status.done[row] = False
+    status.steps[row] = 2
+    observation = status.get_observation(row)
+    assert observation == ((-80, 0), 4, (-60, 0.5), 8.0, 2, False)
+    assert [type(value) for value in observation] == [tuple, int, tuple, float, int, bool]
+
+    status.reset(row)
+    assert status.get_observation(row) == (DqnStatusStore.INITIAL_STATE, 0, (0, 0), 0, 0, True)
+
+
+def test_sscs_registers_its_nodes():
+    sscs = BanSSCS()
+    for n_id in (1, 2):
+        sscs.set_node_list(n_id)
+    assert sscs.node_list == [1, 2]
+    assert sscs.dqn_status.get_row(2) == 1
+
+
+def test_reward_table():
+    # lower tx power (action), higher reward
+    assert len(REWARD_TABLE) == len(BanSSCS.ACTION_SET)
+    assert np.all(np.diff(REWARD_TABLE) < 0)
+
+
+def test_beacon_link_lookup():
+    beacon = Beacon()
+    for n_id, start in ((1, 0), (2, 20), (1, 40)):
+        beacon.set_assigned_link_info(AssignedLinkElement(n_id, start, start + 19, -10))
+
+    assert len(beacon.assigned_slot_info) == 3
+    # the first element of an allocation id
+    assert beacon.get_assigned_link_info(1).interval_start == 0
+    assert beacon.get_assigned_link_info(2).interval_end == 39
+    assert beacon.get_assigned_link_info(3) is None
@@ -0,0 +1,148 @@
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from dqn_inference import NUM_ACTIONS
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prints the checksum of the initial Q-network weights of a trainer created in a new process
+BUILD_SCRIPT = '''
+from dqn_trainer import DQNTrainer
+trainer = DQNTrainer(seed=7)
+trainer.build_models()
+print(repr(sum(float(kernel.sum()) for kernel, _, _ in trainer.q_network.get_weights())))
+'''
+
+
+def get_weights_checksum(trainer):
+    return sum(float(kernel.sum()) for kernel, _, _ in trainer.q_network.get_weights())
+
+
+def test_construction_does_not_import_tensorflow():
+    script = 'import sys\nfrom dqn_trainer import DQNTrainer\nDQNTrainer()\nprint(\'tensorflow\' in sys.modules)'
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT_DIR, capture_output=True, text=True,
+                            check=True).stdout.split()
+    assert output == ['False']
+
+
+def test_initial_weights_depend_only_on_the_seed():
+    pytest.importorskip('tensorflow')
+    from dqn_trainer import DQNTrainer
+
+    # the first build of a process imports TensorFlow: it must not change the seeded weights
+    output = subprocess.run([sys.executable, '-c', BUILD_SCRIPT], cwd=ROOT_DIR, capture_output=True, text=True,
+                            check=True).stdout.split()
+
+    trainer = DQNTrainer(seed=7)
+    np.random.random(100)   # random numbers drawn by the simulation before the models are built
+    trainer.build_models()
+    assert get_weights_checksum(trainer) == float(output[0])
+
+    state = np.random.get_state()
+    other = DQNTrainer(seed=7)
+    np.random.set_state(state)
+    other.build_models()
+    # building the models does not change the random numbers of the simulation
+    np.testing.assert_array_equal(np.random.get_state()[1], state[1])
+
+
+def test_actions_are_random_before_the_models_are_built():
+    from dqn_trainer import DQNTrainer
+
+    trainer = DQNTrainer()
+    actions = trainer.get_actions([(-80, 0)] * 32)
+    assert trainer.model is None
+    assert all(0 <= action < NUM_ACTIONS for action in actions)
+
+
+def make_learner_trainer():
+    from dqn_trainer import DQNTrainer
+
+    trainer = DQNTrainer(seed=3)
+    trainer.epsilon = 0.0   # greedy actions
+    trainer.batch_size = 8
+    trainer.min_replay_memory_size = 8
+    for i in range(32):
+        state = (-60 - i, i % 2)
+        trainer.update_replay_memory(state, i % NUM_ACTIONS, 10 * (i % NUM_ACTIONS == 2), state, True)
+    return trainer
+
+
+def wait_until(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while condition() is False:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_background_learner_publishes_new_weights():
+    pytest.importorskip('tensorflow')
+    from dqn_inference import get_model_weights
+
+    trainer = make_learner_trainer()
+    trainer.set_training_schedule(async_training=True)
+    published = trainer.q_network
+    published_weights = [kernel.copy() for kernel, _, _ in published.get_weights()]
+    learner = trainer.learner
+    learner.request_training(20)
+    wait_until(lambda: learner.num_train_steps == 20)
+    trainer.set_training_schedule(async_training=False)
+    assert learner.is_alive() is False and trainer.learner is None
+
+    # a network handed out before is never written again
+    for kernel, (other, _, _) in zip(published_weights, published.get_weights()):
+        np.testing.assert_array_equal(kernel, other)
+    assert trainer.q_network is not published
+
+    # the actions are the greedy actions of the trained Keras model
+    states = [(-60 - i, i % 2) for i in range(32)]
+    for (kernel, bias, _), (other_kernel, other_bias, _) in zip(get_model_weights(trainer.model),
+                                                                 trainer.q_network.get_weights()):
+        np.testing.assert_array_equal(kernel, other_kernel)
+        np.testing.assert_array_equal(bias, other_bias)
+    expected = np.argmax(trainer.model.predict(np.array(states, dtype=np.float32), verbose=0), axis=1)
+    assert trainer.get_actions(states) == expected.tolist()
+
+
+def test_background_learner_requests():
+    pytest.importorskip('tensorflow')
+    from dqn_inference import get_model_weights
+    from dqn_trainer import BackgroundLearner
+
+    trainer = make_learner_trainer()
+    trainer.build_models()
+
+    # the pending gradient steps are capped while the learner is busy
+    learner = BackgroundLearner(trainer, max_pending_steps=5)
+    learner.request_training(3)
+    learner.request_training(3)
+    learner.request_target_update()
+    assert (learner.pending_steps, learner.pending_target_update) == (5, True)
+
+    learner.start()
+    wait_until(lambda: learner.num_train_steps == 5)
+    wait_until(lambda: learner.pending_target_update is False)
+    learner.stop()
+    assert learner.is_alive() is False
+    assert learner.pending_steps == 0
+
+    # a stopped learner does not train on new requests
+    learner.request_training(3)
+    assert learner.num_train_steps == 5
+
+    # the target update copies the trained weights into the target network
+    def target_is_updated():
+        return np.array_equal(trainer.target_q_network.get_weights()[0][0], get_model_weights(trainer.model)[0][0])
+
+    assert target_is_updated() is False
+    learner = BackgroundLearner(trainer)
+    learner.start()
+    learner.request_target_update()
+    wait_until(target_is_updated)
+    learner.stop()
+    assert learner.num_train_steps == 0
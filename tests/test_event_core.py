@@ -0,0 +1,77 @@
+import pytest
+
+from event_core import EventCore, call_later, make_env
+
+
+def record(log, name, env):
+    return lambda event: log.append((env.now, name))
+
+
+@pytest.mark.parametrize('engine', ['simpy', 'event_core'])
+def test_call_later_order(engine):
+    env = make_env(engine)
+    log = []
+    call_later(env, 2, record(log, 'c', env))
+    call_later(env, 1, record(log, 'a', env), record(log, 'b', env))
+    call_later(env, 1, record(log, 'urgent', env), priority=-1)
+    env.run(until=10)
+
+    assert log == [(1, 'urgent'), (1, 'a'), (1, 'b'), (2, 'c')]
+    assert env.now == 10
+
+
+@pytest.mark.parametrize('engine', ['simpy', 'event_core'])
+def test_run_until(engine):
+    env = make_env(engine)
+    log = []
+    call_later(env, 5, record(log, 'due', env))
+    call_later(env, 6, record(log, 'late', env))
+    env.run(until=5)
+
+    # a timer that is already scheduled when run() is called fires at the until time (as in SimPy)
+    assert log == [(5, 'due')]
+    assert env.now == 5
+    env.run(until=7)
+    assert log == [(5, 'due'), (6, 'late')]
+
+
+@pytest.mark.parametrize('engine', ['simpy', 'event_core'])
+def test_callbacks_schedule_new_timers(engine):
+    env = make_env(engine)
+    log = []
+
+    def tick(event):
+        log.append(env.now)
+        if len(log) < 3:
+            call_later(env, 0.5, tick)
+
+    call_later(env, 0, tick)
+    env.run(until=10)
+    assert log == [0, 0.5, 1.0]
+
+
+def test_peek_and_step():
+    env = EventCore()
+    log = []
+    assert env.peek() == float('inf')
+
+    call_later(env, 3, record(log, 'x', env))
+    assert env.peek() == 3
+    env.step()
+    assert log == [(3, 'x')]
+    assert env.now == 3
+
+    with pytest.raises(RuntimeError):
+        env.step()
+
+
+def test_run_until_in_the_past():
+    env = EventCore()
+    env.run(until=2)
+    with pytest.raises(ValueError):
+        env.run(until=1)
+
+
+def test_make_env_unknown_engine():
+    with pytest.raises(ValueError):
+        make_env('unknown')
@@ -0,0 +1,280 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from event_core import EventCore, call_later
+from mobility_model import (BODY_AXIS, BODY_POSITIONS, LIMB_DEGREES, LIMB_DIRECTIONS, LIMB_ENDS, LIMB_MIDDLES,
+                            LIMB_ROOTS, LIMB_TURN_DEGREES, BodyPosition, LazyMobilityHelper, MobilityHelper,
+                            MobilityModel, PopulationMobilityHelper, TraceMobilityHelper, record_mobility_trace,
+                            step_gait)
+from wireless_model import PropLossModel
+
+
+# One movement of one limb as in the per-limb gait (move_left_hand() etc.)
+def move_limb(degree, direction, velocity, turn_degree):
+    if direction == 1:
+        if degree + velocity > 180:
+            degree = -180
+        elif degree < 0 and degree + velocity > -turn_degree:
+            direction = -1
+        else:
+            degree += velocity
+    elif direction == -1:
+        if degree - velocity < -180:
+            degree = 180
+        elif degree > 0 and degree + velocity < turn_degree:
+            direction = 1
+        else:
+            degree -= velocity
+    return degree, direction
+
+
+# Body points after num_movements movements of the per-limb gait drawing from rng
+def walk_reference(num_movements, rng, velocity=0.5, phase=0):
+    limbs = [[(d + phase + 180) % 360 - 180, int(s)] for d, s in zip(LIMB_DEGREES, LIMB_DIRECTIONS)]
+    positions = BODY_POSITIONS.copy()
+    for _ in range(num_movements):
+        for i, limb in enumerate(limbs):
+            limb[0], limb[1] = move_limb(limb[0], limb[1], velocity, LIMB_TURN_DEGREES[i])
+            a = math.radians(limb[0])
+            offset_x = 0
+            if i < 2:
+                direction_x = -1 if rng.randint(0, 1) == 0 else 1
+                offset_x = rng.uniform(0, 0.3) * direction_x
+            offset = np.array([offset_x, math.cos(-a) * 0.25, math.sin(-a) * 0.25])
+            positions[LIMB_MIDDLES[i]] = positions[LIMB_ROOTS[i]] + offset
+            positions[LIMB_ENDS[i]] = positions[LIMB_MIDDLES[i]] + offset
+    return positions
+
+
+@pytest.mark.parametrize('velocity', [0.5, 7, 45])
+def test_step_gait_matches_the_per_limb_gait(velocity):
+    degrees, directions = LIMB_DEGREES.copy(), LIMB_DIRECTIONS.copy()
+    limbs = [(d, s) for d, s in zip(LIMB_DEGREES, LIMB_DIRECTIONS)]
+    for _ in range(2000):
+        degrees, directions = step_gait(degrees, directions, velocity)
+        limbs = [move_limb(d, s, velocity, t) for (d, s), t in zip(limbs, LIMB_TURN_DEGREES)]
+        np.testing.assert_allclose(degrees, [d for d, _ in limbs])
+        np.testing.assert_array_equal(directions, [s for _, s in limbs])
+
+
+def test_step_gait_broadcasts_over_bodies():
+    degrees = np.array([LIMB_DEGREES, LIMB_DEGREES + 90, LIMB_DEGREES - 45])
+    directions = np.tile(LIMB_DIRECTIONS, (3, 1))
+    batch_degrees, batch_directions = step_gait(degrees, directions, 5)
+    for i in range(3):
+        body_degrees, body_directions = step_gait(degrees[i], directions[i], 5)
+        np.testing.assert_array_equal(batch_degrees[i], body_degrees)
+        np.testing.assert_array_equal(batch_directions[i], body_directions)
+
+
+def make_helper(env, seed, velocity=0.5, phase=0, helper_class=MobilityHelper, **kwargs):
+    helper = helper_class(env, **kwargs)
+    helper.velocity = velocity
+    helper.set_phase(phase)
+    helper.set_rng(random.Random(seed))
+    return helper
+
+
+@pytest.mark.parametrize('phase', [0, 75])
+def test_do_walking_matches_the_per_limb_gait(phase):
+    env = EventCore()
+    helper = make_helper(env, 1, velocity=10, phase=phase)
+    call_later(env, 0, helper.do_walking)
+    for t in range(5):
+        env.run(until=t + 0.5)
+        np.testing.assert_allclose(helper.get_positions(), walk_reference(t + 1, random.Random(1), 10, phase))
+
+
+def test_mobility_models_read_the_helper_positions():
+    env = EventCore()
+    helper = make_helper(env, 2)
+    wrist = MobilityModel(BodyPosition.left_wrist)
+    head = MobilityModel(BodyPosition.head)
+    helper.add_mobility_list(wrist)
+    helper.add_mobility_list(head)
+    epoch = helper.get_epoch()
+
+    call_later(env, 0, helper.do_walking)
+    env.run(until=2.5)
+    assert helper.get_epoch() == epoch + 3
+    np.testing.assert_array_equal(wrist.get_position_array(), helper.positions[BodyPosition.left_wrist.value])
+    assert wrist.get_position().y == helper.positions[BodyPosition.left_wrist.value][1]
+    np.testing.assert_array_equal(head.get_position_array(), BODY_POSITIONS[BodyPosition.head.value])
+    assert head.get_distance_from(wrist.get_position()) == pytest.approx(
+        float(np.linalg.norm(helper.positions[BodyPosition.left_wrist.value] - (1.1, 1.8, 1))))
+
+
+def test_do_standing_moves_once():
+    env = EventCore()
+    helper = make_helper(env, 3)
+    call_later(env, 0, helper.do_standing)
+    env.run(until=5)
+    np.testing.assert_allclose(helper.get_positions(), walk_reference(1, random.Random(3)))
+
+
+def test_lazy_walking_matches_do_walking():
+    env = EventCore()
+    walking = make_helper(env, 4, velocity=10)
+    lazy = make_helper(env, 4, velocity=10, helper_class=LazyMobilityHelper)
+    call_later(env, 0, walking.do_walking)
+    for t in (0.5, 1.5, 1.7, 4.5, 9.5):
+        env.run(until=t)
+        lazy.evaluate()
+        np.testing.assert_array_equal(lazy.get_positions(), walking.get_positions())
+
+
+def test_lazy_walking_bumps_the_epoch_once_per_quantum():
+    env = EventCore()
+    lazy = make_helper(env, 5, helper_class=LazyMobilityHelper, quantum=0.25)
+    epoch = lazy.get_epoch()
+    assert lazy.get_epoch() == epoch
+    env.run(until=0.2)
+    assert lazy.get_epoch() == epoch
+    env.run(until=0.3)
+    assert lazy.get_epoch() == epoch + 1
+    env.run(until=3.1)
+    assert lazy.get_epoch() == epoch + 2
+    assert lazy.num_keyframes == 4
+
+
+def test_lazy_walking_interpolates_between_the_keyframes():
+    env = EventCore()
+    lazy = make_helper(env, 6, velocity=10, helper_class=LazyMobilityHelper, quantum=0.25, interpolate=True)
+    first, second = walk_reference(1, random.Random(6), 10), walk_reference(2, random.Random(6), 10)
+
+    lazy.evaluate()
+    np.testing.assert_allclose(lazy.get_positions(), first)
+    env.run(until=0.5)
+    # the positions are evaluated on demand
+    np.testing.assert_allclose(lazy.positions, first)
+    lazy.evaluate()
+    np.testing.assert_allclose(lazy.get_positions(), (first + second) / 2)
+    env.run(until=1)
+    lazy.evaluate()
+    np.testing.assert_allclose(lazy.get_positions(), second)
+
+
+def test_population_places_the_bodies():
+    env = EventCore()
+    population = PopulationMobilityHelper(env, 3, offsets=[(0, 0, 0), (3, 0, 0), (0, 0, 3)], headings=[0, 0, 90],
+                                          seed=0)
+    call_later(env, 0, population.do_walking)
+    env.run(until=2.5)
+
+    positions = population.get_positions()
+    np.testing.assert_array_equal(positions[0], population.body_frame[0])
+    np.testing.assert_allclose(positions[1], population.body_frame[1] + (3, 0, 0))
+    # turned around the vertical axis of the body: the distances to the axis and the heights are kept
+    body_frame = population.body_frame[2] - BODY_AXIS
+    placed = positions[2] - BODY_AXIS - (0, 0, 3)
+    np.testing.assert_allclose(np.hypot(placed[:, 0], placed[:, 2]), np.hypot(body_frame[:, 0], body_frame[:, 2]))
+    np.testing.assert_allclose(placed[:, 1], body_frame[:, 1])
+
+
+def test_population_gait_of_each_body():
+    env = EventCore()
+    phases = [0, 30, -60]
+    population = PopulationMobilityHelper(env, 3, phases=phases, seed=0)
+    population.velocity = 10
+    call_later(env, 0, population.do_walking)
+    env.run(until=3.5)
+
+    for body, phase in enumerate(phases):
+        helper = make_helper(env, 0, velocity=10, phase=phase)
+        for _ in range(4):
+            helper.move_limbs()
+        np.testing.assert_allclose(population.degrees[body], helper.degrees)
+        # the same gait; only the sideways offsets (x) of the hands are drawn differently
+        np.testing.assert_allclose(population.body_frame[body][:, 1:], helper.positions[:, 1:])
+        np.testing.assert_array_equal(population.body_frame[body][LIMB_ROOTS], BODY_POSITIONS[LIMB_ROOTS])
+
+
+def test_population_mobility_models():
+    env = EventCore()
+    population = PopulationMobilityHelper(env, 2, offsets=[(0, 0, 0), (3, 0, 0)], seed=0)
+    head = MobilityModel(BodyPosition.head)
+    population.add_mobility_list(head, 1)
+    call_later(env, 0, population.do_walking)
+    env.run(until=1.5)
+    np.testing.assert_array_equal(head.get_position_array(), (4.1, 1.8, 1))
+    assert population.get_epoch() == 3
+
+
+def record_trace(tmp_path, seed, num_frames, velocity=10):
+    file_path = str(tmp_path / 'trace.npy')
+    record_mobility_trace(file_path, make_helper(None, seed, velocity=velocity), num_frames, dtype=np.float64)
+    return file_path
+
+
+def test_trace_replay_matches_do_walking(tmp_path):
+    env = EventCore()
+    walking = make_helper(env, 7, velocity=10)
+    trace = TraceMobilityHelper(env, record_trace(tmp_path, 7, 6), 1)
+    assert trace.get_num_frames() == 6
+
+    call_later(env, 0, walking.do_walking)
+    for t in (0.5, 1.5, 2.7, 5.5):
+        env.run(until=t)
+        trace.evaluate()
+        np.testing.assert_array_equal(trace.get_positions(), walking.get_positions())
+
+
+@pytest.mark.parametrize('loop, frame', [(True, 1), (False, 3)])
+def test_trace_end(tmp_path, loop, frame):
+    env = EventCore()
+    frames = np.load(record_trace(tmp_path, 8, 4))
+    trace = TraceMobilityHelper(env, str(tmp_path / 'trace.npy'), 0.5, loop=loop)
+    env.run(until=2.6)
+    trace.evaluate()
+    np.testing.assert_array_equal(trace.get_positions(), frames[frame])
+
+
+def test_trace_interpolation(tmp_path):
+    env = EventCore()
+    frames = np.load(record_trace(tmp_path, 9, 3))
+    trace = TraceMobilityHelper(env, str(tmp_path / 'trace.npy'), 1, quantum=0.25, interpolate=True)
+    epoch = trace.get_epoch()
+    env.run(until=1.3)
+    assert trace.get_epoch() == epoch + 1
+    np.testing.assert_allclose(trace.get_positions(), frames[1] + 0.25 * (frames[2] - frames[1]))
+
+
+def test_trace_shape_is_checked(tmp_path):
+    file_path = str(tmp_path / 'invalid.npy')
+    np.save(file_path, np.zeros((4, 3)))
+    with pytest.raises(ValueError):
+        TraceMobilityHelper(EventCore(), file_path, 1)
+
+
+def test_population_line_of_sight_matches_one_body():
+    env = EventCore()
+    population = PopulationMobilityHelper(env, 3, offsets=[(0, 0, 0), (3, 0, 3), (0, 0, 6)], headings=[0, 90, 200],
+                                          seed=0)
+    models = [[MobilityModel(body_position) for body_position in BodyPosition] for _ in range(3)]
+    for body in range(3):
+        for m in models[body]:
+            population.add_mobility_list(m, body)
+    call_later(env, 0, population.do_walking)
+    env.run(until=2.5)
+
+    prop_loss_model = PropLossModel()
+    for body in range(3):
+        # one body standing at the origin in the posture of the placed body
+        helper = MobilityHelper(env)
+        helper.positions[:] = population.body_frame[body]
+        single = [MobilityModel(body_position) for body_position in BodyPosition]
+        for m in single:
+            helper.add_mobility_list(m)
+
+        expected = np.array([m.is_los_batch(helper.positions) for m in single])
+        frames = np.array([m.get_body_frame_array() for m in models[body]])
+        los = np.array([m.is_los_batch(frames) for m in models[body]])
+        np.testing.assert_array_equal(los, expected)
+        assert 0 < los.sum() < los.size
+
+        for a, b in ((0, 8), (5, 14), (12, 13)):
+            assert prop_loss_model.cal_path_loss(models[body][a], models[body][b]) == pytest.approx(
+                prop_loss_model.cal_path_loss(single[a], single[b]))
@@ -0,0 +1,32 @@
+import numpy as np
+
+from dqn_inference import NUM_ACTIONS, DQNEvaluator, NumpyQNetwork
+from multi_env import MultiEnvRunner, make_env_configs
+from scenario import Scenario, make_config
+
+
+# Deterministic state-dependent policy: the greedy actions of a Q-network whose tx power falls as the rx power grows
+def make_policy():
+    actions = np.arange(NUM_ACTIONS, dtype=np.float64)
+    return DQNEvaluator(NumpyQNetwork([(np.array([[-1.0], [0.0]]), np.array([-56.0]), 'relu'),
+                                       (actions[np.newaxis], -0.75 * actions ** 2, 'linear')]))
+
+
+def test_make_env_configs():
+    configs = make_env_configs(make_config(seed=5), num_envs=4)
+    assert [config['seed'] for config in configs] == [5, 6, 7, 8]
+    assert [config['mobility']['phase'] for config in configs] == [0, 90, 180, 270]
+    assert all(config['private_rng'] is True for config in configs)
+
+
+def test_runner_matches_sequential_runs():
+    configs = make_env_configs(make_config(run_time=30, data_size=100), num_envs=3)
+
+    runner = MultiEnvRunner(configs, make_policy())
+    results = runner.run(30)
+    # the action queries of the environments were batched through the deferred beacons
+    assert 0 < runner.num_batches < runner.num_queries
+    assert len(set(runner.policy.get_actions([(-80, 0), (-72, 0), (-64, 0)]))) == 3
+
+    assert results == [Scenario(config, make_policy()).run() for config in configs]
+    assert len(set(str(env_results) for env_results in results)) == 3
@@ -0,0 +1,70 @@
+from wban_packet import Packet, PacketPool, RxRecord
+from wban_protocol_stack import BanFrmSubType, BanFrmType, BanSSCS, BanTxOption, BanTxParams
+
+
+def make_tx_params(node_id, seq_num):
+    m_tx_params = BanTxParams()
+    m_tx_params.ban_id = 0
+    m_tx_params.node_id = node_id
+    m_tx_params.recipient_id = 10
+    m_tx_params.seq_num = seq_num
+    m_tx_params.tx_option = BanTxOption.TX_OPTION_ACK
+    return m_tx_params
+
+
+def make_data_packet(pool, node_id, seq_num):
+    m_pkt = pool.get_packet(100)
+    m_pkt.set_mac_header(BanFrmType.IEEE_802_15_6_MAC_DATA, BanFrmSubType.WBAN_DATA_UP0,
+                         make_tx_params(node_id, seq_num))
+    m_pkt.get_spectrum_tx_params().tx_power = -10
+    return m_pkt
+
+
+def test_pool_reuses_released_packets():
+    pool = PacketPool(capacity=1)
+    first = pool.get_packet(100)
+    second = pool.get_packet(100)
+    pool.release(first)
+    pool.release(second)    # the free list is full
+
+    assert pool.get_packet(50) is first
+    assert first.get_size() == 50
+    assert pool.get_packet(50) is not second
+    assert (pool.num_alloc, pool.num_reuse) == (3, 1)
+
+
+def test_keep_unpooled_packet():
+    m_pkt = Packet(100)
+    assert m_pkt.keep() is m_pkt
+
+
+def test_keep_is_detached_from_a_reused_packet():
+    pool = PacketPool()
+    m_pkt = make_data_packet(pool, 1, 7)
+    kept = m_pkt.keep()
+    assert kept is not m_pkt
+
+    pool.release(m_pkt)
+    reused = make_data_packet(pool, 2, 8)
+    reused.get_spectrum_tx_params().tx_power = 0
+    assert reused is m_pkt
+
+    assert kept.get_mac_header().sender_id == 1
+    assert kept.get_mac_header().get_frm_control().seq_num == 7
+    assert kept.get_spectrum_tx_params().tx_power == -10
+    assert kept.get_frm_body() is reused.get_frm_body()   # shared, stateless frame body
+
+
+def test_sscs_keeps_every_received_frame():
+    pool = PacketPool()
+    sscs = BanSSCS()
+    m_pkt = make_data_packet(pool, 3, 1)
+
+    # the sender is not served by this agent: the frame is recorded, but no DQN status is updated
+    sscs.data_indication(RxRecord(m_pkt, -70, 0))
+    pool.release(m_pkt)
+    make_data_packet(pool, 4, 2)
+
+    assert len(sscs.get_data()) == 1
+    assert isinstance(sscs.get_data()[0], Packet)
+    assert sscs.get_data()[0].get_mac_header().sender_id == 3
@@ -0,0 +1,109 @@
+import pytest
+
+from mobility_model import BodyPosition, MobilityModel
+from policy import (ACTION_SET, NUM_ACTIONS, FixedPowerPolicy, Policy, RssiThresholdPolicy, TabularQPolicy,
+                    get_action_for_power, make_policy)
+from tools import Vector
+from wban_packet import Packet, RxRecord
+from wban_protocol_stack import BanFrmSubType, BanFrmType, BanMac, BanPhy, BanSSCS, BanTxParams, DqnStatusStore
+
+
+def test_base_policy_keeps_the_state():
+    policy = Policy()
+    assert policy.set_observation((-80, 0), 0, (-60, 0.5), 10, 0, False) is False
+    with pytest.raises(NotImplementedError):
+        policy.get_action((-80, 0))
+
+
+@pytest.mark.parametrize('tx_power, expected', [(-30, 0), (-25, 0), (-19, 6), (-10, 10), (0, NUM_ACTIONS - 1)])
+def test_get_action_for_power(tx_power, expected):
+    assert get_action_for_power(tx_power) == expected
+
+
+def test_fixed_power():
+    policy = FixedPowerPolicy(tx_power=-12)
+    assert policy.get_actions([(-80, 0), (-60, 1)]) == [ACTION_SET.index(-12)] * 2
+    assert policy.set_observation((-80, 0), 9, (-60, 1), 5.5, 0, False) is False
+
+
+def test_rssi_threshold_follows_the_rx_power():
+    # target rx power: -82 (sensitivity) + 10 (noise) + 3 (margin) = -69 dBm
+    policy = RssiThresholdPolicy()
+    assert policy.get_actions([DqnStatusStore.INITIAL_STATE]) == [NUM_ACTIONS - 1]
+
+    # -60 dBm received with -10 dBm: 50 dB path loss, -19 dBm needed
+    assert policy.set_observation((-80, 0), ACTION_SET.index(-10), (-60, 0.5), 5, 0, False) is False
+    assert policy.get_actions([(-60, 0.5)]) == [ACTION_SET.index(-18)]
+
+    # the same rx power measured with a higher tx power: a higher path loss
+    policy.set_observation((-60, 0.5), ACTION_SET.index(-2), (-60, 0.4), 1, 1, False)
+    assert policy.get_actions([(-60, 0.4), (-60, 0.5)]) == [ACTION_SET.index(-10), ACTION_SET.index(-18)]
+
+
+def test_rssi_threshold_raises_the_power_after_a_loss():
+    policy = RssiThresholdPolicy()
+    policy.set_observation((-80, 0), ACTION_SET.index(-10), (-60, 0.5), 5, 0, False)
+    policy.set_observation((-60, 0.5), ACTION_SET.index(-18), (0, 0), 0, 1, True)
+    assert policy.get_actions([(-60, 0.5)]) == [ACTION_SET.index(-16)]
+
+    policy.set_observation((-60, 0.5), NUM_ACTIONS - 1, (0, 0), 0, 2, True)
+    assert policy.get_actions([(-60, 0.5)]) == [NUM_ACTIONS - 1]
+
+
+def test_rssi_threshold_bounds_the_states():
+    policy = RssiThresholdPolicy(max_states=2)
+    for rx_power in (-60, -61, -62):
+        policy.set_observation((-80, 0), ACTION_SET.index(-10), (rx_power, 0.5), 5, 0, False)
+    assert list(policy.state_actions) == [(-61, 0.5), (-62, 0.5)]
+    assert policy.get_actions([(-60, 0.5)]) == [NUM_ACTIONS - 1]
+
+
+def test_rssi_threshold_decides_on_the_state_kept_by_the_sscs():
+    policy = RssiThresholdPolicy()
+    sscs = BanSSCS()
+    sscs.set_dqn_trainer(policy)
+    sscs.set_node_list(1)
+
+    m_phy = BanPhy()
+    m_phy.set_mobility(MobilityModel(BodyPosition.head))
+    m_mac = BanMac()
+    m_mac.set_phy(m_phy)
+    sscs.set_mac(m_mac)
+
+    sender_mobility = MobilityModel(BodyPosition.left_wrist)
+    sender_mobility.set_position(Vector(0, 0, 0.5))
+    sender_phy = BanPhy()
+    sender_phy.set_mobility(sender_mobility)
+
+    m_tx_params = BanTxParams()
+    m_tx_params.node_id = 1
+    m_pkt = Packet(100)
+    m_pkt.set_mac_header(BanFrmType.IEEE_802_15_6_MAC_DATA, BanFrmSubType.WBAN_DATA_UP0, m_tx_params)
+    m_pkt.get_spectrum_tx_params().tx_phy = sender_phy
+
+    row = sscs.dqn_status.get_row(1)
+    sscs.dqn_status.current_action[row] = ACTION_SET.index(-10)
+    sscs.data_indication(RxRecord(m_pkt, -60, 0))
+
+    # the observed state is the node's state of the next action query
+    current_state = tuple(sscs.dqn_status.current_state[row].tolist())
+    assert current_state == (-60, 0.5)
+    assert policy.get_actions([current_state]) == [ACTION_SET.index(-18)]
+
+
+def test_tabular_q_update():
+    policy = TabularQPolicy(seed=0)
+    assert policy.get_state_index((-200, 5)) == (0, policy.q_table.shape[1] - 1)
+
+    assert policy.set_observation((-80, 0), 3, (-60, 0.5), 8.5, 0, False) is False
+    assert policy.q_table[policy.get_state_index((-80, 0))][3] == pytest.approx(0.85)
+    assert policy.set_observation((-60, 0.5), 3, (0, 0), 0, 1, True) is True
+    assert policy.current_episode == 1 and policy.epsilon < 1.0
+
+
+def test_make_policy():
+    assert isinstance(make_policy('fixed_power', tx_power=-4), FixedPowerPolicy)
+    assert isinstance(make_policy('rssi_threshold', margin=6), RssiThresholdPolicy)
+    assert isinstance(make_policy('tabular_q', seed=1), TabularQPolicy)
+    with pytest.raises(ValueError):
+        make_policy('unknown')
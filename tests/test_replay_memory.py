@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from replay_memory import PrioritizedReplayMemory, ReplayMemory, SumTree
+
+
+def transition(i):
+    return (i, i + 0.5), i % 15, float(i), (i + 1, i + 1.5), i % 2
+
+
+def make_memory(capacity, num_transitions, seed=0):
+    memory = ReplayMemory(capacity, seed=seed)
+    memory.extend(transition(i) for i in range(num_transitions))
+    return memory
+
+
+def test_append_fills_the_ring_buffer():
+    memory = make_memory(4, 3)
+    assert len(memory) == 3
+    assert memory.position == 3
+    np.testing.assert_array_equal(memory.states[:3], [(0, 0.5), (1, 1.5), (2, 2.5)])
+    np.testing.assert_array_equal(memory.next_states[2], (3, 3.5))
+    assert memory.actions[2] == 2 and memory.dones[1] == 1
+
+
+def test_append_overwrites_the_oldest_transition():
+    memory = make_memory(4, 6)
+    assert len(memory) == 4
+    assert memory.num_appended == 6
+    assert memory.position == 2
+    np.testing.assert_array_equal(memory.rewards, [4, 5, 2, 3])
+
+
+@pytest.mark.parametrize('num_appended, expected', [(6, []), (5, [1]), (3, [3, 0, 1]), (2, [2, 3, 0, 1]),
+                                                    (0, [2, 3, 0, 1])])
+def test_get_indices_since_after_wrap(num_appended, expected):
+    memory = make_memory(4, 6)
+    indices = memory.get_indices_since(num_appended)
+    np.testing.assert_array_equal(indices, expected)
+    # oldest first: the rewards are the numbers of the appended transitions
+    np.testing.assert_array_equal(memory.rewards[indices], list(range(max(num_appended, 2), 6)))
+
+
+def test_sample_draws_distinct_transitions():
+    memory = make_memory(64, 100)
+    indices, states, actions, rewards, next_states, dones, weights = memory.sample(32)
+
+    assert len(np.unique(indices)) == 32
+    assert states.shape == (32, 2) and next_states.shape == (32, 2)
+    np.testing.assert_array_equal(rewards, memory.rewards[indices])
+    np.testing.assert_array_equal(weights, np.ones(32))
+
+
+def test_sample_is_reproducible():
+    first = make_memory(64, 100, seed=3).sample(8)[0]
+    second = make_memory(64, 100, seed=3).sample(8)[0]
+    np.testing.assert_array_equal(first, second)
+
+
+def test_state_round_trip():
+    memory = make_memory(4, 6)
+    restored = ReplayMemory(4)
+    restored.set_state(memory.get_state())
+
+    assert (restored.position, len(restored), restored.num_appended) == (2, 4, 6)
+
+
+def test_sum_tree_update_and_find():
+    tree = SumTree(5)
+    assert tree.size == 8
+    tree.update([0, 1, 2, 3, 4], [1.0, 2.0, 3.0, 4.0, 0.0])
+    assert tree.total() == 10.0
+
+    np.testing.assert_array_equal(tree.find([0, 0.99, 1, 2.5, 3, 5.99, 6, 9.99]), [0, 0, 1, 1, 2, 2, 3, 3])
+    tree.update([1], 0.0)
+    assert tree.total() == 8.0
+    np.testing.assert_array_equal(tree.find([1, 3.99, 4]), [2, 2, 3])
+    np.testing.assert_array_equal(tree.get([0, 1, 3]), [1.0, 0.0, 4.0])
+
+
+def test_prioritized_sampling_proportions():
+    memory = PrioritizedReplayMemory(4, seed=0, alpha=1.0, eps=0.0)
+    memory.extend(transition(i) for i in range(4))
+    memory.update_priorities(np.arange(4), np.array([1.0, 2.0, 3.0, 4.0]))
+
+    counts = np.zeros(4)
+    for _ in range(2000):
+        counts += np.bincount(memory.sample(10)[0], minlength=4)
+    np.testing.assert_allclose(counts / counts.sum(), [0.1, 0.2, 0.3, 0.4], atol=0.01)
+
+
+def test_prioritized_weights():
+    memory = PrioritizedReplayMemory(4, seed=0, alpha=1.0, beta=1.0, beta_increment=0.0, eps=0.0)
+    memory.extend(transition(i) for i in range(4))
+    memory.update_priorities(np.arange(4), np.array([1.0, 2.0, 3.0, 4.0]))
+
+    # beta = 1: the weights are inversely proportional to the priorities (normalized by the largest one)
+    indices, *_, weights = memory.sample(8)
+    np.testing.assert_allclose(weights, (indices.min() + 1.0) / (indices + 1.0), rtol=1e-6)
+
+
+def test_prioritized_new_transitions_get_the_max_priority():
+    memory = PrioritizedReplayMemory(4, seed=0, alpha=1.0, eps=0.0)
+    memory.extend(transition(i) for i in range(2))
+    memory.update_priorities(np.array([0]), np.array([5.0]))
+    memory.append(transition(2))
+
+    np.testing.assert_array_equal(memory.get_priorities(), [5.0, 1.0, 5.0, 0.0])
+    # empty slots are never drawn
+    assert memory.sample(3)[0].max() <= 2
@@ -0,0 +1,56 @@
+import json
+import math
+import os
+import subprocess
+import sys
+
+import pytest
+
+from replication import T_95, aggregate_results, get_t_quantile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('dof, expected', [(1, 12.706), (10, 2.228), (11, 2.228), (14, 2.179), (59, 2.021),
+                                           (120, 1.980), (1000, 1.980)])
+def test_get_t_quantile(dof, expected):
+    assert get_t_quantile(dof) == expected
+
+
+def test_get_t_quantile_is_conservative():
+    # between the tabulated degrees of freedom, the quantile is never below the exact one
+    for dof in range(1, 130):
+        assert get_t_quantile(dof) >= T_95[min(d for d in T_95 if d >= min(dof, 120))]
+
+
+def make_result(node_id, pdr):
+    return {'node_id': node_id, 'pkt_delivery_ratio': pdr, 'throughput': 1000 * pdr, 'energy_consumption_ratio': 1.0,
+            'queue_drops': 0}
+
+
+def test_aggregate_results():
+    replications = [[make_result(1, pdr), make_result(2, 1.0)] for pdr in (0.8, 0.9, 1.0)]
+    summary = aggregate_results(replications)
+
+    pdr = summary[1]['pkt_delivery_ratio']
+    assert pdr['mean'] == pytest.approx(0.9)
+    assert pdr['std'] == pytest.approx(0.1)
+    assert pdr['ci95'] == pytest.approx(4.303 * 0.1 / math.sqrt(3))
+    assert summary[2]['pkt_delivery_ratio']['ci95'] == 0
+
+
+def test_aggregate_single_replication():
+    summary = aggregate_results([[make_result(1, 0.5)]])
+    assert summary[1]['pkt_delivery_ratio']['mean'] == 0.5
+    assert math.isnan(summary[1]['pkt_delivery_ratio']['ci95'])
+
+
+def test_command_line_overrides_the_config(tmp_path):
+    config_path = tmp_path / 'scenario.json'
+    config_path.write_text(json.dumps({'run_time': 1e9, 'engine': 'simpy', 'num_nodes': 2, 'data_size': 100,
+                                       'policy': {'name': 'fixed_power'}}))
+    # the run time of the config would not end within the timeout
+    output = subprocess.run([sys.executable, 'replication.py', str(config_path), '--replications', '2',
+                             '--run-time', '5', '--engine', 'event_core', '--processes', '1'],
+                            cwd=ROOT_DIR, capture_output=True, text=True, check=True, timeout=120).stdout
+    assert 'NID 1: PDR 100.00' in output and 'NID 2: PDR 100.00' in output
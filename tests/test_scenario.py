@@ -0,0 +1,93 @@
+import pytest
+
+from scenario import DEFAULT_SCENARIO, PopulationScenario, Scenario, get_node_configs, make_config, sweep_configs
+
+
+def test_make_config_merges_into_the_defaults():
+    config = make_config({'num_nodes': 2, 'mobility': {'mode': 'static'}}, seed=7)
+    assert (config['num_nodes'], config['seed']) == (2, 7)
+    assert config['mobility']['mode'] == 'static'
+    assert config['mobility']['velocity'] == DEFAULT_SCENARIO['mobility']['velocity']
+    # the defaults are not modified
+    assert DEFAULT_SCENARIO['mobility']['mode'] == 'walking'
+
+
+@pytest.mark.parametrize('config', [{'num_node': 2}, {'mobility': {'mode': 'running'}},
+                                    {'mobility': {'mode': 'trace'}}])
+def test_make_config_rejects_invalid_configs(config):
+    with pytest.raises(ValueError):
+        make_config(config)
+
+
+def test_sweep_configs():
+    configs = sweep_configs({'run_time': 10}, num_nodes=[2, 4], seed=[1, 2, 3])
+    assert len(configs) == 6
+    assert [(c['num_nodes'], c['seed']) for c in configs[:4]] == [(2, 1), (2, 2), (2, 3), (4, 1)]
+    assert all(c['run_time'] == 10 for c in configs)
+
+
+def test_get_node_configs():
+    node_configs = get_node_configs(make_config(num_nodes=9, data_size=100))
+    assert [c['node_id'] for c in node_configs] == list(range(1, 10))
+    assert node_configs[8]['body_position'] == 'left_elbow'
+    assert node_configs[0]['data_size'] == 100
+
+    node_configs = get_node_configs(make_config(nodes=[{'node_id': 5, 'body_position': 'head', 'data_interval': 1}]))
+    assert node_configs == [{'node_id': 5, 'body_position': 'head', 'data_size': 500, 'data_interval': 1}]
+
+
+def test_get_node_configs_skips_the_agent_id():
+    node_configs = get_node_configs(make_config(num_nodes=12))
+    assert [c['node_id'] for c in node_configs] == [1, 2, 3, 4, 5, 6, 7, 8, 9, 11, 12, 13]
+
+    nodes = [{'body_position': 'head'}, {'node_id': 1, 'body_position': 'head'}]
+    node_configs = get_node_configs(make_config(nodes=nodes))
+    assert [c['node_id'] for c in node_configs] == [2, 1]
+
+
+@pytest.mark.parametrize('nodes', [[{'node_id': 10, 'body_position': 'head'}],
+                                   [{'node_id': 3, 'body_position': 'head'}, {'node_id': 3, 'body_position': 'head'}]])
+def test_get_node_configs_rejects_duplicate_ids(nodes):
+    with pytest.raises(ValueError):
+        get_node_configs(make_config(nodes=nodes))
+
+
+def run_fixed_power(**kwargs):
+    config = make_config(run_time=30, data_size=100, private_rng=True, policy={'name': 'fixed_power'}, **kwargs)
+    return Scenario(config).run()
+
+
+def test_run():
+    results = run_fixed_power(num_nodes=4)
+    assert [result['node_id'] for result in results] == [1, 2, 3, 4]
+    assert all(result['pkt_delivery_ratio'] > 0.5 and result['queue_drops'] == 0 for result in results)
+
+
+def test_engines_give_the_same_results():
+    assert run_fixed_power(engine='simpy') == run_fixed_power(engine='event_core')
+
+
+def test_result_interval_keeps_the_results_of_the_whole_run(capsys):
+    scenario = Scenario(make_config(run_time=30, data_size=100, private_rng=True, policy={'name': 'fixed_power'},
+                                    result_interval=7))
+    assert scenario.run() == run_fixed_power()
+    # prints at 7, 14, 21 and 28 s
+    assert capsys.readouterr().out.count('Performance results (NID: 1)') == 4
+
+
+def test_population_scenario():
+    config = make_config(run_time=2, num_nodes=2, data_size=100, policy={'name': 'rssi_threshold'},
+                         population={'num_bodies': 3})
+    scenario = PopulationScenario(config)
+    results = scenario.run()
+
+    assert [result['node_id'] for result in results] == [1, 2] * 3
+    assert [agent.m_mac.m_mac_params.ban_id for agent, _ in scenario.bans] == [0, 1, 2]
+    assert scenario.mobility_helper.num_bodies == 3
+    # one shared policy
+    assert len({id(agent.m_sscs.dqn_trainer) for agent, _ in scenario.bans}) == 1
+
+
+def test_population_scenario_rejects_the_lazy_modes():
+    with pytest.raises(ValueError):
+        PopulationScenario(make_config(mobility={'mode': 'lazy_walking'}, policy={'name': 'fixed_power'})).build()
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from event_core import EventCore
+from trace import TRACE_EVENT_QUEUE_DROP, TRACE_EVENT_SUCCESS_TX, TRACE_EVENT_TX, Trace, TraceSink, load_trace
+from wban_packet import Packet
+from wban_protocol_stack import BanFrmSubType, BanFrmType, BanTxParams
+
+
+def make_packet(node_id, seq_num, tx_power=-10):
+    m_tx_params = BanTxParams()
+    m_tx_params.node_id = node_id
+    m_tx_params.recipient_id = 10
+    m_tx_params.seq_num = seq_num
+    m_pkt = Packet(100)
+    m_pkt.set_mac_header(BanFrmType.IEEE_802_15_6_MAC_DATA, BanFrmSubType.WBAN_DATA_UP0, m_tx_params)
+    m_pkt.get_spectrum_tx_params().tx_power = tx_power
+    return m_pkt
+
+
+@pytest.mark.parametrize('buffer_size', [2, 1024])
+def test_sink_records(tmp_path, buffer_size):
+    env = EventCore()
+    trace = Trace()
+    trace.set_env(env)
+    sink = TraceSink(str(tmp_path / 'trace.bin'), buffer_size)
+    trace.set_sink(sink)
+
+    trace.add_tx_pkt(make_packet(1, 0))
+    env.run(until=0.5)
+    trace.add_success_tx_pkt(make_packet(1, 0))
+    trace.add_queue_drop_pkt(make_packet(2, 7, None))
+    sink.close()
+
+    records = load_trace(str(tmp_path / 'trace.bin'))
+    assert records['event'].tolist() == [TRACE_EVENT_TX, TRACE_EVENT_SUCCESS_TX, TRACE_EVENT_QUEUE_DROP]
+    assert records['time'].tolist() == [0, 0.5, 0.5]
+    assert records['sender_id'].tolist() == [1, 1, 2]
+    assert records['seq_num'].tolist() == [0, 0, 7]
+    assert records['size'].tolist() == [100] * 3
+    assert records['tx_power'][0] == -10 and np.isnan(records['tx_power'][2])
+    assert load_trace(str(tmp_path / 'trace.bin'), mmap=False).tobytes() == records.tobytes()
+
+
+def test_counters():
+    env = EventCore()
+    trace = Trace()
+    trace.set_env(env)
+    for seq_num in range(4):
+        trace.add_tx_pkt(make_packet(1, seq_num))
+    for seq_num in range(3):
+        trace.add_success_tx_pkt(make_packet(1, seq_num))
+
+    assert (trace.tx_pkt_count, trace.success_tx_pkt_count, trace.success_tx_bit) == (4, 3, 2400)
+    assert trace.get_pkt_delivery_ratio() == 0.75
+
+
+def test_queue_occupancy():
+    env = EventCore()
+    trace = Trace()
+    trace.set_env(env)
+    trace.update_queue_occupancy(2)
+    env.run(until=1)
+    trace.update_queue_occupancy(4)
+    env.run(until=2)
+
+    assert trace.max_queue_occupancy == 4
+    assert trace.get_avg_queue_occupancy() == pytest.approx(3)
+    trace.reset()
+    assert trace.max_queue_occupancy == 4 and trace.get_queue_drop_count() == 0
+
+
+def test_window():
+    env = EventCore()
+    trace = Trace()
+    trace.set_env(env)
+    for seq_num in range(4):
+        trace.add_tx_pkt(make_packet(1, seq_num))
+    trace.add_success_tx_pkt(make_packet(1, 0))
+    trace.update_queue_occupancy(4)
+    env.run(until=1)
+    trace.start_window()
+    trace.update_queue_occupancy(2)
+    trace.add_tx_pkt(make_packet(1, 4))
+    trace.add_success_tx_pkt(make_packet(1, 4))
+    env.run(until=3)
+
+    window = trace.get_window()
+    assert (window.tx_pkt_count, window.success_tx_pkt_count, window.success_tx_bit) == (1, 1, 800)
+    assert window.get_throughput() == pytest.approx(400)
+    assert window.max_queue_occupancy == 4 and window.get_avg_queue_occupancy() == pytest.approx(2)
+    # the whole run is kept
+    assert (trace.tx_pkt_count, trace.success_tx_pkt_count) == (5, 2)
+    assert trace.get_avg_queue_occupancy() == pytest.approx(8 / 3)
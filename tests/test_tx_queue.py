@@ -0,0 +1,117 @@
+import pytest
+
+from event_core import EventCore
+from wban_packet import Packet
+from wban_protocol_stack import (BanFrmSubType, BanFrmType, BanMac, BanMacState, BanQueueDropPolicy, BanTxQueue,
+                                 BanTxParams)
+
+
+def make_mac(m_tx_queue):
+    m_mac = BanMac()
+    m_mac.set_env(EventCore())
+    m_mac.trace.set_env(m_mac.get_env())
+    m_mac.set_tx_queue(m_tx_queue)
+    return m_mac
+
+
+def make_packet(seq_num, frm_subtype=BanFrmSubType.WBAN_DATA_UP0):
+    m_tx_params = BanTxParams()
+    m_tx_params.seq_num = seq_num
+    m_pkt = Packet(100)
+    if frm_subtype == BanFrmSubType.WBAN_MANAGEMENT_BEACON:
+        m_pkt.set_mac_header(BanFrmType.IEEE_802_15_6_MAC_MANAGEMENT, frm_subtype, m_tx_params)
+    else:
+        m_pkt.set_mac_header(BanFrmType.IEEE_802_15_6_MAC_DATA, frm_subtype, m_tx_params)
+    return m_pkt
+
+
+def seq_nums(m_tx_queue):
+    result = list()
+    while not m_tx_queue.empty():
+        result.append(m_tx_queue.get().get_mac_header().get_frm_control().seq_num)
+    return result
+
+
+def test_priority_order():
+    m_tx_queue = BanTxQueue()
+    make_mac(m_tx_queue)
+    m_tx_queue.put(make_packet(0, BanFrmSubType.WBAN_DATA_UP0))
+    m_tx_queue.put(make_packet(1, BanFrmSubType.WBAN_DATA_UP5))
+    m_tx_queue.put(make_packet(2, BanFrmSubType.WBAN_MANAGEMENT_BEACON))
+    m_tx_queue.put(make_packet(3, BanFrmSubType.WBAN_DATA_UP5))
+
+    assert m_tx_queue.qsize() == 4
+    assert seq_nums(m_tx_queue) == [2, 1, 3, 0]
+    assert m_tx_queue.get() is None
+
+
+def test_tail_drop():
+    m_tx_queue = BanTxQueue(capacity=2)
+    m_mac = make_mac(m_tx_queue)
+    assert m_tx_queue.put(make_packet(0)) is True
+    assert m_tx_queue.put(make_packet(1)) is True
+    assert m_tx_queue.put(make_packet(2)) is False
+
+    assert m_mac.trace.get_queue_drop_count() == 1
+    assert seq_nums(m_tx_queue) == [0, 1]
+
+
+def test_head_drop_drops_the_oldest_lowest_priority_packet():
+    m_tx_queue = BanTxQueue(capacity=3, drop_policy=BanQueueDropPolicy.HEAD_DROP)
+    m_mac = make_mac(m_tx_queue)
+    m_tx_queue.put(make_packet(0, BanFrmSubType.WBAN_DATA_UP5))
+    m_tx_queue.put(make_packet(1))
+    m_tx_queue.put(make_packet(2))
+    assert m_tx_queue.put(make_packet(3)) is True
+
+    assert m_mac.trace.get_queue_drop_count() == 1
+    assert seq_nums(m_tx_queue) == [0, 2, 3]
+
+
+def test_head_drop_drops_an_arriving_lower_priority_packet():
+    m_tx_queue = BanTxQueue(capacity=2, drop_policy=BanQueueDropPolicy.HEAD_DROP)
+    m_mac = make_mac(m_tx_queue)
+    m_tx_queue.put(make_packet(0, BanFrmSubType.WBAN_MANAGEMENT_BEACON))
+    m_tx_queue.put(make_packet(1, BanFrmSubType.WBAN_DATA_UP5))
+    assert m_tx_queue.put(make_packet(2, BanFrmSubType.WBAN_DATA_UP0)) is False
+
+    assert m_mac.trace.get_queue_drop_count() == 1
+    assert seq_nums(m_tx_queue) == [0, 1]
+
+
+@pytest.mark.parametrize('elapsed, expected, num_drops', [(0.5, [0, 1], 1), (2, [2], 2)])
+def test_deadline_drop(elapsed, expected, num_drops):
+    m_tx_queue = BanTxQueue(capacity=2, drop_policy=BanQueueDropPolicy.DEADLINE, deadline=1)
+    m_mac = make_mac(m_tx_queue)
+    m_tx_queue.put(make_packet(0))
+    m_tx_queue.put(make_packet(1))
+    m_mac.get_env().run(until=elapsed)
+
+    # expired packets make room for the arriving packet; otherwise it is tail-dropped
+    m_tx_queue.put(make_packet(2))
+    assert m_mac.trace.get_queue_drop_count() == num_drops
+    assert seq_nums(m_tx_queue) == expected
+
+
+def test_unbounded_queue():
+    m_tx_queue = BanTxQueue(capacity=None)
+    make_mac(m_tx_queue)
+    for seq_num in range(500):
+        assert m_tx_queue.put(make_packet(seq_num)) is True
+    assert m_tx_queue.qsize() == 500
+
+
+def test_every_packet_expired():
+    m_tx_queue = BanTxQueue(capacity=4, drop_policy=BanQueueDropPolicy.DEADLINE, deadline=1)
+    m_mac = make_mac(m_tx_queue)
+    m_tx_queue.put(make_packet(0))
+    m_tx_queue.put(make_packet(1))
+    m_mac.get_env().run(until=2)
+
+    # the queue is not empty until the expired packets are dropped by get()
+    assert m_tx_queue.empty() is False
+    m_mac.check_queue(None)
+    assert m_mac.m_mac_state == BanMacState.MAC_IDLE
+    assert m_mac.m_tx_pkt is None
+    assert m_tx_queue.empty() is True
+    assert m_mac.trace.get_queue_drop_count() == 2
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from mobility_model import BodyPosition, MobilityModel
+from scenario import PopulationScenario, make_config
+from tools import Vector
+from wireless_model import PropLossModel, SpatialGrid
+
+
+def brute_force_query(positions, index, radius):
+    distance = np.sqrt(np.sum((positions - positions[index]) ** 2, axis=1))
+    return np.array([j for j in np.flatnonzero(distance <= radius) if j != index], dtype=np.int64)
+
+
+@pytest.mark.parametrize('radius', [0.5, 2, 3])
+def test_spatial_grid_query(radius):
+    positions = np.random.default_rng(0).uniform(-10, 10, (300, 3))
+    grid = SpatialGrid(positions, 3)
+    for index in range(len(positions)):
+        np.testing.assert_array_equal(grid.query(index, radius), brute_force_query(positions, index, radius))
+
+
+def test_spatial_grid_single_point():
+    grid = SpatialGrid(np.zeros((1, 3)), 1)
+    assert len(grid.query(0, 1)) == 0
+
+
+def test_path_loss_batch_matches_the_path_loss():
+    prop_loss_model = PropLossModel()
+    a = MobilityModel(BodyPosition.head)
+    a.set_position(Vector(1.1, 1.8, 1))
+    for position in (Vector(1, 1, 1), Vector(1.5, 0.2, 0.4), Vector(3, 1, 2)):
+        b = MobilityModel(BodyPosition.left_ankle)
+        b.set_position(position)
+        distance = a.get_distance_from(position)
+        expected = prop_loss_model.cal_path_loss(a, b)
+        assert prop_loss_model.cal_path_loss_batch([distance], [a.is_los(position)])[0] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('max_path_loss_db', [40, 72, 100])
+def test_get_max_distance(max_path_loss_db):
+    prop_loss_model = PropLossModel()
+    max_distance = prop_loss_model.get_max_distance(max_path_loss_db)
+    assert prop_loss_model.cal_path_loss_batch([max_distance], [True])[0] == pytest.approx(max_path_loss_db)
+
+
+def run_population(channel):
+    config = make_config(run_time=5, num_nodes=2, data_size=100, private_rng=True,
+                         policy={'name': 'fixed_power', 'tx_power': -2},
+                         population={'num_bodies': 4, 'spacing': 50}, channel=channel)
+    scenario = PopulationScenario(config)
+    return scenario, scenario.run()
+
+
+def test_fan_out_cutoff_keeps_the_results():
+    _, expected = run_population({})
+    _, results = run_population({'min_rx_power': -100})
+    assert results == expected
+
+    scenario, results = run_population({'max_distance': 5})
+    assert results == expected
+    # the frames of a node only reach the other devices (agent and node) of its body
+    receivers, _, _ = scenario.channel.get_link_budget(0)
+    assert len(receivers) == 2
@@ -1,4 +1,8 @@
 import math
+import os
+import random
+import sys
+import numpy as np
 
  
 class Vector:
@@ -42,3 +46,12 @@ class Angles:
         if self.azimuth is None:
             return
         self.azimuth = self.wrap_to_pi(self.azimuth)
+
+
+# Seed all the random number generators used in the simulation (random, NumPy and TensorFlow if loaded)
+def set_random_seed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    os.environ['PYTHONHASHSEED'] = str(seed)
+    if 'tensorflow' in sys.modules:
+        sys.modules['tensorflow'].random.set_seed(seed)
@@ -1,38 +1,169 @@
+import copy
 import math
+import numpy as np
 
  
+# Per-packet trace record (written by TraceSink)
+TRACE_RECORD_DTYPE = np.dtype([('time', 'f8'), ('event', 'u1'), ('sender_id', 'i4'), ('recipient_id', 'i4'),
+                               ('seq_num', 'i4'), ('size', 'i4'), ('tx_power', 'f4')])
+TRACE_EVENT_TX = 0
+TRACE_EVENT_SUCCESS_TX = 1
+TRACE_EVENT_QUEUE_DROP = 2
+
+
+# Buffered binary sink of per-packet records; the file can be read with load_trace()
+class TraceSink:
+    def __init__(self, file_path, buffer_size=65536):
+        self.file_path = file_path
+        self.fout = open(file_path, 'wb')
+        self.buffer = np.zeros(buffer_size, dtype=TRACE_RECORD_DTYPE)
+        self.num_records = 0    # number of records in the buffer
+
+    def add_record(self, time, event, packet):
+        header = packet.get_mac_header()
+        record = self.buffer[self.num_records]
+        record['time'] = time
+        record['event'] = event
+        record['sender_id'] = -1 if header.sender_id is None else header.sender_id
+        record['recipient_id'] = -1 if header.recipient_id is None else header.recipient_id
+        seq_num = header.get_frm_control().seq_num
+        record['seq_num'] = -1 if seq_num is None else seq_num
+        record['size'] = packet.get_size()
+        tx_power = packet.get_spectrum_tx_params().tx_power
+        record['tx_power'] = np.nan if tx_power is None else tx_power
+
+        self.num_records += 1
+        if self.num_records == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        self.buffer[:self.num_records].tofile(self.fout)
+        self.fout.flush()
+        self.num_records = 0
+
+    def close(self):
+        if self.fout.closed:
+            return
+        self.flush()
+        self.fout.close()
+
+
+def load_trace(file_path, mmap=True):
+    if mmap is True:
+        return np.memmap(file_path, dtype=TRACE_RECORD_DTYPE, mode='r')
+    return np.fromfile(file_path, dtype=TRACE_RECORD_DTYPE)
+
+
+# Performance statistics (constant memory: counters and accumulators only)
 class Trace:
     def __init__(self):
         self.env = None
-        self.tx_pkt = list()
-        self.success_tx_pkt = list()
+        self.sink: TraceSink = None     # optional per-packet record sink
+        self.tx_pkt_count = 0
+        self.success_tx_pkt_count = 0
         self.success_tx_bit = 0
         self.consume_energy = 0  # watt
         self.initial_energy = None
         self.reset_time = None
 
+        # MAC transmit queue statistics
+        self.queue_drop_pkt = 0
+        self.queue_occupancy = 0
+        self.max_queue_occupancy = 0
+        self.queue_occupancy_area = 0     # integral of the queue occupancy over time
+        self.queue_update_time = None
+
+        # periodic result window (e.g., BanMac.show_result()): the counters at the start of the window
+        self.window_start: Trace = None     # None: the window starts at the reset time
+        self.window_max_queue_occupancy = 0
+
     def set_env(self, env):
         self.env = env
         self.reset_time = self.env.now
+        self.queue_update_time = self.env.now
+
+    def set_sink(self, sink: TraceSink):
+        self.sink = sink
 
     def set_initial_energy(self, energy):
         self.initial_energy = energy
 
     def reset(self):
-        self.tx_pkt.clear()
-        self.success_tx_pkt.clear()
+        self.tx_pkt_count = 0
+        self.success_tx_pkt_count = 0
         self.success_tx_bit = 0
         self.consume_energy = 0
         self.reset_time = self.env.now
 
+        self.queue_drop_pkt = 0
+        self.max_queue_occupancy = self.queue_occupancy
+        self.queue_occupancy_area = 0
+        self.queue_update_time = self.env.now
+
+        self.window_start = None
+        self.window_max_queue_occupancy = self.queue_occupancy
+
+    # Start a new result window; the statistics of the whole run are kept
+    def start_window(self):
+        self.update_queue_occupancy(self.queue_occupancy)   # accumulate the occupancy area until now
+        self.window_start = copy.copy(self)
+        self.window_start.window_start = None
+        self.window_max_queue_occupancy = self.queue_occupancy
+
+    # Statistics since the start of the result window, as a Trace whose counters are the differences
+    def get_window(self):
+        self.update_queue_occupancy(self.queue_occupancy)
+        window = copy.copy(self)
+        window.sink = None
+        start = self.window_start
+        if start is not None:
+            window.tx_pkt_count -= start.tx_pkt_count
+            window.success_tx_pkt_count -= start.success_tx_pkt_count
+            window.success_tx_bit -= start.success_tx_bit
+            window.consume_energy -= start.consume_energy
+            window.queue_drop_pkt -= start.queue_drop_pkt
+            window.queue_occupancy_area -= start.queue_occupancy_area
+            window.reset_time = start.queue_update_time
+        window.window_start = None
+        window.max_queue_occupancy = self.window_max_queue_occupancy
+        return window
+
     def add_tx_pkt(self, packet):
-        self.tx_pkt.append(packet)
+        self.tx_pkt_count += 1
         tx_power = packet.get_spectrum_tx_params().tx_power
         self.add_consumed_energy(tx_power)
+        if self.sink is not None:
+            self.sink.add_record(self.env.now, TRACE_EVENT_TX, packet)
 
     def add_success_tx_pkt(self, packet):
-        self.success_tx_pkt.append(packet)
+        self.success_tx_pkt_count += 1
         self.success_tx_bit += packet.get_size() * 8
+        if self.sink is not None:
+            self.sink.add_record(self.env.now, TRACE_EVENT_SUCCESS_TX, packet)
+
+    def add_queue_drop_pkt(self, packet):
+        self.queue_drop_pkt += 1
+        if self.sink is not None:
+            self.sink.add_record(self.env.now, TRACE_EVENT_QUEUE_DROP, packet)
+
+    def update_queue_occupancy(self, occupancy):
+        self.queue_occupancy_area += self.queue_occupancy * (self.env.now - self.queue_update_time)
+        self.queue_update_time = self.env.now
+        self.queue_occupancy = occupancy
+        if self.max_queue_occupancy < occupancy:
+            self.max_queue_occupancy = occupancy
+        if self.window_max_queue_occupancy < occupancy:
+            self.window_max_queue_occupancy = occupancy
+
+    def get_queue_drop_count(self):
+        return self.queue_drop_pkt
+
+    def get_avg_queue_occupancy(self):
+        duration = self.env.now - self.reset_time
+        if duration <= 0:
+            return self.queue_occupancy
+        area = self.queue_occupancy_area + self.queue_occupancy * (self.env.now - self.queue_update_time)
+        return area / duration
 
     def get_throughput(self):
         if self.env is None:
@@ -60,7 +191,7 @@ class Trace:
             return self.consume_energy / self.initial_energy
 
     def get_pkt_delivery_ratio(self):
-        if len(self.success_tx_pkt) == 0:
+        if self.success_tx_pkt_count == 0:
             return 0
 
-        return len(self.success_tx_pkt) / len(self.tx_pkt)
+        return self.success_tx_pkt_count / self.tx_pkt_count
@@ -22,22 +22,25 @@ class BanFrmSubType(Enum):
     UNDEFINED = 10
 
 
-@dataclass
 class FrameControl:
-    version = None
-    ack_policy = None
-    sec_level = None
-    tk_index = None
-    relay = None
-    ack_timing = None
-    frm_subtype = None
-    frm_type = None
-    more_data = None
-    last_frame = None
-    seq_num = None
-    frag_num = None
-    non_final_frag = None
-    reserved = None
+    __slots__ = ('version', 'ack_policy', 'sec_level', 'tk_index', 'relay', 'ack_timing', 'frm_subtype', 'frm_type',
+                 'more_data', 'last_frame', 'seq_num', 'frag_num', 'non_final_frag', 'reserved')
+
+    def __init__(self):
+        self.version = None
+        self.ack_policy = None
+        self.sec_level = None
+        self.tk_index = None
+        self.relay = None
+        self.ack_timing = None
+        self.frm_subtype = None
+        self.frm_type = None
+        self.more_data = None
+        self.last_frame = None
+        self.seq_num = None
+        self.frag_num = None
+        self.non_final_frag = None
+        self.reserved = None
 
 
 @dataclass
@@ -49,6 +52,8 @@ class AssignedLinkElement:
 
 
 class BanMacHeader:
+    __slots__ = ('frm_control', 'ban_id', 'sender_id', 'recipient_id')
+
     def __init__(self):
         self.frm_control = FrameControl()
         self.ban_id = None
@@ -71,24 +76,30 @@ class BanMacHeader:
 
 
 class Beacon:
+    __slots__ = ('assigned_slot_info', 'assigned_slot_index')
+
     def __init__(self):
         self.assigned_slot_info = list()  # element type is '@dataclass AssignedLinkElement'
+        self.assigned_slot_index = dict()   # allocation id -> (first) element with this id
 
     def set_assigned_link_info(self, assigned_link):
         self.assigned_slot_info.append(assigned_link)
+        self.assigned_slot_index.setdefault(assigned_link.allocation_id, assigned_link)
 
     def get_assigned_link_info(self, n_id):
-        for s_info in self.assigned_slot_info:
-            if s_info.allocation_id == n_id:
-                return s_info
-        return None
+        return self.assigned_slot_index.get(n_id)
 
 
+# IAck and Data frame bodies are stateless: the frames share one instance per frame subtype (see wban_packet.py)
 class IAck:
+    __slots__ = ()
+
     def __init__(self):
         pass
 
 
 class Data:
+    __slots__ = ('priority',)
+
     def __init__(self, priority):
         self.priority = priority
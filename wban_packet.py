@@ -1,23 +1,47 @@
 from wban_header import *
 from wireless_model import *
+import copy
 
  
-@dataclass
 class SpectrumSignalParameters:
-    duration: float = None
-    tx_phy = None
-    tx_power: float = None  # dBm
-    tx_antenna: AntennaModel = None
+    __slots__ = ('duration', 'tx_phy', 'tx_power', 'tx_antenna')
+
+    def __init__(self, duration: float = None, tx_phy=None, tx_power: float = None, tx_antenna: AntennaModel = None):
+        self.duration = duration
+        self.tx_phy = tx_phy
+        self.tx_power = tx_power  # dBm
+        self.tx_antenna = tx_antenna
+
+
+# Frame bodies shared by all the frames of the stateless subtypes (flyweight)
+SHARED_FRM_BODY = {
+    BanFrmSubType.WBAN_CONTROL_IACK: IAck(),
+    BanFrmSubType.WBAN_DATA_UP0: Data(0),
+    BanFrmSubType.WBAN_DATA_UP1: Data(1),
+    BanFrmSubType.WBAN_DATA_UP2: Data(2),
+    BanFrmSubType.WBAN_DATA_UP3: Data(3),
+    BanFrmSubType.WBAN_DATA_UP4: Data(4),
+    BanFrmSubType.WBAN_DATA_UP5: Data(5),
+    BanFrmSubType.WBAN_DATA_UP6: Data(6),
+    BanFrmSubType.WBAN_DATA_UP7: Data(7),
+}
 
 
 class Packet:
+    __slots__ = ('size', 'spec_tx_params', 'mac_header', 'mac_frm_body', 'pool')
+
     def __init__(self, pkt_size):
         self.size = pkt_size
-        self.success = False
         self.spec_tx_params = SpectrumSignalParameters()
 
         self.mac_header = BanMacHeader()
         self.mac_frm_body = None
+        self.pool = None    # PacketPool that reuses this packet (None: not pooled)
+
+    def reset(self, pkt_size):
+        # the MAC header and the spectrum tx params are overwritten when the packet is sent again
+        self.size = pkt_size
+        self.mac_frm_body = None
 
     def set_mac_header(self, frm_type, frm_subtype, m_tx_params):
         self.mac_header.set_tx_params(m_tx_params.ban_id, m_tx_params.node_id, m_tx_params.recipient_id)
@@ -25,24 +49,8 @@ class Packet:
 
         if frm_subtype == BanFrmSubType.WBAN_MANAGEMENT_BEACON:
             self.mac_frm_body = Beacon()
-        elif frm_subtype == BanFrmSubType.WBAN_CONTROL_IACK:
-            self.mac_frm_body = IAck()
-        elif frm_subtype == BanFrmSubType.WBAN_DATA_UP0:
-            self.mac_frm_body = Data(0)
-        elif frm_subtype == BanFrmSubType.WBAN_DATA_UP1:
-            self.mac_frm_body = Data(1)
-        elif frm_subtype == BanFrmSubType.WBAN_DATA_UP2:
-            self.mac_frm_body = Data(2)
-        elif frm_subtype == BanFrmSubType.WBAN_DATA_UP3:
-            self.mac_frm_body = Data(3)
-        elif frm_subtype == BanFrmSubType.WBAN_DATA_UP4:
-            self.mac_frm_body = Data(4)
-        elif frm_subtype == BanFrmSubType.WBAN_DATA_UP5:
-            self.mac_frm_body = Data(5)
-        elif frm_subtype == BanFrmSubType.WBAN_DATA_UP6:
-            self.mac_frm_body = Data(6)
-        elif frm_subtype == BanFrmSubType.WBAN_DATA_UP7:
-            self.mac_frm_body = Data(7)
+        elif frm_subtype in SHARED_FRM_BODY:
+            self.mac_frm_body = SHARED_FRM_BODY[frm_subtype]
         else:
             self.mac_frm_body = None
             print('frame initialization error (invalid frame subtype)')
@@ -62,14 +70,61 @@ class Packet:
     def get_size(self):
         return self.size
 
+    # Detached copy: its own MAC header and spectrum tx params (the frame bodies are not modified after transmission)
     def copy(self):
         new_packet = Packet(self.size)
-        new_packet.success = self.success
-        new_packet.spec_tx_params = self.spec_tx_params
-        new_packet.mac_header = self.mac_header
+        new_packet.spec_tx_params = copy.copy(self.spec_tx_params)
+        new_packet.mac_header = copy.copy(self.mac_header)
+        new_packet.mac_header.frm_control = copy.copy(self.mac_header.frm_control)
         new_packet.mac_frm_body = self.mac_frm_body
 
         return new_packet
 
+    # The packet a receiver may keep after the reception: a pooled packet is reused by its sender once it was
+    # acknowledged or dropped, so the receiver keeps a detached copy of it
+    def keep(self):
+        if self.pool is None:
+            return self
+        return self.copy()
+
     def set_data(self):
         return
+
+
+# Free list of packets: the MAC returns its data frames after they were acknowledged or dropped
+class PacketPool:
+    def __init__(self, capacity=1024):
+        self.m_free_list = list()
+        self.m_capacity = capacity
+        self.num_alloc = 0    # number of newly allocated packets
+        self.num_reuse = 0    # number of packets taken from the free list
+
+    def get_packet(self, pkt_size):
+        if len(self.m_free_list) > 0:
+            packet = self.m_free_list.pop()
+            packet.reset(pkt_size)
+            self.num_reuse += 1
+        else:
+            packet = Packet(pkt_size)
+            packet.pool = self
+            self.num_alloc += 1
+        return packet
+
+    def release(self, packet: Packet):
+        if len(self.m_free_list) < self.m_capacity:
+            self.m_free_list.append(packet)
+
+
+# Reception of a transmitted frame at a receiver.
+# All the receivers share the transmitted frame (read-only); only the reception result is per receiver.
+class RxRecord:
+    __slots__ = ('packet', 'rx_power', 'arrival_time', 'success')
+
+    def __init__(self, packet: Packet, rx_power, arrival_time):
+        self.packet = packet
+        self.rx_power = rx_power    # dBm
+        self.arrival_time = arrival_time
+        self.success = False
+
+    def get_packet(self):
+        return self.packet
@@ -1,12 +1,14 @@
 from wban_packet import *
-from queue import Queue
+from collections import deque
 from wireless_model import *
 from mobility_model import *
 from tools import *
 from trace import *
+from event_core import *
 import math
 import numpy as np
-from dqn_trainer import NUM_CHANNELS
+from dqn_inference import NUM_CHANNELS
+from policy import ACTION_SET
  
 
 class BanMacState(Enum):
@@ -35,6 +37,12 @@ class BanDataConfirmStatus(Enum):
     IEEE_802_15_6_EXCEED_ALLOCATION_INTERVAL = 12
 
 
+class BanQueueDropPolicy(Enum):
+    TAIL_DROP = 0   # drop the arriving packet
+    HEAD_DROP = 1   # drop the oldest packet of the lowest priority (the arriving packet if its priority is lower)
+    DEADLINE = 2    # drop the packets queued longer than the deadline (then tail-drop)
+
+
 class BanTxOption(Enum):
     TX_OPTION_NONE = 0
     TX_OPTION_ACK = 1
@@ -114,15 +122,61 @@ class BanPhyPpduHeaderSymbolNumber:
     phr: float = None
 
 
-@dataclass
-class DqnStatusInfo:
-    node_id = None
-    current_state = None
-    current_action = None
-    reward = None
-    next_state = None
-    done = None
-    steps = None
+# Reward of a successfully received data packet for each action (tx power of ACTION_SET): lower power, higher reward
+REWARD_TABLE = np.array([10, 9.5, 9, 8.5, 8, 7.5, 7, 6.5, 6, 5.5, 5, 4, 3, 2, 1])
+
+
+# DQN status of the nodes served by the agent as a struct of arrays: one row per node, found by node id
+class DqnStatusStore:
+    INITIAL_STATE = (-80, 0)    # initial state is (Rx power, distance)
+
+    def __init__(self, capacity=16):
+        self.index = dict()     # node id -> row
+        self.num_nodes = 0
+        self.node_id = np.zeros(capacity, dtype=np.int64)
+        self.current_state = np.zeros((capacity, 2))
+        self.current_action = np.zeros(capacity, dtype=np.int64)
+        self.reward = np.zeros(capacity)
+        self.next_state = np.zeros((capacity, 2))
+        self.done = np.zeros(capacity, dtype=bool)
+        self.steps = np.zeros(capacity, dtype=np.int64)
+
+    def add_node(self, node_id):
+        if node_id in self.index:
+            return self.index[node_id]
+
+        row = self.num_nodes
+        if row == len(self.node_id):
+            # grow all the arrays (capacity doubling)
+            for name in ('node_id', 'current_state', 'current_action', 'reward', 'next_state', 'done', 'steps'):
+                array = getattr(self, name)
+                grown = np.zeros((2 * len(array),) + array.shape[1:], dtype=array.dtype)
+                grown[:len(array)] = array
+                setattr(self, name, grown)
+
+        self.node_id[row] = node_id
+        self.index[node_id] = row
+        self.num_nodes += 1
+        self.reset(row)
+        return row
+
+    def get_row(self, node_id):
+        return self.index.get(node_id)
+
+    # start new episode
+    def reset(self, row):
+        self.current_state[row] = DqnStatusStore.INITIAL_STATE
+        self.current_action[row] = 0
+        self.reward[row] = 0
+        self.next_state[row] = 0
+        self.done[row] = True
+        self.steps[row] = 0
+
+    # Arguments of set_observation() for a node (plain Python values)
+    def get_observation(self, row):
+        return (tuple(self.current_state[row].tolist()), int(self.current_action[row]),
+                tuple(self.next_state[row].tolist()), float(self.reward[row]), int(self.steps[row]),
+                bool(self.done[row]))
 
 
 def seconds(time):
@@ -169,7 +223,7 @@ class UpperLayer:
 
 # Service specific convergence sub-layer (SSCS)
 class BanSSCS:
-    ACTION_SET = [- 25, -24, -23, -22, -21, -20, -18, -16, -14, -12, -10, -8, -6, -4, -2]    # dBm
+    ACTION_SET = ACTION_SET    # dBm
 
     def __init__(self):
         self.m_env = None
@@ -181,7 +235,12 @@ class BanSSCS:
         self.beacon_interval = milliseconds(255)  # ms
         self.m_tx_power = 0   # dBm
 
-        self.dqn_status_info = list()
+        self.dqn_status = DqnStatusStore()
+
+        # deferred action queries: send_beacon() leaves the pending beacon for an external batch (MultiEnvRunner)
+        self.defer_action_query = False
+        self.m_beacon_pkt: Packet = None
+        self.m_beacon_allocations = None
 
     def set_env(self, m_env):
         self.m_env = m_env
@@ -206,96 +265,53 @@ class BanSSCS:
 
     def set_node_list(self, n_id):
         self.node_list.append(n_id)
-        self.dqn_status_info.append(self.init_dqn_status_info(n_id))
-
-    def init_dqn_status_info(self, node_id):
-        new_dqn_status = DqnStatusInfo()
-        new_dqn_status.node_id = node_id
-        new_dqn_status.current_state = (-80, 0)   # initial state is (Rx power, distance)
-        new_dqn_status.current_action = 0
-        new_dqn_status.reward = 0
-        new_dqn_status.next_state = 0
-        new_dqn_status.done = True
-        new_dqn_status.steps = 0
-        return new_dqn_status
+        self.dqn_status.add_node(n_id)
 
     def data_confirm(self, status: BanDataConfirmStatus):
         # ('Time:', round(self.m_env.now, 5), '  Transmission confirm: (NID:%d),' % self.m_mac.m_mac_params.node_id,
         #      'result:', status,)
         pass
 
-    def data_indication(self, rx_pkt: Packet):
+    def data_indication(self, rx_record: RxRecord):
         # data received
-        rx_power = rx_pkt.get_spectrum_tx_params().tx_power
+        rx_pkt = rx_record.get_packet()
+        rx_power = rx_record.rx_power
         sender_id = rx_pkt.mac_header.sender_id
 
-        for dqn_status in self.dqn_status_info:
-            if dqn_status.node_id == sender_id:
-                # calculate the reward value
-                if dqn_status.current_action == 0:      # -25 dBm
-                    dqn_status.reward += 10
-                elif dqn_status.current_action == 1:    # -24 dBm
-                    dqn_status.reward += 9.5
-                elif dqn_status.current_action == 2:    # -23 dBm
-                    dqn_status.reward += 9
-                elif dqn_status.current_action == 3:    # -22 dBm
-                    dqn_status.reward += 8.5
-                elif dqn_status.current_action == 4:    # -21 dBm
-                    dqn_status.reward += 8
-                elif dqn_status.current_action == 5:    # -20 dBm
-                    dqn_status.reward += 7.5
-                elif dqn_status.current_action == 6:    # -18 dBm
-                    dqn_status.reward += 7
-                elif dqn_status.current_action == 7:    # -16 dBm
-                    dqn_status.reward += 6.5
-                elif dqn_status.current_action == 8:    # -14 dBm
-                    dqn_status.reward += 6
-                elif dqn_status.current_action == 9:    # -12 dBm
-                    dqn_status.reward += 5.5
-                elif dqn_status.current_action == 10:    # -10 dBm
-                    dqn_status.reward += 5
-                elif dqn_status.current_action == 11:    # -8 dBm
-                    dqn_status.reward += 4
-                elif dqn_status.current_action == 12:    # -6 dBm
-                    dqn_status.reward += 3
-                elif dqn_status.current_action == 13:    # -4 dBm
-                    dqn_status.reward += 2
-                elif dqn_status.current_action == 14:    # -2 dBm
-                    dqn_status.reward += 1
-                else:
-                    print('Invalid action')
+        self.packet_list.append(rx_pkt.keep())
 
-                sender_mobility = rx_pkt.get_spectrum_tx_params().tx_phy.get_mobility()
-                receiver_mobility = self.m_mac.get_phy().get_mobility()
+        status = self.dqn_status
+        row = status.get_row(sender_id)
+        if row is None:
+            return
 
-                distance = sender_mobility.get_distance_from(receiver_mobility.get_position())
+        # calculate the reward value
+        action = status.current_action[row]
+        if 0 <= action < len(REWARD_TABLE):
+            status.reward[row] += REWARD_TABLE[action]
+        else:
+            print('Invalid action')
 
-                dqn_status.next_state = (rx_power, distance)
-                dqn_status.done = False  # allocate Tx power to this node and successfully receive the data packet
+        sender_mobility = rx_pkt.get_spectrum_tx_params().tx_phy.get_mobility()
+        receiver_mobility = self.m_mac.get_phy().get_mobility()
 
-                result = self.dqn_trainer.set_observation(dqn_status.current_state, dqn_status.current_action,
-                                                          dqn_status.next_state, dqn_status.reward, dqn_status.steps,
-                                                          dqn_status.done)
+        distance = sender_mobility.get_distance_from(receiver_mobility.get_position())
 
-                # start new episode
-                if result is True:
-                    dqn_status.current_state = (-80, 0)  # initial state is (Rx power, distance)
-                    dqn_status.current_action = 0
-                    dqn_status.reward = 0
-                    dqn_status.next_state = 0
-                    dqn_status.done = True
-                    dqn_status.steps = 0
-                else:
-                    dqn_status.current_state = dqn_status.next_state
-                    dqn_status.steps += 1
+        status.next_state[row] = (rx_power, distance)
+        status.done[row] = False  # allocate Tx power to this node and successfully receive the data packet
 
-                break
+        result = self.dqn_trainer.set_observation(*status.get_observation(row))
 
-        self.packet_list.append(rx_pkt)
+        # start new episode
+        if result is True:
+            status.reset(row)
+        else:
+            status.current_state[row] = status.next_state[row]
+            status.steps[row] += 1
 
     def send_beacon(self, event):
         # TODO: Generate a management-type frame (beacon frame)
-        m_tx_pkt = Packet(10)
+        m_tx_pkt = self.m_mac.new_packet(10)
         m_tx_params = BanTxParams()
         m_tx_params.tx_option = BanTxOption.TX_OPTION_NONE
         m_tx_params.seq_num = None
@@ -311,52 +327,78 @@ class BanSSCS:
         start_offset = 0
         num_slot = 20  # for test. the number of allocation slots
 
+        # the nodes considered in this beacon interval (up to the one whose slot exceeds the beacon length)
+        allocations = list()
         for n_index in self.node_list:
-            # get the action from DQN trainer
-            for dqn_status in self.dqn_status_info:
-                if n_index == dqn_status.node_id:
-                    action = self.dqn_trainer.get_action(dqn_status.current_state)
-                    dqn_status.current_action = action
-                    dqn_status.done = True
-                    self.m_tx_power = BanSSCS.ACTION_SET[action]
-                    break
+            allocations.append((n_index, start_offset, self.dqn_status.get_row(n_index)))
+            start_offset += (num_slot + 1)
+            if start_offset > beacon_length:
+                break
+
+        self.m_beacon_pkt = m_tx_pkt
+        self.m_beacon_allocations = allocations
+        if self.defer_action_query is True:
+            return
+
+        # get the actions of all the nodes from the DQN trainer in a single batch
+        self.complete_beacon(self.dqn_trainer.get_actions(self.get_action_query()))
+
+    def set_defer_action_query(self, defer):
+        self.defer_action_query = defer
 
+    def has_pending_beacon(self):
+        return self.m_beacon_pkt is not None
+
+    # Current states of the nodes of the pending beacon (one action each, in this order)
+    def get_action_query(self):
+        rows = [row for _, _, row in self.m_beacon_allocations if row is not None]
+        return self.dqn_status.current_state[rows]
+
+    # Allocate the tx powers (actions) of the pending beacon and send it
+    def complete_beacon(self, actions):
+        m_tx_pkt = self.m_beacon_pkt
+        allocations = self.m_beacon_allocations
+        self.m_beacon_pkt = None
+        self.m_beacon_allocations = None
+
+        beacon_length = self.beacon_interval * 1000  # ms
+        num_slot = 20  # for test. the number of allocation slots
+
+        status = self.dqn_status
+        rows = [row for _, _, row in allocations if row is not None]
+        status.current_action[rows] = actions
+        status.done[rows] = True
+
+        for n_index, interval_start, row in allocations:
+            if row is not None:
+                self.m_tx_power = BanSSCS.ACTION_SET[status.current_action[row]]
+
+            if interval_start + num_slot + 1 > beacon_length:
+                break
             m_assigned_link = AssignedLinkElement()
             m_assigned_link.allocation_id = n_index
-            m_assigned_link.interval_start = start_offset
+            m_assigned_link.interval_start = interval_start
             m_assigned_link.interval_end = num_slot
             m_assigned_link.tx_power = self.m_tx_power  # get the tx power (action) from the DQN
-            start_offset += (num_slot + 1)
-            if start_offset > beacon_length:
-                break
             m_tx_pkt.get_frm_body().set_assigned_link_info(m_assigned_link)
 
         self.m_mac.mlme_data_request(m_tx_pkt)
 
-        event = self.m_env.event()
-        event._ok = True
-        event.callbacks.append(self.beacon_interval_timeout)  # this method must be called before the send_beacon()
-        event.callbacks.append(self.send_beacon)
-        self.m_env.schedule(event, priority=0, delay=self.beacon_interval)
+        # beacon_interval_timeout() must be called before the send_beacon()
+        call_later(self.m_env, self.beacon_interval, self.beacon_interval_timeout, self.send_beacon)
 
     def beacon_interval_timeout(self, event):
         # Calculate the next_state, reward, done
-        for dqn_status in self.dqn_status_info:
-            # if the previous resource allocation (tx power) was failed
-            if dqn_status.done is True:
-                dqn_status.next_state = (-85, -1)  # Rx power beyond the rx_sensitivity
-                dqn_status.reward = -10
-                result = self.dqn_trainer.set_observation(dqn_status.current_state, dqn_status.current_action,
-                                                          dqn_status.next_state, dqn_status.reward, dqn_status.steps,
-                                                          dqn_status.done)
-                # start new episode
-                if result is True:
-                    dqn_status.current_state = (-80, 0)  # initial state is (Rx power, distance)
-                    dqn_status.current_action = 0
-                    dqn_status.reward = 0
-                    dqn_status.next_state = 0
-                    dqn_status.done = True
-                    dqn_status.steps = 0
+        status = self.dqn_status
+        # the nodes whose previous resource allocation (tx power) was failed
+        rows = np.flatnonzero(status.done[:status.num_nodes])
+        status.next_state[rows] = (-85, -1)  # Rx power beyond the rx_sensitivity
+        status.reward[rows] = -10
+        for row in rows.tolist():
+            result = self.dqn_trainer.set_observation(*status.get_observation(row))
+            # start new episode
+            if result is True:
+                status.reset(row)
 
     def send_data(self, m_tx_pkt: Packet):
         m_tx_params = BanTxParams()
@@ -370,6 +412,92 @@ class BanSSCS:
         return self.packet_list
 
 
+# MAC transmit queue with one sub-queue per user priority (UP0-UP7).
+# Management and control frames (beacons) are put in the highest priority sub-queue.
+class BanTxQueue:
+    NUM_PRIORITIES = 8
+
+    def __init__(self, capacity=100, drop_policy=BanQueueDropPolicy.TAIL_DROP, deadline=None):
+        self.m_mac = None
+        self.m_queues = [deque() for _ in range(BanTxQueue.NUM_PRIORITIES)]     # (enqueue time, packet)
+        self.m_size = 0
+        self.m_capacity = capacity      # None: unbounded
+        self.m_drop_policy = drop_policy
+        self.m_deadline = deadline      # seconds (DEADLINE policy)
+
+    def set_mac(self, m_mac):
+        self.m_mac = m_mac
+
+    def get_mac(self):
+        return self.m_mac
+
+    def set_capacity(self, capacity):
+        self.m_capacity = capacity
+
+    def set_drop_policy(self, drop_policy: BanQueueDropPolicy, deadline=None):
+        self.m_drop_policy = drop_policy
+        self.m_deadline = deadline
+
+    def get_priority(self, m_pkt: Packet):
+        frm_subtype = m_pkt.get_mac_header().get_frm_control().frm_subtype
+        if BanFrmSubType.WBAN_DATA_UP0.value <= frm_subtype.value <= BanFrmSubType.WBAN_DATA_UP7.value:
+            return frm_subtype.value - BanFrmSubType.WBAN_DATA_UP0.value
+        return BanTxQueue.NUM_PRIORITIES - 1
+
+    def put(self, m_pkt: Packet):
+        if self.m_capacity is not None and self.m_size >= self.m_capacity:
+            if self.m_drop_policy == BanQueueDropPolicy.DEADLINE:
+                self.drop_expired()
+
+            if self.m_size >= self.m_capacity:
+                # HEAD_DROP evicts the oldest packet of the lowest priority, unless the arriving packet has an even
+                # lower priority: then the arriving packet is dropped (it never pushes out a higher priority one)
+                priority = self.get_priority(m_pkt)
+                lowest = next((p for p, queue in enumerate(self.m_queues) if len(queue) > 0), None)
+                if self.m_drop_policy == BanQueueDropPolicy.HEAD_DROP and lowest is not None and lowest <= priority:
+                    self.drop(self.m_queues[lowest].popleft()[1])
+                else:
+                    self.drop(m_pkt, queued=False)
+                    return False
+
+        self.m_queues[self.get_priority(m_pkt)].append((self.m_mac.get_env().now, m_pkt))
+        self.m_size += 1
+        self.m_mac.trace.update_queue_occupancy(self.m_size)
+        return True
+
+    def get(self):
+        if self.m_drop_policy == BanQueueDropPolicy.DEADLINE:
+            self.drop_expired()
+
+        for queue in reversed(self.m_queues):
+            if len(queue) > 0:
+                self.m_size -= 1
+                self.m_mac.trace.update_queue_occupancy(self.m_size)
+                return queue.popleft()[1]
+        return None
+
+    def drop_expired(self):
+        if self.m_deadline is None:
+            return
+        expire_time = self.m_mac.get_env().now - self.m_deadline
+        for queue in self.m_queues:
+            while len(queue) > 0 and queue[0][0] < expire_time:
+                self.drop(queue.popleft()[1])
+
+    def drop(self, m_pkt: Packet, queued=True):
+        if queued is True:
+            self.m_size -= 1
+            self.m_mac.trace.update_queue_occupancy(self.m_size)
+        self.m_mac.trace.add_queue_drop_pkt(m_pkt)
+        self.m_mac.release_packet(m_pkt)
+
+    def empty(self):
+        return self.m_size == 0
+
+    def qsize(self):
+        return self.m_size
+
+
 class BanMac:
     # MAC params specified in IEEE 802.15.6 standard
     pAllocationSlotMin = 500    # us
@@ -385,7 +513,7 @@ class BanMac:
         self.m_env = None
         self.m_sscs: BanSSCS = None
         self.m_phy: BanPhy = None
-        self.m_tx_queue = Queue()          # packet queue
+        self.m_tx_queue = BanTxQueue()     # packet queue
         self.m_tx_pkt: Packet = None       # a packet to be sent
         self.m_rx_pkt: Packet = None       # a packet received now
         self.m_mac_state = BanMacState.MAC_IDLE
@@ -393,6 +521,9 @@ class BanMac:
         self.m_mac_params = BanTxParams()
         self.trace = Trace()
         self.m_csma_ca = None
+        self.m_pkt_pool: PacketPool = None   # optional free list of packets
+        self.m_result_interval = 200    # seconds between show_result() prints
+        self.m_tx_queue.set_mac(self)
 
         self.m_ack_wait_time = None
         self.m_seq_num = None
@@ -424,6 +555,32 @@ class BanMac:
     def set_csma_ca(self, csma_ca):
         self.m_csma_ca = csma_ca
 
+    def set_tx_queue(self, m_tx_queue: BanTxQueue):
+        self.m_tx_queue = m_tx_queue
+        self.m_tx_queue.set_mac(self)
+
+    def get_tx_queue(self):
+        return self.m_tx_queue
+
+    # Note: a released data frame is reused for a new frame; a receiver that keeps a received frame (e.g.,
+    # BanSSCS.packet_list of the agent) keeps Packet.keep(), a detached copy of a pooled frame
+    def set_packet_pool(self, pkt_pool: PacketPool):
+        self.m_pkt_pool = pkt_pool
+
+    def get_packet_pool(self):
+        return self.m_pkt_pool
+
+    def new_packet(self, pkt_size):
+        if self.m_pkt_pool is None:
+            return Packet(pkt_size)
+        return self.m_pkt_pool.get_packet(pkt_size)
+
+    def release_packet(self, m_pkt: Packet):
+        # only data frames are returned: beacon and ACK frames may still be processed by the receivers
+        if (self.m_pkt_pool is not None and
+                m_pkt.get_mac_header().get_frm_control().frm_type == BanFrmType.IEEE_802_15_6_MAC_DATA):
+            self.m_pkt_pool.release(m_pkt)
+
     def do_initialize(self):
         # TODO: We have to initialize the MAC parameters
         self.m_seq_num = 0
@@ -451,12 +608,9 @@ class BanMac:
 
     def mlme_data_request(self, m_tx_pkt: Packet):
         # Push the packet into the Tx queue
-        self.m_tx_queue.put_nowait(m_tx_pkt)
+        self.m_tx_queue.put(m_tx_pkt)
 
-        event = self.m_env.event()
-        event._ok = True
-        event.callbacks.append(self.check_queue)
-        self.m_env.schedule(event, priority=0, delay=0)
+        call_later(self.m_env, 0, self.check_queue)
         # print('\nTime:', round(self.m_env.now, 5), '       Send a beacon frame in the agent (NID:%d)'% self.m_mac_params.node_id)
 
     def mcps_data_request(self, m_tx_params: BanTxParams, m_tx_pkt: Packet):
@@ -469,7 +623,7 @@ class BanMac:
                                 BanFrmSubType.WBAN_DATA_UP0, m_tx_params)
 
         # Push the packet into the Tx queue
-        self.m_tx_queue.put_nowait(m_tx_pkt)
+        self.m_tx_queue.put(m_tx_pkt)
 
         # TODO: To be deleted this code to implement a TDMA
         # self.check_queue()
@@ -490,10 +644,7 @@ class BanMac:
 
                 self.m_ack_wait_time += (self.m_phy.calc_tx_time(self.m_tx_pkt) * 2)
 
-                event = self.m_env.event()
-                event._ok = True
-                event.callbacks.append(self.ack_wait_timeout)
-                self.m_env.schedule(event, priority=0, delay=self.m_ack_wait_time)
+                call_later(self.m_env, self.m_ack_wait_time, self.ack_wait_timeout)
             else:
                 self.m_sscs.data_confirm(BanDataConfirmStatus.IEEE_802_15_6_SUCCESS)
                 self.m_tx_pkt = None
@@ -509,7 +660,8 @@ class BanMac:
             print('Something went really wrong. The phy is not in the correct state for data transmission')
 
     # Callback function (called from PHY)
-    def pd_data_indication(self, m_rx_pkt: Packet):
+    def pd_data_indication(self, m_rx_record: RxRecord):
+        m_rx_pkt = m_rx_record.get_packet()
         m_rx_header = m_rx_pkt.get_mac_header()
 
         accept_frame: bool = True
@@ -560,10 +712,7 @@ class BanMac:
                     self.m_alloc_start_time = tx_start_time
                     self.m_alloc_end_time = tx_timeout
 
-                    event = self.m_env.event()
-                    event._ok = True
-                    event.callbacks.append(self.start_tx)
-                    self.m_env.schedule(event, priority=0, delay=self.m_alloc_start_time)
+                    call_later(self.m_env, self.m_alloc_start_time, self.start_tx)
 
             # for further processing the received control or data-type frame
             self.m_rx_pkt = m_rx_pkt
@@ -571,7 +720,7 @@ class BanMac:
             # data frame received
             if m_rx_header.get_frm_control().frm_type == BanFrmType.IEEE_802_15_6_MAC_DATA:
                 # if it is a data frame, push it up the stack
-                self.m_sscs.data_indication(self.m_rx_pkt)
+                self.m_sscs.data_indication(m_rx_record)
 
                 # if this is a data or management-type frame, which is not a broadcast,
                 # generate and send an ACK frame.
@@ -587,10 +736,7 @@ class BanMac:
                 # cancel any pending MAC state change ACKs have higher priority
                 if m_rx_header.get_frm_control().ack_policy == BanTxOption.TX_OPTION_ACK:
                     self.change_mac_state(BanMacState.MAC_IDLE)
-                    event = self.m_env.event()
-                    event._ok = True
-                    event.callbacks.append(self.send_ack)
-                    self.m_env.schedule(event, priority=0, delay=(self.pSIFS * 0.000001))
+                    call_later(self.m_env, (self.pSIFS * 0.000001), self.send_ack)
 
             # control-type frame (ACK) received
             elif (m_rx_header.get_frm_control().frm_type == BanFrmType.IEEE_802_15_6_MAC_CONTROL and
@@ -608,6 +754,7 @@ class BanMac:
                         self.m_sscs.data_confirm(BanDataConfirmStatus.IEEE_802_15_6_SUCCESS)
 
                         # Prepare the next transmission
+                        self.release_packet(self.m_tx_pkt)
                         self.m_tx_pkt = None
                         self.m_prev_tx_status = True    # mark the current Tx result as a success
                         self.change_mac_state(BanMacState.MAC_IDLE)
@@ -615,10 +762,7 @@ class BanMac:
                             self.m_phy.set_trx_state_request(BanPhyTRxState.IEEE_802_15_6_PHY_RX_ON)
                         else:
                             self.m_phy.set_trx_state_request(BanPhyTRxState.IEEE_802_15_6_PHY_TRX_OFF)
-                        event = self.m_env.event()
-                        event._ok = True
-                        event.callbacks.append(self.check_queue)
-                        self.m_env.schedule(event, priority=0, delay=self.pSIFS * 0.000001)
+                        call_later(self.m_env, self.pSIFS * 0.000001, self.check_queue)
                     else:
                         # Do nothing
                         pass
@@ -696,7 +840,10 @@ class BanMac:
 
     def check_queue(self, event):
         if self.m_mac_state == BanMacState.MAC_IDLE and self.m_tx_queue.empty() is False and self.m_tx_pkt is None:
-            self.m_tx_pkt = self.m_tx_queue.get_nowait()
+            self.m_tx_pkt = self.m_tx_queue.get()
+            if self.m_tx_pkt is None:
+                # every queued packet expired (DEADLINE policy): stay idle
+                return
             self.change_mac_state(BanMacState.MAC_SENDING)
             self.m_phy.set_trx_state_request(BanPhyTRxState.IEEE_802_15_6_PHY_TX_ON)
 
@@ -710,10 +857,7 @@ class BanMac:
                 self.m_phy.set_trx_state_request(BanPhyTRxState.IEEE_802_15_6_PHY_RX_ON)
             else:
                 self.m_phy.set_trx_state_request(BanPhyTRxState.IEEE_802_15_6_PHY_TRX_OFF)
-            event = self.m_env.event()
-            event._ok = True
-            event.callbacks.append(self.check_queue)
-            self.m_env.schedule(event, priority=0, delay=0)
+            call_later(self.m_env, 0, self.check_queue)
 
         elif mac_state == BanMacState.MAC_ACK_PENDING:
             self.change_mac_state(BanMacState.MAC_ACK_PENDING)
@@ -732,6 +876,7 @@ class BanMac:
 
         elif self.m_mac_state == BanMacState.MAC_CSMA and mac_state == BanMacState.CHANNEL_ACCESS_FAILURE:
             print('Cannot find clear channel, drop the tx pkt')
+            self.release_packet(self.m_tx_pkt)
             self.m_tx_pkt = None
             self.change_mac_state(BanMacState.MAC_IDLE)
 
@@ -739,7 +884,7 @@ class BanMac:
         if self.m_mac_state != BanMacState.MAC_IDLE:
             print('Invalid MAC state')
 
-        ack_pkt = Packet(10)
+        ack_pkt = self.new_packet(10)
         m_tx_params = BanTxParams()
         m_tx_params.ban_id = self.m_mac_params.ban_id
         m_tx_params.node_id = self.m_mac_params.node_id
@@ -764,6 +909,7 @@ class BanMac:
 
         if self.m_mac_state == BanMacState.MAC_ACK_PENDING:
             # Simply drop the pending packet
+            self.release_packet(self.m_tx_pkt)
             self.m_tx_pkt = None
             self.set_mac_state(BanMacState.MAC_IDLE)
             self.m_sscs.data_confirm(BanDataConfirmStatus.IEEE_802_15_6_NO_ACK)
@@ -783,17 +929,32 @@ class BanMac:
     def plme_cca_confirm(self, status: BanPhyTRxState):
         self.m_csma_ca.plme_cca_confirm(status)
 
+    def get_result(self):
+        return {
+            'node_id': self.m_mac_params.node_id,
+            'pkt_delivery_ratio': self.trace.get_pkt_delivery_ratio(),
+            'throughput': self.trace.get_throughput(),     # bps
+            'energy_consumption_ratio': self.trace.get_energy_consumption_ratio(),
+            'queue_drops': self.trace.get_queue_drop_count(),
+        }
+
+    def set_result_interval(self, interval):
+        self.m_result_interval = interval
+
+    # Print the results since the previous print (get_result() keeps the results of the whole run) and schedule the
+    # next print after the result interval
     def show_result(self, event):
+        window = self.trace.get_window()
         print('Performance results (NID: %d)' % self.m_mac_params.node_id)
-        print('Packet delivery ratio:', round(self.trace.get_pkt_delivery_ratio(), 2) * 100, '%')
-        print('Throughput:', round(self.trace.get_throughput() / 1000, 3), 'kbps')
-        print('Energy consumption ratio:', round(self.trace.get_energy_consumption_ratio(), 3), '%', '\n')
+        print('Packet delivery ratio:', round(window.get_pkt_delivery_ratio(), 2) * 100, '%')
+        print('Throughput:', round(window.get_throughput() / 1000, 3), 'kbps')
+        print('Energy consumption ratio:', round(window.get_energy_consumption_ratio(), 3), '%')
+        print('Queue drops:', window.get_queue_drop_count(),
+              ' Average queue occupancy:', round(window.get_avg_queue_occupancy(), 2),
+              ' Max queue occupancy:', window.max_queue_occupancy, '\n')
 
-        self.trace.reset()
-        event = self.m_env.event()
-        event._ok = True
-        event.callbacks.append(self.show_result)
-        self.m_env.schedule(event, priority=0, delay=200)
+        self.trace.start_window()
+        call_later(self.m_env, self.m_result_interval, self.show_result)
 
 
 class BanPhy:
@@ -813,7 +974,7 @@ class BanPhy:
         self.m_cca_peak_power = 0.0
 
         self.m_pib_attributes = BanPhyPibAttributes()
-        self.m_rx_pkt = None
+        self.m_rx_record: RxRecord = None
         self.m_phy_option = BanPhyOption.IEEE_802_15_6_INVALID_PHY_OPTION
         self.m_data_symbol_rates: BanPhyDataAndSymbolRates = ((20.0, 20.0),
                                                               (40.0, 40.0),
@@ -854,12 +1015,14 @@ class BanPhy:
 
     def set_mobility(self, m_mobility):
         self.m_mobility = m_mobility
+        if self.m_channel is not None:
+            self.m_channel.invalidate_link_cache()
 
     def get_mobility(self):
         return self.m_mobility
 
-    def set_rx_pkt(self, m_rx_pkt):
-        self.m_rx_pkt = m_rx_pkt
+    def set_rx_record(self, m_rx_record):
+        self.m_rx_record = m_rx_record
 
     def set_antenna(self, antenna):
         self.m_antenna = antenna
@@ -981,27 +1144,21 @@ class BanPhy:
             self.change_trx_state(BanPhyTRxState.IEEE_802_15_6_PHY_BUSY_TX)
 
             # TODO: set the Tx duration, tx_phy, tx_antenna
-            spec_tx_params = SpectrumSignalParameters()
+            # Fill in the spectrum Tx parameters of the Tx_pkt
+            spec_tx_params = m_tx_pkt.get_spectrum_tx_params()
             tx_duration = self.calc_tx_time(m_tx_pkt)
             spec_tx_params.duration = tx_duration
             spec_tx_params.tx_phy = self
             spec_tx_params.tx_power = self.m_pib_attributes.phy_tx_power
             spec_tx_params.tx_antenna = self.m_antenna
 
-            # Add the spectrum Tx parameters to the Tx_pkt
-            m_tx_pkt.set_spectrum_tx_params(spec_tx_params)
-
             # We have to previously forward the required parameter before we register the event of a function call
             self.m_channel.set_tx_pkt(m_tx_pkt)
 
             # update trace info
             self.m_mac.trace.add_tx_pkt(m_tx_pkt)
 
-            event = self.m_env.event()
-            event._ok = True
-            event.callbacks.append(self.m_channel.start_tx)
-            event.callbacks.append(self.end_tx)
-            self.m_env.schedule(event, priority=0, delay=tx_duration)
+            call_later(self.m_env, tx_duration, self.m_channel.start_tx, self.end_tx)
 
         # Transmission fails because the transceiver is not prepared to send a packet
         elif (self.m_trx_state == BanPhyTRxState.IEEE_802_15_6_PHY_RX_ON or
@@ -1028,32 +1185,29 @@ class BanPhy:
             # If the 10*log10 (sinr) > -5, then receive the packet, otherwise drop the packet
             self.change_trx_state(BanPhyTRxState.IEEE_802_15_6_PHY_BUSY_RX)
 
-            if self.m_rx_pkt.get_spectrum_tx_params().tx_power + self.m_noise >= self.m_rx_sensitivity:
-                self.m_rx_pkt.success = True
+            if self.m_rx_record.rx_power + self.m_noise >= self.m_rx_sensitivity:
+                self.m_rx_record.success = True
             else:
-                self.m_rx_pkt.success = False
-            # print('Rx power (dBm):', self.m_rx_pkt.get_spectrum_tx_params().tx_power + self.m_noise)
+                self.m_rx_record.success = False
+            # print('Rx power (dBm):', self.m_rx_record.rx_power + self.m_noise)
         elif self.m_trx_state == BanPhyTRxState.IEEE_802_15_6_PHY_BUSY_RX:
             # TODO: Drop the packet
             print('Packet collision at (NID:%d)' % self.m_mac.m_mac_params.node_id, self.m_trx_state)
-            self.m_rx_pkt.success = False
+            self.m_rx_record.success = False
         else:
             # TODO: Drop the packet
             print('Transceiver not in Rx state:', self.m_trx_state)
-            self.m_rx_pkt.success = False
+            self.m_rx_record.success = False
 
         # Update peak power if CCA is in progress
-        power = self.m_rx_pkt.get_spectrum_tx_params().tx_power + self.m_noise
+        power = self.m_rx_record.rx_power + self.m_noise
         if self.m_cca_peak_power < power:
             self.m_cca_peak_power = power
 
         # TODO: after the Rx duration expires, we call the function (end_rx()) to complete the current reception
-        rx_duration = self.calc_tx_time(self.m_rx_pkt)
+        rx_duration = self.calc_tx_time(self.m_rx_record.get_packet())
 
-        event = self.m_env.event()
-        event._ok = True
-        event.callbacks.append(self.end_rx)
-        self.m_env.schedule(event, priority=0, delay=rx_duration)
+        call_later(self.m_env, rx_duration, self.end_rx)
 
     def end_rx(self, event):
         # TODO: Update the average receive power during ED
@@ -1062,8 +1216,8 @@ class BanPhy:
         # TODO: Update LQI using error model
 
         # If the packet was successfully received, push it up the stack
-        if self.m_rx_pkt.success is True:
-            self.m_mac.pd_data_indication(self.m_rx_pkt)
+        if self.m_rx_record.success is True:
+            self.m_mac.pd_data_indication(self.m_rx_record)
 
         if self.m_trx_state == BanPhyTRxState.IEEE_802_15_6_PHY_BUSY_RX:
             self.change_trx_state(BanPhyTRxState.IEEE_802_15_6_PHY_RX_ON)
@@ -1109,10 +1263,7 @@ class BanPhy:
             self.m_cca_peak_power = 0.0
             cca_time = seconds(8.0 / self.get_data_or_symbol_rate(False))
 
-            event = self.m_env.event()
-            event._ok = True
-            event.callbacks.append(self.end_cca)
-            self.m_env.schedule(event, priority=0, delay=cca_time)  # clear channel assessment during cca_time
+            call_later(self.m_env, cca_time, self.end_cca)  # clear channel assessment during cca_time
         else:
             if self.m_trx_state == BanPhyTRxState.IEEE_802_15_6_PHY_TRX_OFF:
                 self.m_mac.plme_cca_confirm(BanPhyTRxState.IEEE_802_15_6_PHY_TRX_OFF)
@@ -1165,8 +1316,84 @@ class BanChannel:
         self.m_tx_pkt = None
         self.m_phy_list = list()     # send a data packet to all the registered phy modules
 
+        # fan-out cutoff: a frame is sent only to the receivers within m_max_distance (found with a spatial grid)
+        # whose rx power is at least m_min_rx_power (None: no limit)
+        self.m_max_distance = None   # m
+        self.m_min_rx_power = None   # dBm
+
+        # link budget cache: per sender, the receivers (indices of m_link_phys) and their path loss/delay,
+        # valid until one of the mobility helpers moving them bumps its epoch
+        self.m_link_phys = None
+        self.m_link_index = None
+        self.m_link_sources = None
+        self.m_link_epoch = None
+        self.m_link_positions = None
+        self.m_link_frame_positions = None     # positions in the frame of each body (line of sight)
+        self.m_link_grid = None
+        self.m_link_rows = None
+
     def add_phy_list(self, m_phy):
         self.m_phy_list.append(m_phy)
+        self.invalidate_link_cache()
+
+    # Must be called if the positions are changed without a MobilityHelper
+    def invalidate_link_cache(self):
+        self.m_link_index = None
+
+    # Send the frames only to the receivers that can hear them or be disturbed by them.
+    # Without max_distance, the distance at which a frame sent with max_tx_power (dBm) falls below min_rx_power is used.
+    def set_fan_out_cutoff(self, min_rx_power=None, max_distance=None, max_tx_power=None):
+        if max_distance is None and min_rx_power is not None and max_tx_power is not None:
+            max_distance = self.prop_loss_model.get_max_distance(max_tx_power - min_rx_power)
+        self.m_min_rx_power = min_rx_power
+        self.m_max_distance = max_distance
+        self.invalidate_link_cache()
+
+    def build_link_cache(self):
+        self.m_link_phys = [phy for phy in self.m_phy_list if phy.get_mobility() is not None]
+        self.m_link_index = {phy: index for index, phy in enumerate(self.m_link_phys)}
+
+        self.m_link_sources = list()
+        for phy in self.m_link_phys:
+            helper = phy.get_mobility().helper
+            if helper is not None and helper not in self.m_link_sources:
+                self.m_link_sources.append(helper)
+
+        self.m_link_epoch = None
+
+    def get_link_epoch(self):
+        return sum(helper.get_epoch() for helper in self.m_link_sources)
+
+    # Get the cached receivers (indices of m_link_phys, the sender excluded) of the sender and their path loss and
+    # delay; only the receivers within m_max_distance are included
+    def get_link_budget(self, sender_index):
+        epoch = self.get_link_epoch()
+        if epoch != self.m_link_epoch:
+            self.m_link_epoch = epoch
+            self.m_link_positions = None
+            self.m_link_grid = None
+            self.m_link_rows = [None] * len(self.m_link_phys)
+
+        if self.m_link_rows[sender_index] is None:
+            if self.m_link_positions is None:
+                self.m_link_positions = np.array([phy.get_mobility().get_position_array() for phy in self.m_link_phys])
+                self.m_link_frame_positions = np.array([phy.get_mobility().get_body_frame_array()
+                                                        for phy in self.m_link_phys])
+
+            if self.m_max_distance is not None:
+                if self.m_link_grid is None:
+                    self.m_link_grid = SpatialGrid(self.m_link_positions, self.m_max_distance)
+                receivers = self.m_link_grid.query(sender_index, self.m_max_distance)
+            else:
+                receivers = np.arange(len(self.m_link_phys))
+                receivers = receivers[receivers != sender_index]
+
+            sender_mobility = self.m_link_phys[sender_index].get_mobility()
+            path_loss_db, prop_delay = self.calc_link_budget(sender_mobility, self.m_link_positions[receivers],
+                                                             self.m_link_frame_positions[receivers])
+            self.m_link_rows[sender_index] = (receivers, path_loss_db, prop_delay)
+
+        return self.m_link_rows[sender_index]
 
     def set_prop_loss_model(self, prop_loss_model):
         self.prop_loss_model = prop_loss_model
@@ -1177,44 +1404,47 @@ class BanChannel:
     def set_tx_pkt(self, m_tx_pkt):
         self.m_tx_pkt = m_tx_pkt
 
-    def start_tx(self, event):
-        sender_mobility = self.m_tx_pkt.get_spectrum_tx_params().tx_phy.get_mobility()
-
-        for receiver in self.m_phy_list:
-            # if the sender is the receiver, skip the transmission
-            if receiver == self.m_tx_pkt.get_spectrum_tx_params().tx_phy:
-                continue
+    # Calculate the path loss and propagation delay from the sender to all receiver positions at once
+    # (frame_positions: the receiver positions in the frame of their bodies, None: the same as positions)
+    def calc_link_budget(self, sender_mobility, positions, frame_positions=None):
+        distance = sender_mobility.get_distance_from_batch(positions)
+        is_los = sender_mobility.is_los_batch(positions if frame_positions is None else frame_positions)
 
-            m_tx_pkt_copy = self.m_tx_pkt.copy()
+        path_loss_db = self.prop_loss_model.cal_path_loss_batch(distance, is_los)
+        if self.prop_delay_model is not None:
+            prop_delay = self.prop_delay_model.get_delay_batch(distance)
+        else:
+            prop_delay = np.zeros(len(distance))
 
-            receiver_mobility = receiver.get_mobility()
-            spec_rx_params = SpectrumSignalParameters()
-            spec_rx_params.duration = m_tx_pkt_copy.get_spectrum_tx_params().duration
-            spec_rx_params.tx_power = m_tx_pkt_copy.get_spectrum_tx_params().tx_power
-            spec_rx_params.tx_phy = m_tx_pkt_copy.get_spectrum_tx_params().tx_phy
-            spec_rx_params.tx_antenna = m_tx_pkt_copy.get_spectrum_tx_params().tx_antenna
+        return path_loss_db, prop_delay
 
-            if sender_mobility is not None and receiver_mobility is not None:
-                # TODO: Calculate path loss, delay, propagation loss ... etc
-                path_loss_db = self.prop_loss_model.cal_path_loss(sender_mobility, receiver_mobility)
+    def start_tx(self, event):
+        tx_phy = self.m_tx_pkt.get_spectrum_tx_params().tx_phy
+        if self.m_link_index is None:
+            self.build_link_cache()
 
-                # print('path loss:', path_loss_db)
-                # print('distance:', sender_mobility.get_distance_from(receiver_mobility.get_position()),
-                #      'LOS:', sender_mobility.is_los(receiver_mobility.get_position()))
+        sender_index = self.m_link_index.get(tx_phy)
+        if sender_index is None:
+            return
 
-                if self.prop_delay_model is not None:
-                    prop_delay = self.prop_delay_model.get_delay(sender_mobility, receiver_mobility)
+        # TODO: Calculate path loss, delay, propagation loss ... etc
+        receivers, path_loss_db, prop_delay = self.get_link_budget(sender_index)
+        tx_power = self.m_tx_pkt.get_spectrum_tx_params().tx_power
+        now = self.m_env.now
 
-                spec_rx_params.tx_power -= path_loss_db
-                m_tx_pkt_copy.set_spectrum_tx_params(spec_rx_params)
+        rx_power = tx_power - path_loss_db
+        if self.m_min_rx_power is not None:
+            # the receivers that can neither hear the frame nor be disturbed by it
+            audible = rx_power >= self.m_min_rx_power
+            receivers, rx_power, prop_delay = receivers[audible], rx_power[audible], prop_delay[audible]
 
-                receiver.set_rx_pkt(m_tx_pkt_copy)
-                # receiver.get_data_or_symbol_rate(True)
+        for receiver_index, m_rx_power, m_prop_delay in zip(receivers.tolist(), rx_power.tolist(),
+                                                            prop_delay.tolist()):
+            receiver = self.m_link_phys[receiver_index]
+            # all the receivers share the transmitted frame
+            receiver.set_rx_record(RxRecord(self.m_tx_pkt, m_rx_power, now + m_prop_delay))
 
-                event = self.m_env.event()
-                event._ok = True
-                event.callbacks.append(receiver.start_rx)
-                self.m_env.schedule(event, priority=0, delay=prop_delay)
+            call_later(self.m_env, m_prop_delay, receiver.start_rx)
 
 
 class CsmaCa:
@@ -1231,10 +1461,14 @@ class CsmaCa:
         self.m_mac_max_csma_backoffs = 4    # maximum number of backoffs
         self.m_unit_backoff_period = 20   # number of symbols per CSMA/CA time unit, default 20 symbols
         self.m_cca_request_running = False  # flag indicating that the PHY is currently running a CCA
+        self.rng = random   # random number generator of the backoff (e.g., random.Random(seed) per environment)
 
     def set_env(self, m_env):
         self.m_env = m_env
 
+    def set_rng(self, rng):
+        self.rng = rng
+
     def get_env(self):
         return self.m_env
 
@@ -1295,17 +1529,11 @@ class CsmaCa:
             # TODO: for slotted, locate backoff period boundary, i.e., delay to the next slot boundary
             backoff_boundary = self.get_time_to_next_slot()
 
-            event = self.m_env.event()
-            event._ok = True
-            event.callbacks.append(self.random_backoff_delay)
-            self.m_env.schedule(event, priority=0, delay=backoff_boundary)
+            call_later(self.m_env, backoff_boundary, self.random_backoff_delay)
         else:
             self.m_be = self.m_mac_min_backoff_exp
 
-            event = self.m_env.event()
-            event._ok = True
-            event.callbacks.append(self.random_backoff_delay)
-            self.m_env.schedule(event, priority=0, delay=0)
+            call_later(self.m_env, 0, self.random_backoff_delay)
 
     def cancel(self):
         pass
@@ -1315,19 +1543,13 @@ class CsmaCa:
         is_data = False
 
         symbol_rate = self.m_mac.get_phy().get_data_or_symbol_rate(is_data)    # symbols per second
-        backoff_period = random.uniform(0, upper_bound + 1)    # number of backoff periods
+        backoff_period = self.rng.uniform(0, upper_bound + 1)    # number of backoff periods
         random_backoff = microseconds(backoff_period * self.get_unit_backoff_period() * 1000 * 1000 / symbol_rate)
 
         if self.is_unslotted_csma_ca() is True:
-            event = self.m_env.event()
-            event._ok = True
-            event.callbacks.append(self.request_cca)
-            self.m_env.schedule(event, priority=0, delay=random_backoff)
+            call_later(self.m_env, random_backoff, self.request_cca)
         else:
-            event = self.m_env.event()
-            event._ok = True
-            event.callbacks.append(self.can_proceed)
-            self.m_env.schedule(event, priority=0, delay=random_backoff)
+            call_later(self.m_env, random_backoff, self.can_proceed)
 
     def can_proceed(self, event):
         can_proceed = True
@@ -1336,17 +1558,11 @@ class CsmaCa:
             # TODO: for slotted, perform CCA on backoff period boundary, i.e., delay to next slot boundary
             backoff_boundary = self.get_time_to_next_slot()
 
-            event = self.m_env.event()
-            event._ok = True
-            event.callbacks.append(self.request_cca)
-            self.m_env.schedule(event, priority=0, delay=backoff_boundary)
+            call_later(self.m_env, backoff_boundary, self.request_cca)
         else:
             next_cap = 0
 
-            event = self.m_env.event()
-            event._ok = True
-            event.callbacks.append(self.random_backoff_delay)
-            self.m_env.schedule(event, priority=0, delay=next_cap)
+            call_later(self.m_env, next_cap, self.random_backoff_delay)
 
     def request_cca(self, event):
         self.m_cca_request_running = True
@@ -1362,10 +1578,7 @@ class CsmaCa:
                     if self.m_cw == 0:
                         self.m_mac.set_mac_state(BanMacState.CHANNEL_IDLE)
                     else:
-                        event = self.m_env.event()
-                        event._ok = True
-                        event.callbacks.append(self.request_cca)
-                        self.m_env.schedule(event, priority=0, delay=0)
+                        call_later(self.m_env, 0, self.request_cca)
                 else:
                     self.m_mac.set_mac_state(BanMacState.CHANNEL_IDLE)
             else:
@@ -1379,10 +1592,7 @@ class CsmaCa:
                     return
                 else:
                     # perform another backoff (step 2)
-                    event = self.m_env.event()
-                    event._ok = True
-                    event.callbacks.append(self.random_backoff_delay)
-                    self.m_env.schedule(event, priority=0, delay=0)
+                    call_later(self.m_env, 0, self.random_backoff_delay)
 
     def get_nb(self):
         # return the number of CSMA retries
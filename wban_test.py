@@ -2,7 +2,8 @@ from node import *
 
  
 # Test start
-env = simpy.Environment()  # Create the SimPy environment
+engine = 'simpy'  # simulation engine: 'simpy' or 'event_core'
+env = make_env(engine)  # Create the simulation environment
 
 # Create node containers
 n1 = Node(env)
@@ -93,41 +94,18 @@ mobility_helper.add_mobility_list(mob_n8)
 mobility_helper.add_mobility_list(mob_agent)
 
 # Generate events (generate packet events)
-event = env.event()
-event._ok = True
-event.callbacks.append(agent.start)
-event.callbacks.append(n1.generate_data)
-event.callbacks.append(n2.generate_data)
-event.callbacks.append(n3.generate_data)
-event.callbacks.append(n4.generate_data)
-event.callbacks.append(n5.generate_data)
-event.callbacks.append(n6.generate_data)
-event.callbacks.append(n7.generate_data)
-event.callbacks.append(n8.generate_data)
-env.schedule(event, priority=0, delay=0)
+call_later(env, 0, agent.start, n1.generate_data, n2.generate_data, n3.generate_data, n4.generate_data,
+           n5.generate_data, n6.generate_data, n7.generate_data, n8.generate_data)
 
 # Generate events (generate mobility)
-event = env.event()
-event._ok = True
-event.callbacks.append(mobility_helper.do_walking)
-
-env.schedule(event, priority=0, delay=0)
+call_later(env, 0, mobility_helper.do_walking)
 
 # Set the simulation run time
 run_time = 50000  # seconds
 
 # Print statistical results
-event = env.event()
-event._ok = True
-event.callbacks.append(n1.m_mac.show_result)
-event.callbacks.append(n2.m_mac.show_result)
-event.callbacks.append(n3.m_mac.show_result)
-event.callbacks.append(n4.m_mac.show_result)
-event.callbacks.append(n5.m_mac.show_result)
-event.callbacks.append(n6.m_mac.show_result)
-event.callbacks.append(n7.m_mac.show_result)
-event.callbacks.append(n8.m_mac.show_result)
-env.schedule(event, priority=0, delay=200)
+call_later(env, 200, n1.m_mac.show_result, n2.m_mac.show_result, n3.m_mac.show_result, n4.m_mac.show_result,
+           n5.m_mac.show_result, n6.m_mac.show_result, n7.m_mac.show_result, n8.m_mac.show_result)
 
 # Run simulation
 env.run(until=run_time)
\ No newline at end of file
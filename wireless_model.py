@@ -1,6 +1,7 @@
 from tools import *
 from mobility_model import *
 import random
+import numpy as np
 
  
 class PropLossModel:
@@ -15,7 +16,7 @@ class PropLossModel:
 
         distance *= 1000    # convert meter to millimeter
 
-        is_los = a.is_los(b.get_position())
+        is_los = a.is_los(Vector(*b.get_body_frame_array().tolist()))
 
         # We can see the BAN-specific path loss model below
         # G. Dolmans and A. Fort, "Channel models WBAN-holst centre/imec-nl," IEEE 802.15-08-0418-01-0006, 2008.
@@ -30,6 +31,26 @@ class PropLossModel:
 
         return path_loss_db
 
+    # Calculate the path loss to multiple receivers at once (distance in meter, is_los as boolean array)
+    def cal_path_loss_batch(self, distance, is_los):
+        distance = np.asarray(distance) * 1000    # convert meter to millimeter
+
+        a = 15.5
+        b = 5.38
+        sigma_n = 5.35
+        shadowing_db = 9.05    # shadowing factor
+        with np.errstate(divide='ignore'):
+            path_loss_db = a * np.log10(distance) + b + sigma_n
+
+        return path_loss_db + np.where(is_los, 0.0, shadowing_db)
+
+    # Largest distance (m) at which the path loss (line of sight: the smallest one) is at most max_path_loss_db
+    def get_max_distance(self, max_path_loss_db):
+        a = 15.5
+        b = 5.38
+        sigma_n = 5.35
+        return 10 ** ((max_path_loss_db - b - sigma_n) / a) / 1000     # convert millimeter to meter
+
     # Calculate the rx power based on friis propagation loss model
     def calc_rx_power_friis(self, tx_power_dbm, a: MobilityModel, b: MobilityModel):
         distance = a.get_distance_from(b.get_position())
@@ -62,6 +83,35 @@ class PropDelayModel:
         seconds = distance / self.m_delay
         return seconds
 
+    def get_delay_batch(self, distance):
+        return np.asarray(distance) / self.m_delay
+
+
+# Uniform grid of points (N, 3) for fixed-radius neighbour queries: each point is found among the 27 cells around
+# its own cell, so the cell size must be at least the query radius
+class SpatialGrid:
+    def __init__(self, positions, cell_size):
+        self.positions = positions
+        self.cell_size = cell_size
+        self.point_cells = np.floor(positions / cell_size).astype(np.int64)
+
+        cells, inverse = np.unique(self.point_cells, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind='stable')
+        groups = np.split(order, np.cumsum(np.bincount(inverse, minlength=len(cells)))[:-1])
+        self.cells = {tuple(cell): group for cell, group in zip(cells.tolist(), groups)}
+
+    # Indices (ascending) of the points within radius of the given point, the point itself excluded
+    def query(self, index, radius):
+        cx, cy, cz = self.point_cells[index].tolist()
+        groups = [self.cells[cell] for cell in
+                  ((x, y, z) for x in (cx - 1, cx, cx + 1) for y in (cy - 1, cy, cy + 1) for z in (cz - 1, cz, cz + 1))
+                  if cell in self.cells]
+        candidates = np.sort(np.concatenate(groups))
+        candidates = candidates[candidates != index]
+        distance = np.sqrt(np.sum((self.positions[candidates] - self.positions[index]) ** 2, axis=1))
+        return candidates[distance <= radius]
+
 
 class AntennaModel:
     def __init__(self):